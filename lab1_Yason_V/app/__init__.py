@@ -0,0 +1,8 @@
+import os
+
+# .env - для локального запуска; загружается до того, как модули app читают
+# настройки из окружения. Без файла python-dotenv даже не импортируется
+DOTENV_PATH = os.getenv("DOTENV_PATH", ".env")
+if os.path.isfile(DOTENV_PATH):
+    from dotenv import load_dotenv
+    load_dotenv(DOTENV_PATH)
@@ -1,16 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from .. import schemas, crud, auth, deps  # добавили deps
-from ..deps import get_db, get_current_user  # импортируем явно
+from .. import schemas, crud_async, auth, deps, ratelimit  # добавили deps
+from ..deps import get_async_db, get_read_db, get_current_user  # импортируем явно
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-@router.post("/register", response_model=schemas.Token)
-def register(user_in: schemas.UserCreate, request: Request, db: Session = Depends(get_db)):
+@router.post(
+    "/register", response_model=schemas.Token,
+    dependencies=[Depends(ratelimit.auth_concurrency), Depends(ratelimit.register_rate_limit)],
+)
+async def register(user_in: schemas.UserCreate, request: Request, db: AsyncSession = Depends(get_async_db)):
     # Проверяем, существует ли пользователь
-    existing_user = crud.get_user_by_email(db, user_in.email)
+    existing_user = await crud_async.get_user_by_email(db, user_in.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -18,15 +21,15 @@ def register(user_in: schemas.UserCreate, request: Request, db: Session = Depend
         )
     
     # Создаем пользователя
-    user = crud.create_user(db, user_in)
+    user = await crud_async.create_user(db, user_in)
     
     # Создаем токены
-    access_token = auth.create_access_token(data={"user_id": user.id})
+    access_token = auth.create_access_token(data=auth.access_token_claims(user))
     refresh_token = auth.create_refresh_token()
     
     # Сохраняем refresh сессию
     user_agent = request.headers.get("user-agent")
-    crud.create_refresh_session(db, user.id, refresh_token, user_agent)
+    await crud_async.create_refresh_session(db, user.id, refresh_token, user_agent)
     
     return {
         "access_token": access_token,
@@ -34,28 +37,37 @@ def register(user_in: schemas.UserCreate, request: Request, db: Session = Depend
         "token_type": "bearer"
     }
 
-@router.post("/login", response_model=schemas.Token)
-def login(user_in: schemas.UserLogin, request: Request, db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, user_in.email)
+@router.post(
+    "/login", response_model=schemas.Token,
+    dependencies=[Depends(ratelimit.auth_concurrency), Depends(ratelimit.login_rate_limit)],
+)
+async def login(user_in: schemas.UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
+    user = await crud_async.get_user_by_email(db, user_in.email)
     if not user or not user.hashed_password:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
-    if not auth.verify_password(user_in.password, user.hashed_password):
+    # argon2 блокирует CPU - проверяем пароль в пуле хеширования
+    ok, new_hash = await auth.verify_and_update_password(user_in.password, user.hashed_password)
+    if not ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Параметры argon2 поменялись - сохраняем пересчитанный хеш
+    if new_hash:
+        await crud_async.set_password_hash(db, user, new_hash)
+    
     # Создаем токены
-    access_token = auth.create_access_token(data={"user_id": user.id})
+    access_token = auth.create_access_token(data=auth.access_token_claims(user))
     refresh_token = auth.create_refresh_token()
     
     # Сохраняем refresh сессию
     user_agent = request.headers.get("user-agent")
-    crud.create_refresh_session(db, user.id, refresh_token, user_agent)
+    await crud_async.create_refresh_session(db, user.id, refresh_token, user_agent)
     
     return {
         "access_token": access_token,
@@ -64,7 +76,7 @@ def login(user_in: schemas.UserLogin, request: Request, db: Session = Depends(ge
     }
 
 @router.post("/refresh", response_model=schemas.Token)
-def refresh_token(refresh_request: schemas.RefreshTokenRequest, request: Request, db: Session = Depends(get_db)):
+async def refresh_token(refresh_request: schemas.RefreshTokenRequest, request: Request, db: AsyncSession = Depends(get_async_db)):
     # Проверяем refresh токен
     payload = auth.decode_token(refresh_request.refresh_token)
     if not payload or payload.get("type") != "refresh":
@@ -73,22 +85,29 @@ def refresh_token(refresh_request: schemas.RefreshTokenRequest, request: Request
             detail="Invalid refresh token"
         )
     
-    # Проверяем сессию в базе
-    session = crud.get_refresh_session(db, refresh_request.refresh_token)
-    if not session:
+    # Меняем сессию на новую одной транзакцией
+    new_refresh_token = auth.create_refresh_token()
+    user_agent = request.headers.get("user-agent")
+    user_id = await crud_async.rotate_refresh_session(
+        db, refresh_request.refresh_token, new_refresh_token, user_agent
+    )
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token not found"
         )
     
-    # Создаем новые токены
-    access_token = auth.create_access_token(data={"user_id": session.user_id})
-    new_refresh_token = auth.create_refresh_token()
-    
-    # Удаляем старую сессию и создаем новую
-    crud.delete_refresh_session(db, refresh_request.refresh_token)
-    user_agent = request.headers.get("user-agent")
-    crud.create_refresh_session(db, session.user_id, new_refresh_token, user_agent)
+    # Создаем access токен; роли нужны только если они кладутся в токен
+    claims = {"user_id": user_id}
+    if auth.ACCESS_TOKEN_ROLE_CLAIMS:
+        principal = await crud_async.get_user_principal(db, user_id)
+        if not principal:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token not found"
+            )
+        claims = auth.access_token_claims(principal)
+    access_token = auth.create_access_token(data=claims)
     
     return {
         "access_token": access_token,
@@ -97,36 +116,38 @@ def refresh_token(refresh_request: schemas.RefreshTokenRequest, request: Request
     }
 
 @router.post("/logout")
-def logout(refresh_request: schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
-    crud.delete_refresh_session(db, refresh_request.refresh_token)
+async def logout(refresh_request: schemas.RefreshTokenRequest, db: AsyncSession = Depends(get_async_db)):
+    await crud_async.delete_refresh_session(db, refresh_request.refresh_token)
     return {"message": "Successfully logged out"}
 
 @router.post("/logout-all")
-def logout_all(
+async def logout_all(
     current_user = Depends(get_current_user),  # исправлено: deps.get_current_user -> get_current_user
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    crud.delete_all_user_sessions(db, current_user.id)
+    await crud_async.delete_all_user_sessions(db, current_user.id)
     return {"message": "Successfully logged out from all devices"}
 
 @router.get("/sessions", response_model=list[schemas.SessionRead])
-def get_my_sessions(
+async def get_my_sessions(
     current_user = Depends(get_current_user),  # исправлено: deps.get_current_user -> get_current_user
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    sessions = crud.get_user_sessions(db, current_user.id)
+    sessions = await crud_async.get_user_sessions(db, current_user.id)
     return sessions
 
 # GitHub OAuth
 @router.get("/github/login")
 async def github_login():
-    with auth.github_sso:
-        return await auth.github_sso.get_login_redirect()
+    github_sso = auth.get_github_sso()
+    with github_sso:
+        return await github_sso.get_login_redirect()
 
 @router.get("/github/callback", response_model=schemas.Token)
-async def github_callback(request: Request, db: Session = Depends(get_db)):
-    with auth.github_sso:
-        user_info = await auth.github_sso.verify_and_process(request)
+async def github_callback(request: Request, db: AsyncSession = Depends(get_async_db)):
+    github_sso = auth.get_github_sso()
+    with github_sso:
+        user_info = await github_sso.verify_and_process(request)
         
         if not user_info:
             raise HTTPException(
@@ -135,7 +156,7 @@ async def github_callback(request: Request, db: Session = Depends(get_db)):
             )
         
         # Ищем пользователя по github_id
-        user = crud.get_user_by_github_id(db, user_info.id)
+        user = await crud_async.get_user_by_github_id(db, user_info.id)
         
         if not user:
             # Создаем нового пользователя
@@ -144,15 +165,15 @@ async def github_callback(request: Request, db: Session = Depends(get_db)):
                 email=user_info.email,
                 github_id=user_info.id
             )
-            user = crud.create_oauth_user(db, user_data)
+            user = await crud_async.create_oauth_user(db, user_data)
         
         # Создаем токены
-        access_token = auth.create_access_token(data={"user_id": user.id})
+        access_token = auth.create_access_token(data=auth.access_token_claims(user))
         refresh_token = auth.create_refresh_token()
         
         # Сохраняем refresh сессию
         user_agent = request.headers.get("user-agent")
-        crud.create_refresh_session(db, user.id, refresh_token, user_agent)
+        await crud_async.create_refresh_session(db, user.id, refresh_token, user_agent)
         
         return {
             "access_token": access_token,
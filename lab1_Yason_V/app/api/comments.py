@@ -1,41 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from .. import schemas, crud, deps
-from ..deps import get_db, get_current_user, check_comment_permission
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, crud_async, deps, ratelimit
+from ..deps import get_async_db, get_current_user, check_comment_permission
 
 router = APIRouter(prefix="/comments", tags=["comments"])
 
-@router.post("/", response_model=schemas.CommentRead)
-def create_comment(
+@router.post(
+    "/", response_model=schemas.CommentRead,
+    dependencies=[Depends(ratelimit.comments_concurrency), Depends(ratelimit.comments_rate_limit)],
+)
+async def create_comment(
     comment_in: schemas.CommentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
     # Проверяем существование новости
-    news = crud.get_news(db, comment_in.news_id)
+    news = await crud_async.get_news_json(db, comment_in.news_id)
     if not news:
         raise HTTPException(404, "News not found")
     
-    return crud.create_comment(db, comment_in, author_id=current_user.id)
+    return await crud_async.create_comment(db, comment_in, author_id=current_user.id)
 
 @router.patch("/{comment_id}", response_model=schemas.CommentRead)
-def update_comment(
+async def update_comment(
     comment_id: int,
     payload: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
     # Получаем комментарий с проверкой прав
-    comment_obj = check_comment_permission(comment_id, db, current_user)
-    return crud.update_comment(db, comment_obj, payload)
+    comment_obj = await check_comment_permission(comment_id, db, current_user)
+    return await crud_async.update_comment(db, comment_obj, payload)
 
 @router.delete("/{comment_id}")
-def delete_comment(
+async def delete_comment(
     comment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
     # Получаем комментарий с проверкой прав
-    comment_obj = check_comment_permission(comment_id, db, current_user)
-    crud.delete_comment(db, comment_obj)
+    comment_obj = await check_comment_permission(comment_id, db, current_user)
+    await crud_async.delete_comment(db, comment_obj)
     return {"ok": True}
\ No newline at end of file
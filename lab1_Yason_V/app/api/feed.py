@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, crud_async, serialization
+from ..pagination import decode_cursor
+from ..deps import get_read_db, get_current_user
+
+router = APIRouter(prefix="/feed", tags=["feed"])
+
+@router.get("/", response_model=schemas.NewsPage)
+async def get_feed(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user = Depends(get_current_user)
+):
+    # Домашняя лента: новости авторов, на которых подписан пользователь
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    page = await crud_async.get_feed(db, current_user.id, limit, position)
+    page["items"] = [serialization.news_dict(n) for n in page["items"]]
+    return serialization.json_response(page)
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from .. import media
+
+router = APIRouter(prefix=media.MEDIA_URL, tags=["media"])
+
+@router.api_route("/{name:path}", methods=["GET", "HEAD"])
+async def get_media(name: str, request: Request):
+    path = media.media_path(name)
+    stat_result = await media.stat_file(path) if path else None
+    if stat_result is None:
+        raise HTTPException(404, "File not found")
+    etag = f'"{name.rsplit("/", 1)[-1].split(".")[0]}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    # Имя - хеш содержимого: файл по этому URL не меняется никогда
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    return media.RangeFileResponse(
+        path, stat_result, request.headers.get("range"), headers=headers, method=request.method
+    )
@@ -1,51 +1,189 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from .. import schemas, crud, deps
-from ..deps import get_db, get_current_author_or_admin_user, check_news_permission, get_current_user
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, crud_async, deps, bulk, compression, http_cache, media, serialization
+from ..cache import news_cache, news_key
+from ..pagination import decode_cursor, paginate
+from ..deps import get_async_db, get_read_db, get_current_admin_user, get_current_author_or_admin_user, check_news_permission, get_current_user
 
 router = APIRouter(prefix="/news", tags=["news"])
 
 @router.post("/", response_model=schemas.NewsRead)
-def create_news(
+async def create_news(
     news_in: schemas.NewsCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_author_or_admin_user)
 ):
-    return crud.create_news(db, news_in, author_id=current_user.id)
+    return await crud_async.create_news(db, news_in, author_id=current_user.id)
+
+@router.post("/bulk")
+async def bulk_create_news(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_author_or_admin_user)
+):
+    """Импорт NDJSON (по NewsCreate на строку) потоком, батчами.
+
+    Невалидные строки и строки длиннее BULK_MAX_LINE_BYTES пропускаются и
+    попадают в errors. Импортированные новости не пишут событие в outbox, не
+    уходят подписчикам /stream и не раскладываются по лентам /feed/: массовый
+    импорт никого не уведомляет.
+    """
+    report = bulk.ImportReport()
+    try:
+        async for batch in bulk.abatched_lines(request.stream(), current_user.id, report):
+            report.inserted += await crud_async.bulk_insert_news(db, batch)
+            report.batches += 1
+    except bulk.BulkTooLarge:
+        # Уже закоммиченные батчи остаются - их число в ответе
+        raise HTTPException(
+            413, {"message": f"Body is larger than {bulk.BULK_MAX_BODY_BYTES} bytes", **report.as_dict()}
+        )
+    return report.as_dict()
+
+@router.get("/export")
+async def export_news(
+    db: AsyncSession = Depends(get_read_db),
+    current_user = Depends(get_current_admin_user)
+):
+    # Полная выгрузка - только админам. NDJSON NewsRead по id; строки отдаются по мере чтения курсора
+    async def lines():
+        async for row in crud_async.stream_news(db, bulk.BULK_BATCH_SIZE):
+            yield bulk.export_line(row)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/", response_model=schemas.NewsPage)
+async def list_news(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    author_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    rows = await crud_async.list_news(
+        db, limit, position, author_id=author_id, date_from=date_from, date_to=date_to
+    )
+    # ORM -> байты напрямую, без повторной валидации через response_model
+    page = paginate(rows, limit)
+    page["items"] = [serialization.news_dict(n) for n in page["items"]]
+    return serialization.json_response(page)
+
+@router.get("/search", response_model=schemas.NewsSearchPage)
+async def search_news(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Объявлен до /{news_id}, иначе "search" разберется как id
+    rows = await crud_async.search_news(db, q, limit, offset)
+    return serialization.json_response({
+        "items": [serialization.search_hit_dict(r) for r in rows[:limit]],
+        "next_offset": offset + limit if len(rows) > limit else None,
+    })
 
 @router.get("/{news_id}", response_model=schemas.NewsRead)
-def read_news(
+async def read_news(
+    news_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db)
+):
+    if http_cache.is_conditional(request):
+        # Сначала дешевая проверка версии - content не читаем, если клиент актуален
+        meta = await crud_async.get_news_version(db, news_id)
+        if not meta:
+            raise HTTPException(404, "News not found")
+        etag = http_cache.make_etag(news_id, meta[0])
+        if http_cache.is_not_modified(request, etag, meta[1]):
+            return http_cache.not_modified(http_cache.cache_headers(etag, meta[1], http_cache.NEWS_CACHE_CONTROL))
+    entity = await crud_async.get_news_entity(db, news_id)
+    if not entity:
+        raise HTTPException(404, "News not found")
+    version, updated_at, body = entity
+    headers = http_cache.cache_headers(http_cache.make_etag(news_id, version), updated_at, http_cache.NEWS_CACHE_CONTROL)
+    headers["Vary"] = "Accept-Encoding"
+    encoding = compression.choose_encoding(request.headers.get("accept-encoding", ""))
+    if encoding and len(body) >= compression.COMPRESSION_MIN_SIZE:
+        # Горячая новость сжимается один раз на версию, middleware ее уже не трогает
+        body = await compression.compressed_variant(news_cache, f"{news_key(news_id)}:{version}", body, encoding)
+        headers["Content-Encoding"] = encoding
+    # Отдаем закэшированные байты как есть, без повторной сериализации
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/{news_id}/comments", response_model=schemas.CommentPage)
+async def list_news_comments(
     news_id: int,
-    db: Session = Depends(get_db)
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_author: bool = False,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    n = crud.get_news(db, news_id)
-    if not n:
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if not await crud_async.get_news_json(db, news_id):
         raise HTTPException(404, "News not found")
-    return n
+    rows = await crud_async.list_comments(
+        db, news_id, limit, position, include_author=include_author
+    )
+    page = paginate(rows, limit)
+    page["items"] = [serialization.comment_dict(c) for c in page["items"]]
+    return serialization.json_response(page)
 
 # Функция для получения новости с проверкой прав
-def get_news_with_permission_check(news_id: int, db: Session, current_user):
+async def get_news_with_permission_check(news_id: int, db: AsyncSession, current_user):
     """Вспомогательная функция для проверки прав на новость"""
-    return check_news_permission(news_id, db, current_user)
+    return await check_news_permission(news_id, db, current_user)
 
 @router.patch("/{news_id}", response_model=schemas.NewsRead)
-def update_news(
+async def update_news(
     news_id: int,
     news_in: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
     # Получаем новость с проверкой прав
-    news_obj = check_news_permission(news_id, db, current_user)
-    return crud.update_news(db, news_obj, news_in)
+    news_obj = await check_news_permission(news_id, db, current_user)
+    return await crud_async.update_news(db, news_obj, news_in)
+
+@router.put("/{news_id}/cover", response_model=schemas.NewsRead)
+async def upload_news_cover(
+    news_id: int,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_user)
+):
+    news_obj = await check_news_permission(news_id, db, current_user)
+    extension = media.MEDIA_TYPES.get(file.content_type)
+    if extension is None:
+        raise HTTPException(415, f"Unsupported media type, allowed: {', '.join(media.MEDIA_TYPES)}")
+    # Content-Type присылает клиент - сверяем его с сигнатурой файла
+    head = await file.read(media.MEDIA_SNIFF_BYTES)
+    await file.seek(0)
+    if media.sniff_extension(head) != extension:
+        raise HTTPException(415, f"File content does not match {file.content_type}")
+    try:
+        name = await media.save_upload(file, extension)
+    except media.MediaTooLarge:
+        raise HTTPException(413, f"File is larger than {media.MEDIA_MAX_BYTES} bytes")
+    return await crud_async.update_news(db, news_obj, {"cover": media.media_url(name)})
 
 @router.delete("/{news_id}")
-def delete_news(
+async def delete_news(
     news_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
     # Получаем новость с проверкой прав
-    news_obj = check_news_permission(news_id, db, current_user)
-    crud.delete_news(db, news_obj)
+    news_obj = await check_news_permission(news_id, db, current_user)
+    await crud_async.delete_news(db, news_obj)
     return {"ok": True}
\ No newline at end of file
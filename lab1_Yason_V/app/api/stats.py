@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from ..db import pool_stats
+from ..cache import news_cache
+from ..auth import hashing_stats
+from ..replicas import replicas
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+@router.get("/pool")
+async def get_pool_stats():
+    # checked_out / overflow / гистограмма ожидания соединения по всем движкам, включая реплики
+    return pool_stats()
+
+@router.get("/cache")
+async def get_cache_stats():
+    return {"news": news_cache.stats.snapshot()}
+
+@router.get("/replicas")
+async def get_replica_stats():
+    # Состояние реплик и доля чтений, ушедших на них
+    return replicas.snapshot()
+
+@router.get("/hashing")
+async def get_hashing_stats():
+    return hashing_stats()
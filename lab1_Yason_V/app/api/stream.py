@@ -0,0 +1,91 @@
+import asyncio
+import os
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from ..events import broadcaster, news_channel, SubscriptionClosed, TooManySubscribers
+
+router = APIRouter(prefix="/stream", tags=["stream"])
+
+# Пустой кадр раз в STREAM_HEARTBEAT секунд: прокси не рвут простаивающее
+# соединение, а оборванное замечаем на первой же записи
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", 15))
+STREAM_MAX_TOPICS = 50
+
+
+def stream_channels(news_id: Optional[List[int]]) -> list:
+    # Без news_id - общая лента новостей, иначе события выбранных новостей
+    if not news_id:
+        return ["news"]
+    if len(news_id) > STREAM_MAX_TOPICS:
+        raise HTTPException(400, f"At most {STREAM_MAX_TOPICS} news_id per stream")
+    return [news_channel(i) for i in dict.fromkeys(news_id)]
+
+
+def subscribe(channels: list):
+    try:
+        return broadcaster.subscribe(channels)
+    except TooManySubscribers:
+        raise HTTPException(503, "Too many stream subscribers", headers={"Retry-After": "5"})
+
+
+async def sse_events(subscription):
+    try:
+        # retry - через сколько мс браузер переподключится (EventSource)
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                event = await subscription.get(STREAM_HEARTBEAT)
+            except SubscriptionClosed:
+                if subscription.dropped:
+                    # Клиент отстал: события потеряны, состояние надо перечитать
+                    yield b"event: dropped\ndata: {}\n\n"
+                return
+            yield event.sse() if event is not None else b": ping\n\n"
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+@router.get("/")
+async def stream_sse(news_id: Optional[List[int]] = Query(None)):
+    subscription = subscribe(stream_channels(news_id))
+    return StreamingResponse(
+        sse_events(subscription),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx не должен копить поток в буфере
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def stream_ws(websocket: WebSocket, news_id: Optional[List[int]] = Query(None)):
+    try:
+        subscription = subscribe(stream_channels(news_id))
+    except HTTPException as exc:
+        # 1013 - try again later, 1008 - некорректный запрос
+        await websocket.close(code=1013 if exc.status_code == 503 else 1008, reason=exc.detail)
+        return
+    await websocket.accept()
+
+    async def read_until_disconnect():
+        # Входящие сообщения не нужны; закрытие клиентом будит ожидание событий
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            subscription.close()
+
+    reader = asyncio.ensure_future(read_until_disconnect())
+    try:
+        while True:
+            event = await subscription.get(STREAM_HEARTBEAT)
+            if event is not None:
+                await websocket.send_text(event.message())
+    except SubscriptionClosed:
+        if subscription.dropped:
+            await websocket.close(code=1013, reason="Slow consumer")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        broadcaster.unsubscribe(subscription)
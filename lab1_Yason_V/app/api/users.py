@@ -1,49 +1,105 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from .. import schemas, crud, deps  # добавили deps
-from ..deps import get_db, get_current_admin_user, get_current_user  # явный импорт
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, crud_async, deps, http_cache  # добавили deps
+from ..deps import get_async_db, get_read_db, get_current_admin_user, get_current_user  # явный импорт
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/me", response_model=schemas.UserRead)
-def get_me(current_user = Depends(get_current_user)):
-    return current_user
+async def get_me(
+    request: Request,
+    response: Response,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    if http_cache.is_conditional(request):
+        # Версия профиля - один легкий SELECT; совпала - 304 без тела
+        meta = await crud_async.get_user_version(db, current_user.id)
+        if not meta:
+            raise HTTPException(404, "Not found")
+        etag = http_cache.make_etag(current_user.id, meta.version)
+        if http_cache.is_not_modified(request, etag, meta.updated_at):
+            return http_cache.not_modified(http_cache.cache_headers(etag, meta.updated_at, http_cache.USER_CACHE_CONTROL))
+    # get_current_user отдает только id и роли - профиль читаем отдельно
+    user = await crud_async.get_user(db, current_user.id)
+    if not user:
+        raise HTTPException(404, "Not found")
+    response.headers.update(
+        http_cache.cache_headers(http_cache.make_etag(user.id, user.version), user.updated_at, http_cache.USER_CACHE_CONTROL)
+    )
+    return user
 
 @router.post("/", response_model=schemas.UserRead)
-def create_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = crud.get_user_by_email(db, user_in.email)
+async def create_user(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing = await crud_async.get_user_by_email(db, user_in.email)
     if existing:
         raise HTTPException(400, "Email already exists")
-    return crud.create_user(db, user_in)
+    return await crud_async.create_user(db, user_in)
 
 @router.get("/{user_id}", response_model=schemas.UserRead)
-def read_user(
+async def read_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user = Depends(get_current_admin_user)
 ):
-    u = crud.get_user(db, user_id)
+    u = await crud_async.get_user(db, user_id)
     if not u:
         raise HTTPException(404, "Not found")
     return u
 
 @router.get("/", response_model=list[schemas.UserRead])
-def list_users(
+async def list_users(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user = Depends(get_current_admin_user)
 ):
-    return crud.list_users(db, skip, limit)
+    return await crud_async.list_users(db, skip, limit)
 
 @router.patch("/{user_id}", response_model=schemas.UserRead)
-def update_user(
+async def update_user(
     user_id: int,
     data: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_admin_user)
+):
+    user = await crud_async.update_user(db, user_id, data)
+    if not user:
+        raise HTTPException(404, "User not found")
+    return user
+
+@router.post("/{author_id}/follow")
+async def follow_user(
+    author_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_user)
+):
+    if author_id == current_user.id:
+        raise HTTPException(400, "Cannot follow yourself")
+    if not await crud_async.get_user(db, author_id):
+        raise HTTPException(404, "User not found")
+    # Повторная подписка - не ошибка
+    await crud_async.follow(db, current_user.id, author_id)
+    return {"ok": True}
+
+@router.delete("/{author_id}/follow")
+async def unfollow_user(
+    author_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_user)
+):
+    if not await crud_async.unfollow(db, current_user.id, author_id):
+        raise HTTPException(404, "Not following")
+    return {"ok": True}
+
+@router.delete("/{user_id}")
+async def delete_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_admin_user)
 ):
-    user = crud.update_user(db, user_id, data)
+    user = await crud_async.get_user(db, user_id)
     if not user:
         raise HTTPException(404, "User not found")
-    return user
\ No newline at end of file
+    await crud_async.delete_user(db, user)
+    return {"ok": True}
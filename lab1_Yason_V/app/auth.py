@@ -2,31 +2,118 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi_sso.sso.github import GithubSSO
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
 import os
-
-load_dotenv()
+import secrets
+import threading
+import time
+from . import metrics
 
 # Password hashing
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Параметры argon2: time_cost (rounds), memory_cost (KiB), parallelism.
+# При их изменении старые хеши пересчитываются при следующем входе.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 65536))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 4))
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
+
+# Хеширование идет в отдельном ограниченном пуле: argon2-cffi отпускает GIL,
+# а общий threadpool Starlette остается свободным для остальных запросов.
+# Сверх HASH_WORKERS + HASH_QUEUE_LIMIT задач сразу отказываем (503).
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", HASH_WORKERS * 4))
 
 # JWT settings
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
+# Роли в access-токене: запросы авторизуются без обращения к БД,
+# но смена ролей вступает в силу только после истечения токена
+ACCESS_TOKEN_ROLE_CLAIMS = os.getenv("ACCESS_TOKEN_ROLE_CLAIMS", "false").lower() in ("1", "true", "yes")
 
 # GitHub OAuth
 GITHUB_CLIENT_ID = os.getenv("GITHUB_CLIENT_ID")
 GITHUB_CLIENT_SECRET = os.getenv("GITHUB_CLIENT_SECRET")
 REDIRECT_URI = "http://localhost:8000/auth/github/callback"
 
-github_sso = GithubSSO(
-    client_id=GITHUB_CLIENT_ID,
-    client_secret=GITHUB_CLIENT_SECRET,
-    redirect_uri=REDIRECT_URI
-)
+_github_sso = None
+
+def get_github_sso():
+    # fastapi_sso тянет httpx и oauthlib (~0.3 с импорта) - клиент создается
+    # при первом входе через GitHub, а не в каждом воркере API и Celery
+    global _github_sso
+    if _github_sso is None:
+        from fastapi_sso.sso.github import GithubSSO
+        _github_sso = GithubSSO(
+            client_id=GITHUB_CLIENT_ID,
+            client_secret=GITHUB_CLIENT_SECRET,
+            redirect_uri=REDIRECT_URI
+        )
+    return _github_sso
+
+# Ожидание в очереди пула и само вычисление argon2 - отдельно
+hashing_wait = metrics.histogram("hashing_queue_wait_seconds", "Time a hashing job waits for a worker", ("op",))
+hashing_time = metrics.histogram("hashing_duration_seconds", "argon2 hash/verify time", ("op",))
+hashing_rejected = metrics.counter("hashing_rejected_total", "Hashing jobs rejected with 503 (queue full)")
+
+
+class HashingBusy(Exception):
+    """Очередь хеширования переполнена - запрос нужно повторить позже."""
+
+
+_hash_executor = None
+_hash_pending = 0
+_hash_lock = threading.Lock()
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="argon2")
+    return _hash_executor
+
+
+def _timed(op: str, submitted: float, func, *args):
+    started = time.perf_counter()
+    hashing_wait.labels(op).observe(started - submitted)
+    try:
+        return func(*args)
+    finally:
+        hashing_time.labels(op).observe(time.perf_counter() - started)
+
+
+async def _run_hashing(op: str, func, *args):
+    global _hash_pending
+    with _hash_lock:
+        if _hash_pending >= HASH_WORKERS + HASH_QUEUE_LIMIT:
+            hashing_rejected.labels().inc()
+            raise HashingBusy()
+        _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_hash_executor(), _timed, op, time.perf_counter(), func, *args)
+    finally:
+        with _hash_lock:
+            _hash_pending -= 1
+
+
+def hashing_stats() -> dict:
+    return {
+        "workers": HASH_WORKERS,
+        "queue_limit": HASH_QUEUE_LIMIT,
+        "pending": _hash_pending,
+    }
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -34,6 +121,19 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hashing("hash", get_password_hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str):
+    # (ok, new_hash): new_hash не None, если хеш создан со старыми параметрами
+    return await _run_hashing("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+
+def access_token_claims(user) -> dict:
+    claims = {"user_id": user.id}
+    if ACCESS_TOKEN_ROLE_CLAIMS:
+        claims.update(is_author=bool(user.is_author), is_admin=bool(user.is_admin))
+    return claims
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -47,10 +147,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def create_refresh_token() -> str:
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode = {"exp": expire, "type": "refresh"}
+    # jti делает токен уникальным - иначе два токена в одну секунду совпадут
+    to_encode = {"exp": expire, "type": "refresh", "jti": secrets.token_urlsafe(16)}
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
 def decode_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
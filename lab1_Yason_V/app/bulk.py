@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from pydantic import ValidationError
+from . import schemas, search, serialization
+
+# Импорт/экспорт новостей в NDJSON: одна новость - одна строка JSON.
+# Вход читается потоком и валидируется NewsCreate батчами, каждый батч -
+# один executemany (на Postgres - COPY) и один commit.
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+BULK_MAX_ERRORS = int(os.getenv("BULK_MAX_ERRORS", 100))
+# Строка длиннее лимита не буферизуется целиком: она пропускается с ошибкой.
+# Тело больше BULK_MAX_BODY_BYTES обрывает импорт (413)
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", 1024 * 1024))
+BULK_MAX_BODY_BYTES = int(os.getenv("BULK_MAX_BODY_BYTES", 256 * 1024 * 1024))
+
+NEWS_COPY_COLUMNS = ("title", "content", "cover", "search_text", "published_at", "author_id")
+
+
+class BulkTooLarge(Exception):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.batches = 0
+        self.errors = []
+
+    def add_error(self, line_no: int, error: str) -> None:
+        # Храним только первые ошибки - битый файл не должен раздувать ответ
+        if len(self.errors) < BULK_MAX_ERRORS:
+            self.errors.append({"line": line_no, "error": error})
+
+    def as_dict(self) -> dict:
+        return {"inserted": self.inserted, "batches": self.batches, "errors": self.errors}
+
+
+def parse_line(line_no: int, line, report: ImportReport):
+    # NewsCreate или None (ошибка записана в отчет); пустые строки пропускаем
+    if not line.strip():
+        return None
+    try:
+        return schemas.NewsCreate.model_validate_json(line)
+    except ValidationError as exc:
+        report.add_error(line_no, exc.errors(include_url=False)[0]["msg"])
+        return None
+
+
+def news_row(news_in: schemas.NewsCreate, author_id: int, now: datetime) -> dict:
+    # Core insert обходит ORM-событие search.fill_search_text - считаем сами
+    return {
+        "title": news_in.title,
+        "content": news_in.content,
+        "cover": news_in.cover,
+        "search_text": search.extract_text(news_in.content),
+        "published_at": now,
+        "author_id": author_id,
+    }
+
+
+def copy_record(row: dict) -> tuple:
+    # Кортеж в порядке NEWS_COPY_COLUMNS; JSON для COPY передается строкой
+    return tuple(json.dumps(row[c]) if c == "content" else row[c] for c in NEWS_COPY_COLUMNS)
+
+
+def copy_csv(rows) -> io.StringIO:
+    # Для psycopg2 copy_expert: CSV, NULL - пустое значение без кавычек
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(["" if v is None else v for v in copy_record(row)])
+    buf.seek(0)
+    return buf
+
+
+def batched_lines(lines, author_id: int, report: ImportReport, batch_size: int = BULK_BATCH_SIZE):
+    # Синхронный вход (файл CLI): отдает списки строк для вставки
+    batch = []
+    for line_no, line in enumerate(lines, start=1):
+        news_in = parse_line(line_no, line, report)
+        if news_in is not None:
+            batch.append(news_row(news_in, author_id, datetime.utcnow()))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def aiter_lines(chunks, max_line_bytes: int = BULK_MAX_LINE_BYTES, max_body_bytes: int = BULK_MAX_BODY_BYTES):
+    # Байтовые чанки тела запроса -> строки, без чтения всего тела в память.
+    # \n ищется только в новом чанке, хвост копится в bytearray не длиннее
+    # max_line_bytes; вместо слишком длинной строки отдается None
+    tail = bytearray()
+    too_long = False
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        if total > max_body_bytes:
+            raise BulkTooLarge()
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            if too_long or len(tail) + end - start > max_line_bytes:
+                yield None
+            elif tail:
+                tail += chunk[start:end]
+                yield bytes(tail)
+            else:
+                yield chunk[start:end]
+            tail.clear()
+            too_long = False
+            start = end + 1
+        if too_long:
+            continue
+        if len(tail) + len(chunk) - start > max_line_bytes:
+            # Остаток строки до следующего \n отбрасываем, не копя его
+            tail.clear()
+            too_long = True
+        else:
+            tail += chunk[start:]
+    if too_long:
+        yield None
+    elif tail:
+        yield bytes(tail)
+
+
+async def abatched_lines(chunks, author_id: int, report: ImportReport, batch_size: int = BULK_BATCH_SIZE):
+    batch = []
+    line_no = 0
+    async for line in aiter_lines(chunks):
+        line_no += 1
+        if line is None:
+            report.add_error(line_no, f"Line is longer than {BULK_MAX_LINE_BYTES} bytes")
+            continue
+        news_in = parse_line(line_no, line, report)
+        if news_in is not None:
+            batch.append(news_row(news_in, author_id, datetime.utcnow()))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_line(row) -> bytes:
+    return serialization.dumps(serialization.news_dict(row)) + b"\n"
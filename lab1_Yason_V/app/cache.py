@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# memory - LRU в процессе, redis - общий для всех воркеров, none - выключен
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL = float(os.getenv("CACHE_TTL", 60))
+CACHE_MAX_ITEMS = int(os.getenv("CACHE_MAX_ITEMS", 10000))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Кэш пользователя для авторизации - короткий TTL, т.к. роли могут меняться
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
+USER_CACHE_MAX_ITEMS = int(os.getenv("USER_CACHE_MAX_ITEMS", 10000))
+# Значение, загруженное с реплики, может отставать - в общем кэше оно живет
+# не дольше этого, а не весь CACHE_TTL
+REPLICA_CACHE_TTL = float(os.getenv("REPLICA_CACHE_TTL", 5))
+
+
+class MemoryCache:
+    """LRU с TTL и ограничением по числу ключей. Живет в одном процессе."""
+
+    def __init__(self, max_items: int = CACHE_MAX_ITEMS, ttl: float = CACHE_TTL):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float = None) -> None:
+        self._data[key] = (value, time.monotonic() + (ttl or self.ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """Тот же интерфейс поверх Redis - кэш общий для всех воркеров."""
+
+    def __init__(self, url: str = REDIS_URL, ttl: float = CACHE_TTL, prefix: str = "lab1:"):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float = None) -> None:
+        await self.client.set(self.prefix + key, value, px=int((ttl or self.ttl) * 1000))
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+
+class NullCache:
+    async def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    async def set(self, key: str, value: bytes, ttl: float = None) -> None:
+        pass
+
+    async def delete(self, key: str) -> None:
+        pass
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.lookup_time = Histogram()
+        self.load_time = Histogram()
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+            "coalesced": self.coalesced,
+            "lookup_time": self.lookup_time.snapshot(),
+            "load_time": self.load_time.snapshot(),
+        }
+
+
+class LoadAborted(Exception):
+    # Загружавший ключ запрос отменен - ожидающие грузят сами
+    pass
+
+
+class ReadThroughCache:
+    """Read-through поверх backend'а с single-flight на промахе.
+
+    Пока один запрос грузит ключ из БД, остальные запросы того же ключа
+    ждут его результат, а не идут в базу сами.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = CacheStats()
+        self._inflight = {}
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[bytes]]],
+                          ttl: float = None, refresh: bool = False) -> Optional[bytes]:
+        # refresh - загрузить и перезаписать, не глядя в кэш и не дожидаясь
+        # чужой загрузки (ее результат тогда в кэш не попадет)
+        if not refresh:
+            started = time.perf_counter()
+            try:
+                value = await self.backend.get(key)
+            except Exception as exc:
+                # Недоступный кэш не должен ронять чтение - идем в БД
+                logger.warning(f"Cache get failed for {key}: {exc}")
+                self.stats.errors += 1
+                value = None
+            self.stats.lookup_time.observe(time.perf_counter() - started)
+            if value is not None:
+                self.stats.hits += 1
+                return value
+
+            self.stats.misses += 1
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.stats.coalesced += 1
+                try:
+                    return await asyncio.shield(inflight)
+                except LoadAborted:
+                    return await self.get_or_load(key, loader, ttl)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            started = time.perf_counter()
+            value = await loader()
+            self.stats.load_time.observe(time.perf_counter() - started)
+            # Если ключ инвалидировали во время загрузки - значение могло устареть
+            if value is not None and self._inflight.get(key) is future:
+                try:
+                    await self.backend.set(key, value, ttl)
+                except Exception as exc:
+                    logger.warning(f"Cache set failed for {key}: {exc}")
+                    self.stats.errors += 1
+            future.set_result(value)
+            return value
+        except Exception as exc:
+            future.set_exception(exc)
+            # Помечаем исключение полученным: ожидающих может и не быть
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                # Загружавший запрос отменен (клиент отключился). Не cancel():
+                # ожидающие получили бы CancelledError - вместо этого они
+                # повторяют загрузку сами, один из них становится загружающим
+                future.set_exception(LoadAborted())
+                future.exception()
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        # Только чтение, без загрузки на промахе - для дешевых проверок вроде 304
+        try:
+            value = await self.backend.get(key)
+        except Exception as exc:
+            logger.warning(f"Cache get failed for {key}: {exc}")
+            self.stats.errors += 1
+            return None
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    async def invalidate(self, key: str) -> None:
+        self._inflight.pop(key, None)
+        try:
+            await self.backend.delete(key)
+        except Exception as exc:
+            logger.warning(f"Cache delete failed for {key}: {exc}")
+            self.stats.errors += 1
+
+
+def make_backend(name: str = CACHE_BACKEND, ttl: float = CACHE_TTL, max_items: int = CACHE_MAX_ITEMS):
+    if name == "redis":
+        return RedisCache(ttl=ttl)
+    if name == "none":
+        return NullCache()
+    return MemoryCache(max_items=max_items, ttl=ttl)
+
+
+news_cache = ReadThroughCache(make_backend())
+user_cache = ReadThroughCache(make_backend(ttl=USER_CACHE_TTL, max_items=USER_CACHE_MAX_ITEMS))
+
+
+def news_key(news_id: int) -> str:
+    return f"news:{news_id}"
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
@@ -1,5 +1,7 @@
 from celery import Celery
 import os
+from app.instrumentation import install_celery_metrics
+from app.celery_beat_schedule import BEAT_SCHEDULE
 
 celery_app = Celery(
     'lab1_news',
@@ -16,9 +18,7 @@ celery_app.conf.update(
     imports=['app.tasks']
 )
 
-celery_app.conf.beat_schedule = {
-    'weekly-digest': {
-        'task': 'app.tasks.send_weekly_digest',
-        'schedule': 60.0, 
-    },
-}
\ No newline at end of file
+celery_app.conf.beat_schedule = BEAT_SCHEDULE
+
+# Длительность/повторы/ошибки задач; CELERY_METRICS_PORT - /metrics воркера
+install_celery_metrics(celery_app)
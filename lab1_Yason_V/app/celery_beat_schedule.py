@@ -1,9 +1,29 @@
 from celery.schedules import crontab
-from .celery_app import celery_app
+from .outbox import OUTBOX_RELAY_INTERVAL
 
-celery_app.conf.beat_schedule = {
+# Расписание celery beat - единственное, его подключает celery_app.py
+BEAT_SCHEDULE = {
     'weekly-digest': {
         'task': 'app.tasks.send_weekly_digest',
+        # Дайджест уходит письмом всем пользователям - раз в неделю, в воскресенье 9:00
         'schedule': crontab(day_of_week=0, hour=9, minute=0),
     },
-}
\ No newline at end of file
+    'purge-expired-refresh-sessions': {
+        'task': 'app.tasks.purge_expired_refresh_sessions',
+        'schedule': crontab(minute=0),
+    },
+    'relay-outbox': {
+        'task': 'app.tasks.relay_outbox',
+        'schedule': OUTBOX_RELAY_INTERVAL,
+        # Пропущенные запуски не копятся: следующий все равно заберет все
+        'options': {'expires': OUTBOX_RELAY_INTERVAL},
+    },
+    'purge-outbox': {
+        'task': 'app.tasks.purge_outbox',
+        'schedule': crontab(minute=30),
+    },
+    'trim-timelines': {
+        'task': 'app.tasks.trim_timelines',
+        'schedule': crontab(minute=45),
+    },
+}
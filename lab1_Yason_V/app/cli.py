@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import sys
+import time
+from . import bulk, crud, outbox
+from .db import SessionLocal
+
+# Импорт/экспорт новостей NDJSON без HTTP:
+#   python -m app.cli import-news news.ndjson --author-id 1
+#   python -m app.cli export-news news.ndjson
+#   python -m app.cli relay-outbox --loop   (relay вместо beat-задачи)
+# "-" вместо файла - stdin/stdout.
+
+
+def open_input(path: str):
+    return sys.stdin if path == "-" else open(path, encoding="utf-8")
+
+
+def open_output(path: str):
+    return sys.stdout.buffer if path == "-" else open(path, "wb")
+
+
+def import_news(args) -> None:
+    report = bulk.ImportReport()
+    started = time.perf_counter()
+    db = SessionLocal()
+    source = open_input(args.path)
+    try:
+        for batch in bulk.batched_lines(source, args.author_id, report, args.batch_size):
+            report.inserted += crud.bulk_insert_news(db, batch)
+            report.batches += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        db.close()
+    elapsed = time.perf_counter() - started
+    summary = report.as_dict()
+    summary["rows_per_sec"] = round(report.inserted / elapsed, 1) if elapsed else 0.0
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+
+
+def export_news(args) -> None:
+    db = SessionLocal()
+    target = open_output(args.path)
+    try:
+        for row in crud.iter_news(db, args.batch_size):
+            target.write(bulk.export_line(row))
+    finally:
+        if target is not sys.stdout.buffer:
+            target.close()
+        db.close()
+
+
+def relay_outbox(args) -> None:
+    while True:
+        try:
+            sent = outbox.relay_pending(batch_size=args.batch_size)
+        except Exception as exc:
+            # Брокер недоступен - события ждут в outbox, пробуем позже
+            if not args.loop:
+                raise
+            print(f"relay failed: {exc}", file=sys.stderr)
+            sent = 0
+        if sent:
+            print(json.dumps({"relayed": sent}), file=sys.stderr)
+        if not args.loop:
+            return
+        # Пока есть хвост - без паузы, пустой outbox - ждем interval
+        if sent == 0:
+            time.sleep(args.interval)
+
+
+def migrate(args) -> None:
+    # То же, что alembic upgrade head, но из любого каталога
+    from alembic import command
+    from alembic.config import Config
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config = Config(os.path.join(root, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(root, "migrations"))
+    command.upgrade(config, args.revision)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("import-news", help="Импорт новостей из NDJSON")
+    p.add_argument("path")
+    p.add_argument("--author-id", type=int, required=True)
+    p.add_argument("--batch-size", type=int, default=bulk.BULK_BATCH_SIZE)
+    p.set_defaults(func=import_news)
+
+    p = commands.add_parser("export-news", help="Экспорт новостей в NDJSON")
+    p.add_argument("path", nargs="?", default="-")
+    p.add_argument("--batch-size", type=int, default=bulk.BULK_BATCH_SIZE)
+    p.set_defaults(func=export_news)
+
+    p = commands.add_parser("relay-outbox", help="Отправить события outbox в Celery")
+    p.add_argument("--loop", action="store_true", help="Работать постоянно")
+    p.add_argument("--interval", type=float, default=outbox.OUTBOX_RELAY_INTERVAL)
+    p.add_argument("--batch-size", type=int, default=outbox.OUTBOX_BATCH_SIZE)
+    p.set_defaults(func=relay_outbox)
+
+    p = commands.add_parser("migrate", help="Применить миграции схемы БД")
+    p.add_argument("revision", nargs="?", default="head")
+    p.set_defaults(func=migrate)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
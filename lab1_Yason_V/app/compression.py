@@ -0,0 +1,156 @@
+import gzip
+import io
+import os
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Brotli в requirements; без него (урезанная установка) - только gzip
+    brotli = None
+
+# Сжатие ответов по Accept-Encoding: br или gzip.
+# Маленькие ответы и уже сжатые форматы (картинки, архивы) не трогаем.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    # Без разбора q-значений: q=0 явно отключает кодировку, остальное - порядок предпочтения
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        offered[name.strip()] = params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    if brotli is not None and offered.get("br"):
+        return "br"
+    if offered.get("gzip"):
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+async def compressed_variant(cache, key: str, body: bytes, encoding: str) -> bytes:
+    # Заранее сжатое тело горячей записи в кэше: ключ должен включать версию,
+    # тогда устаревшие варианты просто вытесняются, без отдельной инвалидации
+    async def load():
+        return compress(body, encoding)
+
+    return await cache.get_or_load(f"{key}:{encoding}", load)
+
+
+class _StreamCompressor:
+    # Потоковое сжатие для ответов из нескольких чанков (экспорт NDJSON)
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._buffer = io.BytesIO()
+            self._gzip = gzip.GzipFile(mode="wb", fileobj=self._buffer, compresslevel=GZIP_LEVEL)
+
+    def feed(self, chunk: bytes, last: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(chunk)
+            return out + self._brotli.finish() if last else out + self._brotli.flush()
+        self._gzip.write(chunk)
+        if last:
+            self._gzip.close()
+        else:
+            self._gzip.flush()
+        out = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return out
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _skip(self, headers: Headers) -> bool:
+        # Уже сжато (например, заранее сжатая новость из кэша), частичный ответ или не текст
+        if "content-encoding" in headers or self.start_message["status"] in (204, 206, 304):
+            return True
+        content_type = headers.get("content-type", "")
+        # SSE: каждое событие должно уйти клиенту сразу, без буфера компрессора
+        if content_type.startswith("text/event-stream"):
+            return True
+        return not content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Заголовки отправим, когда увидим первый кусок тела
+            self.start_message = message
+            self.passthrough = self._skip(Headers(raw=message["headers"]))
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            if not more_body and len(body) < self.minimum_size:
+                await self.send(start)
+                await self.send(message)
+                return
+            headers.add_vary_header("Accept-Encoding")
+            headers["Content-Encoding"] = self.encoding
+            if not more_body:
+                body = compress(body, self.encoding)
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            del headers["Content-Length"]
+            self.compressor = _StreamCompressor(self.encoding)
+            await self.send(start)
+        if self.compressor is None:
+            # Короткий ответ уже отправлен как есть - остатков быть не может
+            await self.send(message)
+            return
+        await self.send({
+            "type": "http.response.body",
+            "body": self.compressor.feed(body, last=not more_body),
+            "more_body": more_body,
+        })
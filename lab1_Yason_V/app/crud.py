@@ -1,6 +1,11 @@
+from sqlalchemy import select, delete, func, insert, exists, literal, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from . import models, schemas, auth
+from . import models, schemas, auth, bulk, search  # search - события заполнения search_text
+
+# Синхронные функции - для Celery-задач и CLI. Изменения пользователей, новостей
+# и комментариев идут только через crud_async: там же инвалидируется кэш
 
 # USERS
 def create_user(db: Session, user_in: schemas.UserCreate):
@@ -38,24 +43,48 @@ def get_user(db: Session, user_id: int):
 def list_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
-def update_user(db: Session, user_id: int, data: dict):
-    user = get_user(db, user_id)
-    if not user:
-        return None
-    
-    for key, value in data.items():
-        if key == "password" and value:
-            value = auth.get_password_hash(value)
-        setattr(user, key, value)
-    
-    db.commit()
-    db.refresh(user)
-    return user
+def iter_user_id_ranges(db: Session, chunk_size: int = 1000):
+    # Границы чанков (after_id, last_id] по keyset на id: на каждый чанк -
+    # один поиск по индексу, без загрузки пользователей в память
+    after_id = 0
+    while True:
+        last_id = db.execute(
+            select(models.User.id)
+            .where(models.User.id > after_id)
+            .order_by(models.User.id)
+            .offset(chunk_size - 1)
+            .limit(1)
+        ).scalar()
+        if last_id is None:
+            # Хвост меньше chunk_size
+            tail = db.execute(
+                select(models.User.id).where(models.User.id > after_id).order_by(models.User.id.desc()).limit(1)
+            ).scalar()
+            if tail is not None:
+                yield after_id, tail
+            return
+        yield after_id, last_id
+        after_id = last_id
+
+def iter_user_batches(db: Session, after_id: int = 0, last_id: int = None, batch_size: int = 1000):
+    # Пользователи (id, email) пачками по keyset - память не растет с числом пользователей
+    while True:
+        query = select(models.User.id, models.User.email).where(models.User.id > after_id)
+        if last_id is not None:
+            query = query.where(models.User.id <= last_id)
+        batch = db.execute(query.order_by(models.User.id).limit(batch_size)).all()
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1].id
 
 # NEWS
 def create_news(db: Session, news_in: schemas.NewsCreate, author_id: int):
     news = models.News(**news_in.dict(), author_id=author_id)
     db.add(news)
+    # id нужен событию outbox; коммит - один на новость и событие
+    db.flush()
+    add_outbox_event(db, "news.created", {"news_id": news.id})
     db.commit()
     db.refresh(news)
     return news
@@ -63,26 +92,36 @@ def create_news(db: Session, news_in: schemas.NewsCreate, author_id: int):
 def get_news(db: Session, news_id: int):
     return db.query(models.News).filter(models.News.id == news_id).first()
 
-def update_news(db: Session, news_obj, data: dict):
-    for k, v in data.items():
-        setattr(news_obj, k, v)
-    db.add(news_obj)
-    db.commit()
-    db.refresh(news_obj)
-    return news_obj
+def count_news_since(db: Session, since: datetime):
+    return db.execute(
+        select(func.count()).select_from(models.News).where(models.News.published_at >= since)
+    ).scalar()
 
-def delete_news(db: Session, news_obj):
-    db.delete(news_obj)
-    db.commit()
+def list_news_titles_since(db: Session, since: datetime, limit: int = 50):
+    return db.execute(
+        select(models.News.title)
+        .where(models.News.published_at >= since)
+        .order_by(models.News.published_at.desc(), models.News.id.desc())
+        .limit(limit)
+    ).scalars().all()
 
-# COMMENTS
-def create_comment(db: Session, comment_in: schemas.CommentCreate, author_id: int):
-    comment = models.Comment(**comment_in.dict(), author_id=author_id)
-    db.add(comment)
+def bulk_insert_news(db: Session, rows: list):
+    # Один батч - один executemany/COPY и один commit, без refresh по каждой строке
+    if db.bind.dialect.name == "postgresql":
+        columns = ", ".join(bulk.NEWS_COPY_COLUMNS)
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert(f"COPY news ({columns}) FROM STDIN WITH (FORMAT csv)", bulk.copy_csv(rows))
+    else:
+        db.execute(insert(models.News), rows)
     db.commit()
-    db.refresh(comment)
-    return comment
+    return len(rows)
 
+def iter_news(db: Session, batch_size: int = 1000):
+    # Экспорт без загрузки таблицы в память: курсор на сервере, батчи по yield_per
+    query = select(*models.News.__table__.c).order_by(models.News.id).execution_options(yield_per=batch_size)
+    yield from db.execute(query)
+
+# COMMENTS
 def get_comment(db: Session, comment_id: int):
     return db.query(models.Comment).filter(models.Comment.id == comment_id).first()
 
@@ -94,16 +133,12 @@ def update_comment(db: Session, comment_obj, data: dict):
     db.refresh(comment_obj)
     return comment_obj
 
-def delete_comment(db: Session, comment_obj):
-    db.delete(comment_obj)
-    db.commit()
-
 # REFRESH SESSIONS
 def create_refresh_session(db: Session, user_id: int, refresh_token: str, user_agent: str = None):
-    expires_at = datetime.utcnow() + timedelta(days=7)
+    expires_at = datetime.utcnow() + timedelta(days=auth.REFRESH_TOKEN_EXPIRE_DAYS)
     session = models.RefreshSession(
         user_id=user_id,
-        refresh_token=refresh_token,
+        token_hash=auth.hash_token(refresh_token),
         user_agent=user_agent,
         expires_at=expires_at
     )
@@ -114,14 +149,125 @@ def create_refresh_session(db: Session, user_id: int, refresh_token: str, user_a
 
 def get_refresh_session(db: Session, refresh_token: str):
     return db.query(models.RefreshSession).filter(
-        models.RefreshSession.refresh_token == refresh_token
+        models.RefreshSession.token_hash == auth.hash_token(refresh_token)
     ).first()
 
 def delete_refresh_session(db: Session, refresh_token: str):
-    session = get_refresh_session(db, refresh_token)
-    if session:
-        db.delete(session)
+    db.execute(
+        delete(models.RefreshSession).where(
+            models.RefreshSession.token_hash == auth.hash_token(refresh_token)
+        )
+    )
+    db.commit()
+
+def purge_expired_refresh_sessions(db: Session, now: datetime = None, batch_size: int = 1000):
+    # Удаляем пачками по batch_size: короткие транзакции не держат блокировку
+    # таблицы долго, даже если просроченных сессий накопились миллионы
+    now = now or datetime.utcnow()
+    total = 0
+    while True:
+        expired_ids = select(models.RefreshSession.id).where(
+            models.RefreshSession.expires_at < now
+        ).limit(batch_size)
+        deleted = db.execute(
+            delete(models.RefreshSession).where(models.RefreshSession.id.in_(expired_ids))
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+# OUTBOX
+def add_outbox_event(db: Session, topic: str, payload: dict):
+    # Без коммита: событие уходит вместе с транзакцией вызывающего
+    event = models.OutboxEvent(topic=topic, payload=payload)
+    db.add(event)
+    return event
+
+def claim_event(db: Session, event_id: int, consumer: str) -> bool:
+    # False - событие уже обработано этим получателем (повторная доставка).
+    # Отметка фиксируется коммитом вызывающего, после успешной обработки
+    db.add(models.ProcessedEvent(event_id=event_id, consumer=consumer))
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+def purge_outbox(db: Session, older_than: datetime, batch_size: int = 1000):
+    # Отправленные события и отметки об обработке старше older_than, пачками
+    total = 0
+    for model, column, condition in (
+        (models.OutboxEvent, models.OutboxEvent.id, models.OutboxEvent.dispatched_at < older_than),
+        (models.ProcessedEvent, models.ProcessedEvent.event_id, models.ProcessedEvent.processed_at < older_than),
+    ):
+        while True:
+            ids = select(column).where(condition).limit(batch_size)
+            deleted = db.execute(delete(model).where(column.in_(ids))).rowcount
+            db.commit()
+            total += deleted
+            if deleted < batch_size:
+                break
+    return total
+
+# FEED
+def fanout_news(db: Session, news_id: int, threshold: int):
+    # Запись новости в ленты подписчиков автора одним INSERT ... SELECT.
+    # None - новости нет; 0 у автора с threshold+ подписчиков - его новости
+    # подмешиваются при чтении ленты. Коммит - за вызывающим
+    row = db.execute(
+        select(models.News.author_id, models.News.published_at, models.User.follower_count)
+        .join(models.User, models.User.id == models.News.author_id)
+        .where(models.News.id == news_id)
+    ).first()
+    if row is None:
+        return None
+    if row.follower_count >= threshold:
+        return 0
+    entry = models.TimelineEntry
+    followers = (
+        select(models.Subscription.follower_id, literal(row.published_at), literal(news_id))
+        .where(models.Subscription.author_id == row.author_id)
+        # Подписавшийся после публикации уже получил новость при подписке
+        .where(~exists().where(
+            entry.user_id == models.Subscription.follower_id,
+            entry.published_at == row.published_at,
+            entry.news_id == news_id,
+        ))
+    )
+    return db.execute(
+        insert(entry).from_select(["user_id", "published_at", "news_id"], followers)
+    ).rowcount
+
+def trim_timelines(db: Session, length: int, chunk_size: int = 1000):
+    # Оставляет в каждой ленте length последних записей. Переполненные ленты
+    # ищутся по чанкам пользователей, удаление - по границе length-й записи
+    entry = models.TimelineEntry
+    total = 0
+    for after_id, last_id in iter_user_id_ranges(db, chunk_size):
+        overfull = db.execute(
+            select(entry.user_id)
+            .where(entry.user_id > after_id, entry.user_id <= last_id)
+            .group_by(entry.user_id)
+            .having(func.count() > length)
+        ).scalars().all()
+        for user_id in overfull:
+            boundary = db.execute(
+                select(entry.published_at, entry.news_id)
+                .where(entry.user_id == user_id)
+                .order_by(entry.published_at.desc(), entry.news_id.desc())
+                .offset(length)
+                .limit(1)
+            ).first()
+            total += db.execute(
+                delete(entry).where(
+                    entry.user_id == user_id,
+                    tuple_(entry.published_at, entry.news_id) <= tuple_(*boundary),
+                )
+            ).rowcount
         db.commit()
+    return total
 
 def delete_all_user_sessions(db: Session, user_id: int):
     db.query(models.RefreshSession).filter(
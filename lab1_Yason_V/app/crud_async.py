@@ -0,0 +1,452 @@
+from sqlalchemy import select, delete, update, func, tuple_, insert, literal, or_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, noload
+from datetime import datetime, timedelta
+from . import models, schemas, auth, bulk, search, serialization, events, feed
+from .pagination import paginate
+from .cache import REPLICA_CACHE_TTL, news_cache, news_key, user_cache, user_key
+from .db import on_replica, reads_own_writes
+
+# Асинхронные версии функций из crud.py - используются роутерами.
+# Хеширование argon2 тяжелое по CPU и идет в отдельном пуле auth.
+
+# USERS
+async def create_user(db: AsyncSession, user_in: schemas.UserCreate):
+    hashed_password = await auth.get_password_hash_async(user_in.password)
+    user = models.User(
+        name=user_in.name,
+        email=user_in.email,
+        hashed_password=hashed_password
+    )
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+async def create_oauth_user(db: AsyncSession, user_in: schemas.UserOAuthCreate):
+    user = models.User(
+        name=user_in.name,
+        email=user_in.email,
+        github_id=user_in.github_id
+    )
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+async def get_user_by_github_id(db: AsyncSession, github_id: str):
+    result = await db.execute(select(models.User).where(models.User.github_id == github_id))
+    return result.scalars().first()
+
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
+
+async def get_user_principal(db: AsyncSession, user_id: int):
+    # id + роли из кэша: авторизация запроса без SELECT пользователя
+    async def load():
+        result = await db.execute(
+            select(models.User.id, models.User.is_author, models.User.is_admin)
+            .where(models.User.id == user_id)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        return schemas.UserPrincipal.model_validate(row).model_dump_json().encode()
+
+    raw = await user_cache.get_or_load(user_key(user_id), load)
+    return schemas.UserPrincipal.model_validate_json(raw) if raw else None
+
+async def get_user_version(db: AsyncSession, user_id: int):
+    # (version, updated_at) без чтения всей строки - для If-None-Match
+    result = await db.execute(
+        select(models.User.version, models.User.updated_at).where(models.User.id == user_id)
+    )
+    return result.first()
+
+async def list_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(
+        select(models.User).order_by(models.User.id).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+async def update_user(db: AsyncSession, user_id: int, data: dict):
+    user = await get_user(db, user_id)
+    if not user:
+        return None
+
+    for key, value in data.items():
+        if key == "password" and value:
+            value = await auth.get_password_hash_async(value)
+        setattr(user, key, value)
+    user.version = models.User.version + 1
+
+    await db.commit()
+    await user_cache.invalidate(user_key(user_id))
+    await db.refresh(user)
+    return user
+
+async def set_password_hash(db: AsyncSession, user_obj, hashed_password: str):
+    user_obj.hashed_password = hashed_password
+    await db.commit()
+
+async def delete_user(db: AsyncSession, user_obj):
+    # Подписки и лента - без ORM-связей, чистим явно
+    await db.execute(
+        update(models.User)
+        .where(models.User.id.in_(select(models.Subscription.author_id).where(models.Subscription.follower_id == user_obj.id)))
+        .values(follower_count=models.User.follower_count - 1)
+    )
+    await db.execute(delete(models.Subscription).where(
+        or_(models.Subscription.follower_id == user_obj.id, models.Subscription.author_id == user_obj.id)
+    ))
+    await db.execute(delete(models.TimelineEntry).where(models.TimelineEntry.user_id == user_obj.id))
+    # Каскад удалит и комментарии пользователя к чужим новостям: одним UPDATE
+    # вычитаем их число из comment_count каждой такой новости
+    commented = (await db.execute(
+        select(models.Comment.news_id).distinct().where(models.Comment.author_id == user_obj.id)
+    )).scalars().all()
+    if commented:
+        own_comments = (
+            select(func.count())
+            .where(models.Comment.news_id == models.News.id, models.Comment.author_id == user_obj.id)
+            .scalar_subquery()
+        )
+        await db.execute(
+            update(models.News)
+            .where(models.News.id.in_(commented))
+            .values(comment_count=models.News.comment_count - own_comments, version=models.News.version + 1)
+        )
+    # Новости самого пользователя удаляются вместе с ним - их тоже убираем из кэша
+    authored = (await db.execute(
+        select(models.News.id).where(models.News.author_id == user_obj.id)
+    )).scalars().all()
+    await db.delete(user_obj)
+    await db.commit()
+    await user_cache.invalidate(user_key(user_obj.id))
+    for news_id in set(commented) | set(authored):
+        await news_cache.invalidate(news_key(news_id))
+
+# NEWS
+async def create_news(db: AsyncSession, news_in: schemas.NewsCreate, author_id: int):
+    news = models.News(**news_in.dict(), author_id=author_id)
+    db.add(news)
+    # Уведомление - через outbox в той же транзакции: запись не ждет брокер
+    # и не теряет событие, если Redis недоступен
+    await db.flush()
+    db.add(models.OutboxEvent(topic="news.created", payload={"news_id": news.id}))
+    await db.commit()
+    await db.refresh(news)
+    # Подписчики /stream узнают о новости без опроса
+    await events.news_created(news)
+    return news
+
+async def get_news(db: AsyncSession, news_id: int):
+    return await db.get(models.News, news_id)
+
+async def get_news_entity(db: AsyncSession, news_id: int):
+    # (version, updated_at, готовый JSON NewsRead) из кэша; на промахе - один
+    # SELECT на все одновременные запросы этой новости
+    async def load():
+        news = await get_news(db, news_id)
+        if news is None:
+            return None
+        body = serialization.dumps(serialization.news_dict(news))
+        return serialization.pack_entity(news.version, news.updated_at or news.published_at, body)
+
+    raw = await news_cache.get_or_load(
+        news_key(news_id), load,
+        ttl=REPLICA_CACHE_TTL if on_replica(db) else None,
+        # Только что писавший клиент читает primary и заодно чинит кэш
+        refresh=reads_own_writes(db),
+    )
+    return serialization.unpack_entity(raw) if raw else None
+
+async def get_news_json(db: AsyncSession, news_id: int):
+    entity = await get_news_entity(db, news_id)
+    return entity[2] if entity else None
+
+async def get_news_version(db: AsyncSession, news_id: int):
+    # (version, updated_at) для условного GET: из кэша, иначе SELECT без content
+    raw = None if reads_own_writes(db) else await news_cache.get(news_key(news_id))
+    if raw:
+        version, updated_at, _ = serialization.unpack_entity(raw)
+        return version, updated_at
+    result = await db.execute(
+        select(models.News.version, models.News.updated_at, models.News.published_at)
+        .where(models.News.id == news_id)
+    )
+    row = result.first()
+    return (row.version, row.updated_at or row.published_at) if row else None
+
+async def list_news(
+    db: AsyncSession,
+    limit: int = 20,
+    cursor=None,
+    author_id: int = None,
+    date_from: datetime = None,
+    date_to: datetime = None,
+):
+    # Keyset-пагинация: WHERE (published_at, id) < курсор вместо OFFSET,
+    # поэтому глубокие страницы стоят столько же, сколько первая
+    query = select(models.News)
+    if author_id is not None:
+        query = query.where(models.News.author_id == author_id)
+    if date_from is not None:
+        query = query.where(models.News.published_at >= date_from)
+    if date_to is not None:
+        query = query.where(models.News.published_at < date_to)
+    if cursor is not None:
+        query = query.where(tuple_(models.News.published_at, models.News.id) < tuple_(*cursor))
+    query = query.order_by(models.News.published_at.desc(), models.News.id.desc()).limit(limit + 1)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def bulk_insert_news(db: AsyncSession, rows: list):
+    # Один батч - один executemany/COPY и один commit, без refresh по каждой строке
+    if db.bind.dialect.name == "postgresql":
+        conn = await db.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "news", records=[bulk.copy_record(r) for r in rows], columns=bulk.NEWS_COPY_COLUMNS
+        )
+    else:
+        await db.execute(insert(models.News), rows)
+    await db.commit()
+    return len(rows)
+
+async def stream_news(db: AsyncSession, batch_size: int = 1000):
+    # Экспорт без загрузки таблицы в память: курсор на сервере, батчи по yield_per
+    query = select(*models.News.__table__.c).order_by(models.News.id).execution_options(yield_per=batch_size)
+    result = await db.stream(query)
+    async for row in result:
+        yield row
+
+async def search_news(db: AsyncSession, query: str, limit: int = 20, offset: int = 0):
+    # Ранжированные результаты - обычный offset, глубоко по релевантности не листают
+    statement, match = search.search_statement(db.bind.dialect.name, query)
+    if statement is None:
+        return []
+    result = await db.execute(statement, {"query": match, "limit": limit + 1, "offset": offset})
+    return result.mappings().all()
+
+async def update_news(db: AsyncSession, news_obj, data: dict):
+    for k, v in data.items():
+        setattr(news_obj, k, v)
+    news_obj.version = models.News.version + 1
+    db.add(news_obj)
+    await db.commit()
+    await news_cache.invalidate(news_key(news_obj.id))
+    await db.refresh(news_obj)
+    await events.news_updated(news_obj)
+    return news_obj
+
+async def delete_news(db: AsyncSession, news_obj):
+    await db.delete(news_obj)
+    await db.commit()
+    await news_cache.invalidate(news_key(news_obj.id))
+    await events.news_deleted(news_obj.id)
+
+# COMMENTS
+def _change_comment_count(news_id: int, delta: int):
+    return (
+        update(models.News)
+        .where(models.News.id == news_id)
+        .values(comment_count=models.News.comment_count + delta, version=models.News.version + 1)
+    )
+
+async def create_comment(db: AsyncSession, comment_in: schemas.CommentCreate, author_id: int):
+    comment = models.Comment(**comment_in.dict(), author_id=author_id)
+    db.add(comment)
+    # Счетчик меняется в той же транзакции - без COUNT(*) на чтении
+    await db.execute(_change_comment_count(comment_in.news_id, 1))
+    await db.commit()
+    # comment_count входит в NewsRead - закэшированная новость устарела
+    await news_cache.invalidate(news_key(comment_in.news_id))
+    await db.refresh(comment)
+    await events.comment_created(comment)
+    return comment
+
+async def get_comment(db: AsyncSession, comment_id: int):
+    return await db.get(models.Comment, comment_id)
+
+async def list_comments(
+    db: AsyncSession,
+    news_id: int,
+    limit: int = 20,
+    cursor=None,
+    include_author: bool = False,
+):
+    query = select(models.Comment).where(models.Comment.news_id == news_id)
+    if cursor is not None:
+        query = query.where(tuple_(models.Comment.published_at, models.Comment.id) > tuple_(*cursor))
+    # Авторы страницы подгружаются одним IN-запросом, а не по одному на комментарий
+    query = query.options(selectinload(models.Comment.author) if include_author else noload(models.Comment.author))
+    query = query.order_by(models.Comment.published_at, models.Comment.id).limit(limit + 1)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def update_comment(db: AsyncSession, comment_obj, data: dict):
+    for k, v in data.items():
+        setattr(comment_obj, k, v)
+    db.add(comment_obj)
+    await db.commit()
+    await db.refresh(comment_obj)
+    return comment_obj
+
+async def delete_comment(db: AsyncSession, comment_obj):
+    await db.delete(comment_obj)
+    await db.execute(_change_comment_count(comment_obj.news_id, -1))
+    await db.commit()
+    await news_cache.invalidate(news_key(comment_obj.news_id))
+
+# FEED
+async def follow(db: AsyncSession, follower_id: int, author_id: int) -> bool:
+    # False - подписка уже есть
+    if await db.get(models.Subscription, (follower_id, author_id)) is not None:
+        return False
+    db.add(models.Subscription(follower_id=follower_id, author_id=author_id))
+    follower_count = (await db.execute(
+        update(models.User)
+        .where(models.User.id == author_id)
+        .values(follower_count=models.User.follower_count + 1)
+        .returning(models.User.follower_count)
+    )).scalar()
+    if follower_count < feed.FEED_FANOUT_THRESHOLD:
+        # Лента не пустеет до следующей новости автора: последние его новости
+        # сразу попадают в нее. Новости "знаменитостей" читаются при запросе
+        latest = (
+            select(literal(follower_id), models.News.published_at, models.News.id)
+            .where(models.News.author_id == author_id)
+            .order_by(models.News.published_at.desc(), models.News.id.desc())
+            .limit(feed.FEED_BACKFILL)
+        )
+        await db.execute(
+            insert(models.TimelineEntry).from_select(["user_id", "published_at", "news_id"], latest)
+        )
+    await db.commit()
+    return True
+
+async def unfollow(db: AsyncSession, follower_id: int, author_id: int) -> bool:
+    deleted = (await db.execute(delete(models.Subscription).where(
+        models.Subscription.follower_id == follower_id, models.Subscription.author_id == author_id
+    ))).rowcount
+    if not deleted:
+        return False
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == author_id)
+        .values(follower_count=models.User.follower_count - 1)
+    )
+    await db.execute(delete(models.TimelineEntry).where(
+        models.TimelineEntry.user_id == follower_id,
+        models.TimelineEntry.news_id.in_(select(models.News.id).where(models.News.author_id == author_id)),
+    ))
+    await db.commit()
+    return True
+
+async def get_feed(db: AsyncSession, user_id: int, limit: int = 20, cursor=None):
+    # Страница ленты: диапазон timeline_entries по первичному ключу плюс не более
+    # limit + 1 последних новостей каждого followed-автора выше порога раскладки.
+    # Стоимость - O(страница), а не O(число подписок)
+    entry = models.TimelineEntry
+    # JOIN по первичному ключу news: удаленные новости отсеиваются здесь же
+    materialized = (
+        select(models.News)
+        .join(entry, (entry.news_id == models.News.id) & (entry.user_id == user_id))
+    )
+    if cursor is not None:
+        materialized = materialized.where(tuple_(entry.published_at, entry.news_id) < tuple_(*cursor))
+    materialized = materialized.order_by(entry.published_at.desc(), entry.news_id.desc()).limit(limit + 1)
+    rows = (await db.execute(materialized)).scalars().all()
+
+    celebrities = (await db.execute(
+        select(models.Subscription.author_id)
+        .join(models.User, models.User.id == models.Subscription.author_id)
+        .where(models.Subscription.follower_id == user_id, models.User.follower_count >= feed.FEED_FANOUT_THRESHOLD)
+    )).scalars().all()
+    on_read = []
+    if celebrities:
+        per_author = []
+        for author_id in celebrities:
+            query = select(models.News.id).where(models.News.author_id == author_id)
+            if cursor is not None:
+                query = query.where(tuple_(models.News.published_at, models.News.id) < tuple_(*cursor))
+            # Подзапрос: LIMIT внутри UNION ALL (SQLite не допускает его в ветке напрямую)
+            page = query.order_by(models.News.published_at.desc(), models.News.id.desc()).limit(limit + 1).subquery()
+            per_author.append(select(page.c.id))
+        on_read = (await db.execute(
+            select(models.News).where(models.News.id.in_(union_all(*per_author)))
+        )).scalars().all()
+
+    return paginate(feed.merge(rows, on_read, limit), limit)
+
+# REFRESH SESSIONS
+def _new_refresh_session(user_id: int, refresh_token: str, user_agent: str = None):
+    return models.RefreshSession(
+        user_id=user_id,
+        token_hash=auth.hash_token(refresh_token),
+        user_agent=user_agent,
+        expires_at=datetime.utcnow() + timedelta(days=auth.REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+
+async def create_refresh_session(db: AsyncSession, user_id: int, refresh_token: str, user_agent: str = None):
+    session = _new_refresh_session(user_id, refresh_token, user_agent)
+    db.add(session)
+    await db.commit()
+    return session
+
+async def get_refresh_session(db: AsyncSession, refresh_token: str):
+    result = await db.execute(
+        select(models.RefreshSession).where(
+            models.RefreshSession.token_hash == auth.hash_token(refresh_token)
+        )
+    )
+    return result.scalars().first()
+
+async def rotate_refresh_session(db: AsyncSession, refresh_token: str, new_refresh_token: str, user_agent: str = None):
+    # Старая сессия удаляется и новая создается в одной транзакции:
+    # DELETE ... RETURNING сразу и проверяет токен, и отдает user_id.
+    # Два параллельных refresh одним токеном не пройдут оба.
+    result = await db.execute(
+        delete(models.RefreshSession)
+        .where(
+            models.RefreshSession.token_hash == auth.hash_token(refresh_token),
+            models.RefreshSession.expires_at > datetime.utcnow(),
+        )
+        .returning(models.RefreshSession.user_id)
+    )
+    user_id = result.scalar()
+    if user_id is None:
+        await db.rollback()
+        return None
+    db.add(_new_refresh_session(user_id, new_refresh_token, user_agent))
+    await db.commit()
+    return user_id
+
+async def delete_refresh_session(db: AsyncSession, refresh_token: str):
+    await db.execute(
+        delete(models.RefreshSession).where(
+            models.RefreshSession.token_hash == auth.hash_token(refresh_token)
+        )
+    )
+    await db.commit()
+
+async def delete_all_user_sessions(db: AsyncSession, user_id: int):
+    await db.execute(
+        delete(models.RefreshSession).where(
+            models.RefreshSession.user_id == user_id
+        )
+    )
+    await db.commit()
+
+async def get_user_sessions(db: AsyncSession, user_id: int):
+    result = await db.execute(
+        select(models.RefreshSession).where(
+            models.RefreshSession.user_id == user_id
+        )
+    )
+    return result.scalars().all()
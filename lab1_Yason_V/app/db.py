@@ -1,9 +1,209 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import contextvars
+import os
+import time
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from .metrics import Histogram
+from .instrumentation import install_db_metrics
 
-# Используем SQLite для быстрого старта
-DATABASE_URL = "sqlite:///./test.db"
+# Используем SQLite для быстрого старта, в docker-compose - Postgres
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Настройки пула - задаются per-deployment через окружение
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+
+# SQLite: WAL позволяет читать параллельно с записью, busy_timeout - ждать
+# блокировку вместо мгновенного "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+
+
+def make_async_url(url: str) -> str:
+    # Тот же DSN, но с асинхронным драйвером: aiosqlite / asyncpg
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql+psycopg2://"):
+        return url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", make_async_url(DATABASE_URL))
+
+# Реплики для чтения (через запятую, DSN как у DATABASE_URL). Пусто - все на primary.
+# Локально - копия SQLite только на чтение: sqlite:///file:replica.db?mode=ro&uri=true
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+# Короткое ожидание пула реплики: занятая или упавшая реплика (новые соединения
+# не создаются, ожидающих никто не будит) не держит запрос DB_POOL_TIMEOUT секунд -
+# он уходит на следующую реплику или на primary
+DB_REPLICA_POOL_TIMEOUT = float(os.getenv("DB_REPLICA_POOL_TIMEOUT", 1))
+
+
+class PoolMetricsMixin:
+    # Время ожидания соединения из пула (включая открытие нового)
+    wait_time = None
+    timeouts = 0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            type(self).timeouts += 1
+            raise
+        finally:
+            self.wait_time.observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(PoolMetricsMixin, QueuePool):
+    wait_time = Histogram()
+
+
+class TimedAsyncQueuePool(PoolMetricsMixin, AsyncAdaptedQueuePool):
+    wait_time = Histogram()
+
+
+def replica_pool_class(n: int):
+    # Свой класс - своя гистограмма ожидания и счетчик таймаутов у каждой реплики
+    return type(f"TimedReplicaQueuePool{n}", (TimedAsyncQueuePool,), {"wait_time": Histogram(), "timeouts": 0})
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def engine_options(url: str, poolclass) -> dict:
+    options = {"echo": DB_ECHO}
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+        # Для in-memory базы пул не нужен - там одно соединение
+        if ":memory:" in url or url.rstrip("/").endswith("sqlite:"):
+            return options
+    options.update(
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.close()
+
+
+def set_sqlite_replica_pragmas(dbapi_connection, connection_record):
+    # Реплика открыта только на чтение: режим журнала - свойство файла, не меняем
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+# Синхронный движок - для Celery-задач и CLI
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, TimedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Записи текущего HTTP-запроса: [была ли запись]. Изменяемый список, как
+# _request_db в instrumentation - его видят и сессии внутри обработчика
+_request_writes = contextvars.ContextVar("request_writes", default=None)
+
+
+class RoutingSession(Session):
+    """Чтения - на реплику из info["replica"], если она задана. flush и
+    INSERT/UPDATE/DELETE - всегда на primary, и после первой записи сессия до
+    конца остается на primary: следующие SELECT видят свои же изменения."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["replica"] = None
+            writes = _request_writes.get()
+            if writes is not None:
+                writes[0] = True
+        elif self.info.get("replica") is not None and kw.get("bind") is None:
+            return self.info["replica"].sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def on_replica(db) -> bool:
+    return db.info.get("replica") is not None
+
+
+def reads_own_writes(db) -> bool:
+    # Клиент недавно писал: читаем primary в обход кэша, который мог наполнить
+    # чужой запрос с отстающей реплики
+    return db.info.get("read_your_writes", False)
+
+
+# Асинхронный движок - для роутеров FastAPI
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, TimedAsyncQueuePool)
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False, sync_session_class=RoutingSession
+)
+
+
+def make_replica_engine(n: int, url: str):
+    # Только асинхронные: реплики читают роутеры, Celery и CLI работают с primary
+    url = make_async_url(url)
+    options = engine_options(url, replica_pool_class(n))
+    if "pool_timeout" in options:
+        options["pool_timeout"] = DB_REPLICA_POOL_TIMEOUT
+    replica = create_async_engine(url, **options)
+    if is_sqlite(url):
+        event.listen(replica.sync_engine, "connect", set_sqlite_replica_pragmas)
+    return replica
+
+
+replica_engines = [make_replica_engine(n, url) for n, url in enumerate(DATABASE_REPLICA_URLS)]
+
+if is_sqlite(DATABASE_URL):
+    event.listen(engine, "connect", set_sqlite_pragmas)
+if is_sqlite(ASYNC_DATABASE_URL):
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+# Число и время запросов к БД - в метриках, в том числе на HTTP-запрос.
+# Сами события SQLAlchemy стоят ~20 мкс на запрос - можно выключить.
+if os.getenv("METRICS_DB_EVENTS", "true").lower() in ("1", "true", "yes"):
+    install_db_metrics(engine, "sync")
+    install_db_metrics(async_engine.sync_engine, "async")
+    for n, replica in enumerate(replica_engines):
+        install_db_metrics(replica.sync_engine, f"replica{n}")
+
 Base = declarative_base()
+
+
+def pool_stats() -> dict:
+    stats = {}
+    pools = [("sync", engine.pool), ("async", async_engine.pool)]
+    pools += [(f"replica{n}", replica.pool) for n, replica in enumerate(replica_engines)]
+    for name, pool in pools:
+        entry = {"pool_class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+                max_overflow=pool._max_overflow,
+                timeouts=type(pool).timeouts,
+                wait_time=type(pool).wait_time.snapshot(),
+            )
+        stats[name] = entry
+    return stats
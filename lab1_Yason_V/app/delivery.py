@@ -0,0 +1,272 @@
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# file - пишет в лог-файлы (как раньше), smtp - реальная отправка,
+# memory - складывает в список (для тестов и бенчмарков)
+DELIVERY_BACKEND = os.getenv("DELIVERY_BACKEND", "file")
+DELIVERY_RATE = float(os.getenv("DELIVERY_RATE", 0))  # сообщений/сек, 0 - без ограничения
+DELIVERY_CONCURRENCY = int(os.getenv("DELIVERY_CONCURRENCY", 4))
+DELIVERY_MAX_RETRIES = int(os.getenv("DELIVERY_MAX_RETRIES", 3))
+DELIVERY_RETRY_DELAY = float(os.getenv("DELIVERY_RETRY_DELAY", 0.5))
+
+NOTIFICATIONS_LOG = os.getenv("NOTIFICATIONS_LOG", "notifications.log")
+DIGESTS_LOG = os.getenv("DIGESTS_LOG", "digests.log")
+
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 25))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() in ("1", "true", "yes")
+SMTP_FROM = os.getenv("SMTP_FROM", "news@localhost")
+
+
+class Message(NamedTuple):
+    recipient: str
+    subject: str
+    body: str
+    tag: str = "NEWS_NOTIFICATION"
+
+
+class DeliveryResult:
+    def __init__(self):
+        self.sent = 0
+        self.failed = []
+
+    def merge(self, other: "DeliveryResult") -> None:
+        self.sent += other.sent
+        self.failed.extend(other.failed)
+
+
+class PermanentDeliveryError(Exception):
+    """Ошибка, которую бессмысленно повторять (например, адрес отклонен)."""
+
+
+class RateLimiter:
+    """Token bucket: не больше rate сообщений в секунду, всплеск до burst."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class DeliveryBackend(ABC):
+    """Базовый backend: батчи, ограничение скорости, параллельность и
+    повторы по каждому получателю отдельно."""
+
+    def __init__(
+        self,
+        rate: float = DELIVERY_RATE,
+        concurrency: int = DELIVERY_CONCURRENCY,
+        max_retries: int = DELIVERY_MAX_RETRIES,
+        retry_delay: float = DELIVERY_RETRY_DELAY,
+    ):
+        self.limiter = RateLimiter(rate) if rate > 0 else None
+        self.concurrency = max(concurrency, 1)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def send_batch(self, messages) -> DeliveryResult:
+        messages = list(messages)
+        if self.concurrency == 1 or len(messages) <= 1:
+            return self._send_part(messages)
+        # Режем батч на concurrency частей, каждая - в своем потоке и соединении
+        parts = [messages[i::self.concurrency] for i in range(self.concurrency)]
+        result = DeliveryResult()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for part_result in executor.map(self._send_part, [p for p in parts if p]):
+                result.merge(part_result)
+        return result
+
+    def _send_part(self, messages) -> DeliveryResult:
+        result = DeliveryResult()
+        for message in messages:
+            if self._deliver_with_retries(message):
+                result.sent += 1
+            else:
+                result.failed.append(message)
+        return result
+
+    def _deliver_with_retries(self, message: Message) -> bool:
+        for attempt in range(self.max_retries + 1):
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                self.send(message)
+                return True
+            except PermanentDeliveryError as exc:
+                logger.error(f"Delivery to {message.recipient} rejected: {exc}")
+                return False
+            except Exception as exc:
+                logger.warning(f"Delivery to {message.recipient} failed (attempt {attempt + 1}): {exc}")
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+        return False
+
+    @abstractmethod
+    def send(self, message: Message) -> None:
+        # Одно сообщение; вызывается из потоков пула send_batch
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryBackend(DeliveryBackend):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.outbox = []
+        self._lock = threading.Lock()
+
+    def send(self, message: Message) -> None:
+        with self._lock:
+            self.outbox.append(message)
+
+
+class FileBackend(DeliveryBackend):
+    """Пишет строку на сообщение в лог по тегу: весь батч - одной записью."""
+
+    def __init__(self, paths: dict = None, **kwargs):
+        super().__init__(**kwargs)
+        self.paths = paths or {"NEWS_NOTIFICATION": NOTIFICATIONS_LOG, "WEEKLY_DIGEST": DIGESTS_LOG}
+
+    def send_batch(self, messages) -> DeliveryResult:
+        result = DeliveryResult()
+        timestamp = datetime.now().isoformat()
+        lines_by_path = {}
+        for message in messages:
+            if self.limiter:
+                self.limiter.acquire()
+            path = self.paths.get(message.tag, NOTIFICATIONS_LOG)
+            lines_by_path.setdefault(path, []).append(
+                f"{timestamp} - {message.tag} - User: {message.recipient}, {message.subject}\n"
+            )
+        for path, lines in lines_by_path.items():
+            try:
+                with open(path, 'a') as f:
+                    f.write("".join(lines))
+                result.sent += len(lines)
+            except OSError as exc:
+                logger.error(f"Failed to write {path}: {exc}")
+                result.failed.extend(m for m in messages if self.paths.get(m.tag, NOTIFICATIONS_LOG) == path)
+        return result
+
+    def send(self, message: Message) -> None:
+        self.send_batch([message])
+
+
+class SMTPBackend(DeliveryBackend):
+    """SMTP с пулом постоянных соединений: не открываем сессию на каждое письмо."""
+
+    def __init__(
+        self,
+        host: str = SMTP_HOST,
+        port: int = SMTP_PORT,
+        user: str = SMTP_USER,
+        password: str = SMTP_PASSWORD,
+        starttls: bool = SMTP_STARTTLS,
+        sender: str = SMTP_FROM,
+        timeout: float = 10,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.sender = sender
+        self.timeout = timeout
+        self._pool = queue.LifoQueue()
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            conn.starttls()
+        if self.user:
+            conn.login(self.user, self.password)
+        return conn
+
+    def _acquire(self) -> smtplib.SMTP:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def send(self, message: Message) -> None:
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message.recipient
+        email["Subject"] = message.subject
+        email.set_content(message.body)
+
+        conn = self._acquire()
+        try:
+            conn.send_message(email)
+        except smtplib.SMTPRecipientsRefused as exc:
+            # Соединение живое - возвращаем его в пул, адрес не повторяем
+            self._pool.put(conn)
+            raise PermanentDeliveryError(str(exc)) from exc
+        except Exception:
+            # Соединение в неизвестном состоянии - закрываем, повтор откроет новое
+            try:
+                conn.close()
+            except Exception:
+                pass
+            raise
+        self._pool.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                conn.quit()
+            except Exception:
+                conn.close()
+
+
+def make_backend(name: str = DELIVERY_BACKEND, **kwargs) -> DeliveryBackend:
+    if name == "smtp":
+        return SMTPBackend(**kwargs)
+    if name == "memory":
+        return MemoryBackend(**kwargs)
+    return FileBackend(**kwargs)
+
+
+_backend = None
+
+
+def get_backend() -> DeliveryBackend:
+    # Один backend на процесс воркера - SMTP-соединения переживают задачи
+    global _backend
+    if _backend is None:
+        _backend = make_backend()
+    return _backend
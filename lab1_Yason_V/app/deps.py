@@ -1,9 +1,10 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError
-from .db import SessionLocal
-from . import crud, auth
+from .db import SessionLocal, AsyncSessionLocal
+from . import crud, crud_async, auth, schemas, replicas
 
 security = HTTPBearer()
 
@@ -14,9 +15,22 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db(request: Request):
+    # Для GET без записи: сессия на реплике, если она есть и клиент не писал
+    # только что (replicas.py). Случайная запись все равно уйдет на primary
+    db = await replicas.open_read_session(request)
+    try:
+        yield db
+    finally:
+        await db.close()
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -34,7 +48,13 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
     
-    user = crud.get_user(db, user_id=user_id)
+    # Роли уже в токене - БД не нужна
+    if "is_author" in payload and "is_admin" in payload:
+        return schemas.UserPrincipal(
+            id=user_id, is_author=payload["is_author"], is_admin=payload["is_admin"]
+        )
+
+    user = await crud_async.get_user_principal(db, user_id)
     if user is None:
         raise credentials_exception
     
@@ -57,12 +77,12 @@ def get_current_author_or_admin_user(current_user = Depends(get_current_user)):
     return current_user
 
 # Dependency для проверки прав на новость
-def check_news_permission(
+async def check_news_permission(
     news_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
-    news = crud.get_news(db, news_id)
+    news = await crud_async.get_news(db, news_id)
     if not news:
         raise HTTPException(status_code=404, detail="News not found")
     
@@ -74,12 +94,12 @@ def check_news_permission(
     return news
 
 # Dependency для проверки прав на комментарий
-def check_comment_permission(
+async def check_comment_permission(
     comment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_user)
 ):
-    comment = crud.get_comment(db, comment_id)
+    comment = await crud_async.get_comment(db, comment_id)
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
     
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Optional
+from . import metrics, serialization
+from .cache import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+# События для /stream: каналы "news" (создание/изменение/удаление новостей) и
+# "news:{id}" (изменения новости и новые комментарии к ней).
+# memory - рассылка в процессе, redis - через pub/sub всем воркерам
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+# Очередь подписчика ограничена: кто не успевает читать - отключается,
+# а не копит события в памяти
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 64))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", 20000))
+EVENTS_REDIS_CHANNEL = os.getenv("EVENTS_REDIS_CHANNEL", "lab1:events")
+
+events_published = metrics.counter("events_published_total", "Events published", ("type",))
+events_dropped = metrics.counter("events_subscribers_dropped_total", "Slow subscribers disconnected")
+events_subscribers = metrics.gauge("events_subscribers", "Active stream subscribers")
+
+
+class Event:
+    """Событие с уже сериализованными данными: JSON и SSE-кадр строятся один раз
+    на событие, а не на каждого подписчика."""
+
+    __slots__ = ("channel", "type", "data", "_sse", "_message")
+
+    def __init__(self, channel: str, type: str, data: bytes):
+        self.channel = channel
+        self.type = type
+        self.data = data
+        self._sse = None
+        self._message = None
+
+    def sse(self) -> bytes:
+        if self._sse is None:
+            self._sse = b"event: " + self.type.encode() + b"\ndata: " + self.data + b"\n\n"
+        return self._sse
+
+    def message(self) -> str:
+        # Сообщение WebSocket: {"type": ..., "channel": ..., "data": ...}
+        if self._message is None:
+            self._message = (
+                f'{{"type":"{self.type}","channel":"{self.channel}","data":' + self.data.decode() + "}"
+            )
+        return self._message
+
+    def encode(self) -> bytes:
+        return f"{self.channel}\n{self.type}\n".encode() + self.data
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "Event":
+        channel, type, data = raw.split(b"\n", 2)
+        return cls(channel.decode(), type.decode(), data)
+
+
+class SubscriptionClosed(Exception):
+    pass
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+def _wake(waiter) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Subscription:
+    """Очередь событий одного соединения. Без asyncio.Queue: у простаивающего
+    подписчика нет ничего, кроме пустого deque - 10k соединений дешевы."""
+
+    __slots__ = ("channels", "maxsize", "closed", "dropped", "_queue", "_waiter")
+
+    def __init__(self, channels, maxsize: int = EVENTS_QUEUE_SIZE):
+        self.channels = tuple(channels)
+        self.maxsize = maxsize
+        self.closed = False
+        self.dropped = False
+        self._queue = deque()
+        self._waiter = None
+
+    def push(self, event: Event) -> bool:
+        if len(self._queue) >= self.maxsize:
+            return False
+        self._queue.append(event)
+        if self._waiter is not None:
+            _wake(self._waiter)
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+        if self._waiter is not None:
+            _wake(self._waiter)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        # None - за timeout событий не было (пора слать heartbeat)
+        if not self._queue and not self.closed:
+            loop = asyncio.get_running_loop()
+            waiter = self._waiter = loop.create_future()
+            # call_later вместо wait_for: без лишней задачи на каждое ожидание
+            handle = loop.call_later(timeout, _wake, waiter) if timeout else None
+            try:
+                await waiter
+            finally:
+                self._waiter = None
+                if handle is not None:
+                    handle.cancel()
+        if self.closed:
+            raise SubscriptionClosed()
+        return self._queue.popleft() if self._queue else None
+
+    def __len__(self):
+        return len(self._queue)
+
+
+class MemoryBackend:
+    async def publish(self, event: Event, dispatch) -> None:
+        dispatch(event)
+
+    def start(self, dispatch) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBackend:
+    """PUBLISH в общий канал; каждый воркер слушает его и раздает своим подписчикам.
+    Свое событие воркер тоже получает из Redis - локально второй раз не рассылаем."""
+
+    def __init__(self, url: str = REDIS_URL, channel: str = EVENTS_REDIS_CHANNEL):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+        self.channel = channel
+        self._listener = None
+
+    async def publish(self, event: Event, dispatch) -> None:
+        await self.client.publish(self.channel, event.encode())
+
+    def start(self, dispatch) -> None:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.ensure_future(self._listen(dispatch))
+
+    async def _listen(self, dispatch) -> None:
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        dispatch(Event.decode(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # Пока Redis недоступен, события других воркеров теряются
+                logger.warning(f"Events listener failed: {exc}")
+                await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+        await self.client.close()
+
+
+def make_backend(name: str = EVENTS_BACKEND):
+    if name == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+
+class Broadcaster:
+    def __init__(self, backend, max_subscribers: int = EVENTS_MAX_SUBSCRIBERS):
+        self.backend = backend
+        self.max_subscribers = max_subscribers
+        self.count = 0
+        self._channels = {}
+
+    def subscribe(self, channels, maxsize: int = EVENTS_QUEUE_SIZE) -> Subscription:
+        if self.count >= self.max_subscribers:
+            raise TooManySubscribers()
+        self.backend.start(self.dispatch)
+        subscription = Subscription(channels, maxsize)
+        for channel in subscription.channels:
+            self._channels.setdefault(channel, set()).add(subscription)
+        self.count += 1
+        events_subscribers.labels().set(self.count)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        removed = False
+        for channel in subscription.channels:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None and subscription in subscribers:
+                subscribers.discard(subscription)
+                removed = True
+                if not subscribers:
+                    del self._channels[channel]
+        if removed:
+            self.count -= 1
+            events_subscribers.labels().set(self.count)
+        subscription.close()
+
+    def dispatch(self, event: Event) -> None:
+        for subscription in list(self._channels.get(event.channel, ())):
+            if not subscription.push(event):
+                # Медленный потребитель: отключаем, клиент переподключится
+                # и перечитает состояние обычным GET
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+                events_dropped.labels().inc()
+
+    async def publish(self, channel: str, type: str, payload) -> None:
+        await self.publish_raw(channel, type, serialization.dumps(payload))
+
+    async def publish_raw(self, channel: str, type: str, data: bytes) -> None:
+        event = Event(channel, type, data)
+        events_published.labels(type).inc()
+        try:
+            await self.backend.publish(event, self.dispatch)
+        except Exception as exc:
+            # Redis недоступен - хотя бы подписчики этого воркера получат событие
+            logger.warning(f"Event publish failed: {exc}")
+            self.dispatch(event)
+
+    async def close(self) -> None:
+        for subscribers in list(self._channels.values()):
+            for subscription in list(subscribers):
+                self.unsubscribe(subscription)
+        await self.backend.close()
+
+
+broadcaster = Broadcaster(make_backend())
+
+
+def news_channel(news_id: int) -> str:
+    return f"news:{news_id}"
+
+
+async def news_created(news) -> None:
+    await broadcaster.publish("news", "news.created", serialization.news_dict(news))
+
+
+async def news_updated(news) -> None:
+    data = serialization.dumps(serialization.news_dict(news))
+    # Одно и то же тело в общий канал и в канал новости
+    for channel in ("news", news_channel(news.id)):
+        await broadcaster.publish_raw(channel, "news.updated", data)
+
+
+async def news_deleted(news_id: int) -> None:
+    data = serialization.dumps({"id": news_id})
+    for channel in ("news", news_channel(news_id)):
+        await broadcaster.publish_raw(channel, "news.deleted", data)
+
+
+async def comment_created(comment) -> None:
+    await broadcaster.publish(news_channel(comment.news_id), "comment.created", serialization.comment_read_dict(comment))
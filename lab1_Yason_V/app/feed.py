@@ -0,0 +1,29 @@
+import os
+
+# Домашняя лента: новости авторов, на которых подписан пользователь.
+# Fan-out-on-write: новая новость раскладывается в timeline_entries подписчиков
+# задачей Celery; у авторов с FEED_FANOUT_THRESHOLD+ подписчиков раскладка
+# слишком дорогая - их новости подмешиваются при чтении (fan-out-on-read).
+FEED_FANOUT_THRESHOLD = int(os.getenv("FEED_FANOUT_THRESHOLD", 10000))
+# Сколько записей хранится в ленте пользователя (лишние удаляет trim_timelines)
+FEED_TIMELINE_LENGTH = int(os.getenv("FEED_TIMELINE_LENGTH", 500))
+# Сколько последних новостей автора попадает в ленту при подписке
+FEED_BACKFILL = int(os.getenv("FEED_BACKFILL", 20))
+FEED_TRIM_CHUNK = int(os.getenv("FEED_TRIM_CHUNK", 1000))
+
+
+def merge(materialized, on_read, limit: int) -> list:
+    # Новости из ленты и прочитанные при запросе - по (published_at, id)
+    # убыванием, limit + 1 штук. Новость автора, перешедшего порог, может быть
+    # в обеих частях - оставляем одну
+    rows, seen = [], set()
+    for row in sorted(
+        [*materialized, *on_read], key=lambda r: (r.published_at, r.id), reverse=True
+    ):
+        if row.id in seen:
+            continue
+        seen.add(row.id)
+        rows.append(row)
+        if len(rows) > limit:
+            break
+    return rows
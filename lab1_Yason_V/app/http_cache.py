@@ -0,0 +1,58 @@
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+
+# Условные GET: ETag из версии записи, Last-Modified из updated_at.
+# Совпадение -> 304 без тела; Cache-Control подсказывает CDN, сколько держать ответ.
+NEWS_CACHE_CONTROL = os.getenv("NEWS_CACHE_CONTROL", "public, max-age=0, s-maxage=60, stale-while-revalidate=30")
+# Профиль - личные данные: только браузер и только с перепроверкой
+USER_CACHE_CONTROL = os.getenv("USER_CACHE_CONTROL", "private, no-cache")
+
+
+def make_etag(entity_id: int, version: int) -> str:
+    # Слабый ETag: тело может прийти сжатым, по смыслу оно то же
+    return f'W/"{entity_id}-{version}"'
+
+
+def http_date(value: datetime) -> str:
+    # В БД naive UTC
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def cache_headers(etag: str, last_modified: datetime, cache_control: str) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def _opaque(tag: str) -> str:
+    return tag.strip().removeprefix("W/")
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    # If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return _opaque(etag) in {_opaque(tag) for tag in if_none_match.split(",")}
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,217 @@
+import contextvars
+import os
+import time
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from . import metrics
+
+# Метрики HTTP и БД. Метка route - шаблон пути FastAPI (/news/{news_id}),
+# а не сам путь: иначе число серий растет с каждым id.
+DB_QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+http_requests = metrics.counter(
+    "http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status")
+)
+http_duration = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("route", "method")
+)
+http_db_queries = metrics.histogram(
+    "http_request_db_queries", "DB queries per HTTP request", ("route",), buckets=DB_QUERY_BUCKETS
+)
+http_db_time = metrics.histogram(
+    "http_request_db_seconds", "Time spent in DB queries per HTTP request", ("route",)
+)
+db_query_duration = metrics.histogram(
+    "db_query_duration_seconds", "Duration of a single DB query", ("engine",)
+)
+
+# [число запросов, суммарное время] текущего HTTP-запроса; список изменяемый,
+# поэтому его видят и синхронные зависимости в threadpool (копия контекста)
+_request_db = contextvars.ContextVar("request_db", default=None)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        db_usage = [0, 0.0]
+        token = _request_db.set(db_usage)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db.reset(token)
+            # Роутер FastAPI кладет сопоставленный маршрут в scope
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_requests.labels(path, method, str(status)).inc()
+            http_duration.labels(path, method).observe(elapsed)
+            http_db_queries.labels(path).observe(db_usage[0])
+            http_db_time.labels(path).observe(db_usage[1])
+
+
+def install_db_metrics(sync_engine, name: str) -> None:
+    # sync_engine - Engine или AsyncEngine.sync_engine; события вызываются в
+    # контексте задачи запроса, поэтому _request_db виден и для asyncio
+    histogram = db_query_duration.labels(name)
+
+    # Время старта храним в ExecutionContext запроса - он свой у каждого execute
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        histogram.observe(elapsed)
+        usage = _request_db.get()
+        if usage is not None:
+            usage[0] += 1
+            usage[1] += elapsed
+
+
+@metrics.REGISTRY.collector
+def collect_pools():
+    from .db import pool_stats
+    stats = pool_stats()
+    checked_out, overflow, timeouts, wait = [], [], [], []
+    for name, entry in stats.items():
+        if "checked_out" not in entry:
+            continue
+        labels = {"engine": name}
+        checked_out.append((labels, entry["checked_out"]))
+        overflow.append((labels, entry["overflow"]))
+        timeouts.append((labels, entry["timeouts"]))
+        wait.append((labels, entry["wait_time"]))
+    yield "db_pool_checked_out", "gauge", "Connections checked out of the pool", checked_out
+    yield "db_pool_overflow", "gauge", "Overflow connections in use", overflow
+    yield "db_pool_timeouts_total", "counter", "Pool checkout timeouts", timeouts
+    yield "db_pool_wait_seconds", "histogram", "Time waiting for a pool connection", wait
+
+
+@metrics.REGISTRY.collector
+def collect_replicas():
+    # Доля чтений, обслуженных репликами; сами счетчики - db_read_sessions_total
+    from .replicas import replicas
+    stats = replicas.snapshot()
+    yield "db_replica_hit_ratio", "gauge", "Share of read-only sessions served by a replica", [({}, stats["replica_hit_ratio"])]
+    yield (
+        "db_replica_up", "gauge", "Replica is in rotation",
+        [({"replica": r["name"]}, int(r["up"])) for r in stats["replicas"]],
+    )
+
+
+@metrics.REGISTRY.collector
+def collect_caches():
+    from .cache import news_cache, user_cache
+    caches = (("news", news_cache), ("user", user_cache))
+    for field, kind in (("hits", "counter"), ("misses", "counter"), ("errors", "counter"), ("coalesced", "counter")):
+        yield (
+            f"cache_{field}_total", kind, f"Read-through cache {field}",
+            [({"cache": name}, getattr(c.stats, field)) for name, c in caches],
+        )
+    yield (
+        "cache_load_seconds", "histogram", "Cache miss load time",
+        [({"cache": name}, c.stats.load_time.snapshot()) for name, c in caches],
+    )
+
+
+@metrics.REGISTRY.collector
+def collect_hashing():
+    from .auth import hashing_stats
+    stats = hashing_stats()
+    yield "hashing_pending", "gauge", "Password hashing jobs running or queued", [({}, stats["pending"])]
+    yield "hashing_workers", "gauge", "Password hashing pool size", [({}, stats["workers"])]
+
+
+@metrics.REGISTRY.collector
+def collect_outbox():
+    # Отставание relay: растущий pending или возраст - брокер или relay не работают
+    from .db import SessionLocal
+    from .outbox import backlog
+    db = SessionLocal()
+    try:
+        stats = backlog(db)
+    finally:
+        db.close()
+    yield "outbox_pending", "gauge", "Outbox events waiting for the relay", [({}, stats["pending"])]
+    yield "outbox_oldest_pending_seconds", "gauge", "Age of the oldest pending outbox event", [({}, stats["oldest_seconds"])]
+    yield "outbox_dead", "gauge", "Outbox events that exceeded OUTBOX_MAX_ATTEMPTS", [({}, stats["dead"])]
+
+
+# Глубина очередей Celery в брокере (Redis: длина списка = число задач)
+CELERY_QUEUES = [q for q in os.getenv("CELERY_QUEUES", "celery").split(",") if q]
+BROKER_RETRY_INTERVAL = 30.0
+_broker = None
+_broker_failed_at = 0.0
+
+
+@metrics.REGISTRY.collector
+def collect_celery_queues():
+    global _broker, _broker_failed_at
+    broker_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    # Недоступный брокер не опрашиваем на каждом scrape - пауза после ошибки
+    if not broker_url.startswith("redis") or time.monotonic() - _broker_failed_at < BROKER_RETRY_INTERVAL:
+        return
+    if _broker is None:
+        import redis
+        _broker = redis.Redis.from_url(broker_url, socket_timeout=0.2, socket_connect_timeout=0.2)
+    try:
+        samples = [({"queue": q}, _broker.llen(q)) for q in CELERY_QUEUES]
+    except Exception:
+        _broker_failed_at = time.monotonic()
+        raise
+    yield "celery_queue_depth", "gauge", "Tasks waiting in the broker queue", samples
+
+
+celery_task_duration = metrics.histogram(
+    "celery_task_duration_seconds", "Celery task run time", ("task", "state")
+)
+celery_task_retries = metrics.counter("celery_task_retries_total", "Celery task retries", ("task",))
+celery_task_failures = metrics.counter("celery_task_failures_total", "Celery task failures", ("task",))
+
+CELERY_METRICS_PORT = int(os.getenv("CELERY_METRICS_PORT", 0))
+
+
+def install_celery_metrics(celery_app) -> None:
+    from celery import signals
+    started = {}
+
+    @signals.task_prerun.connect(weak=False)
+    def task_prerun(task_id=None, **kwargs):
+        started[task_id] = time.perf_counter()
+
+    @signals.task_postrun.connect(weak=False)
+    def task_postrun(task_id=None, task=None, state=None, **kwargs):
+        begin = started.pop(task_id, None)
+        if begin is not None:
+            celery_task_duration.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - begin)
+
+    @signals.task_retry.connect(weak=False)
+    def task_retry(sender=None, **kwargs):
+        celery_task_retries.labels(sender.name).inc()
+
+    @signals.task_failure.connect(weak=False)
+    def task_failure(sender=None, **kwargs):
+        celery_task_failures.labels(sender.name).inc()
+
+    @signals.worker_process_init.connect(weak=False)
+    def start_worker_metrics(**kwargs):
+        # У каждого дочернего процесса prefork свои счетчики - свой порт: базовый + индекс
+        if CELERY_METRICS_PORT:
+            from billiard import current_process
+            metrics.start_http_server(CELERY_METRICS_PORT + (getattr(current_process(), "index", 0) or 0))
@@ -1,16 +1,74 @@
-from fastapi import FastAPI
-from app.api import users, news, comments, auth_router
-from app.db import Base, engine
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from app.api import users, news, comments, auth_router, stats, media, stream, feed
+from app.db import engine, async_engine, replica_engines
+from app.auth import HashingBusy
+from app.serialization import DefaultResponse
+from app.compression import CompressionMiddleware
+from app.instrumentation import MetricsMiddleware
+from app import profiling
+from app import metrics
+from app.replicas import ReadYourWritesMiddleware
+from app.events import broadcaster
+from app.ratelimit import route_concurrency
 
-# Создать таблицы если нужно (для dev)
-Base.metadata.create_all(bind=engine)
+# Схема БД - миграциями (alembic upgrade head), а не create_all при импорте:
+# воркеры uvicorn/gunicorn не выполняют DDL и не гоняются друг с другом
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Открытые /stream завершаются, слушатель Redis pub/sub останавливается
+    await broadcaster.close()
+    # Закрываем соединения пулов (у aiosqlite на каждое - свой поток)
+    await async_engine.dispose()
+    for replica in replica_engines:
+        await replica.dispose()
+    engine.dispose()
 
-app = FastAPI(title="Lab1 News API")
+# orjson вместо stdlib json для всех ответов (JSON_BACKEND=stdlib - отключить)
+# Лимит одновременных запросов - у каждого маршрута (app/ratelimit.py)
+app = FastAPI(
+    title="Lab1 News API",
+    default_response_class=DefaultResponse,
+    lifespan=lifespan,
+    dependencies=[Depends(route_concurrency)],
+)
 
 app.include_router(auth_router.router)
 app.include_router(users.router)
 app.include_router(news.router)
 app.include_router(comments.router)
+app.include_router(stats.router)
+app.include_router(media.router)
+app.include_router(stream.router)
+app.include_router(feed.router)
+
+# gzip/br для JSON-ответов больше COMPRESSION_MIN_SIZE
+app.add_middleware(CompressionMiddleware)
+# С репликами: cookie "читать с primary" после ответа, который что-то записал
+if replica_engines:
+    app.add_middleware(ReadYourWritesMiddleware)
+# Снаружи всех: время запроса включает сжатие
+app.add_middleware(MetricsMiddleware)
+
+# Только для разработки: N+1, дубликаты и медленные запросы в лог
+if profiling.QUERY_PROFILING:
+    profiling.install_default_engines()
+    app.add_middleware(profiling.QueryProfilerMiddleware)
+
+@app.exception_handler(HashingBusy)
+async def hashing_busy_handler(request: Request, exc: HashingBusy):
+    # Пул хеширования перегружен - быстро отказываем вместо очереди
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, try again later"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+import stat
+import tempfile
+from email.utils import formatdate
+from typing import Optional
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Обложки новостей на локальном диске. Имя файла - sha256 содержимого:
+# одинаковые файлы хранятся один раз, URL никогда не меняет смысл,
+# поэтому отдаем с Cache-Control: immutable.
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "media")
+MEDIA_URL = os.getenv("MEDIA_URL", "/media")
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", 10 * 1024 * 1024))
+MEDIA_CHUNK_SIZE = 256 * 1024
+
+MEDIA_TYPES = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+EXTENSION_TYPES = {ext: media_type for media_type, ext in MEDIA_TYPES.items()}
+MEDIA_NAME = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}\.(jpg|png|webp|gif)$")
+# Сколько первых байт файла нужно sniff_extension
+MEDIA_SNIFF_BYTES = 12
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    # Тип по сигнатуре в начале файла, а не по Content-Type клиента: отдаем
+    # файл под этим типом с immutable-кэшем, подмена недопустима
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+async def save_upload(upload, extension: str) -> str:
+    # Пишем во временный файл, считая хеш по пути; в конце - атомарный rename
+    os.makedirs(MEDIA_ROOT, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=MEDIA_ROOT, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while chunk := await upload.read(MEDIA_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MEDIA_MAX_BYTES:
+                    raise MediaTooLarge()
+                digest.update(chunk)
+                await anyio.to_thread.run_sync(tmp.write, chunk)
+        name = f"{digest.hexdigest()[:2]}/{digest.hexdigest()}.{extension}"
+        path = os.path.join(MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return name
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def media_url(name: str) -> str:
+    return f"{MEDIA_URL}/{name}"
+
+
+def media_path(name: str) -> Optional[str]:
+    # Только имена вида ab/<sha256>.<ext> - никаких ../ из URL
+    if not MEDIA_NAME.match(name):
+        return None
+    return os.path.join(MEDIA_ROOT, name)
+
+
+def parse_range(header: Optional[str], size: int):
+    # Один диапазон bytes=start-end / start- / -suffix. None - отдать весь файл,
+    # ValueError - диапазон вне файла (416)
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[6:].strip().partition("-")
+    try:
+        if start == "":
+            length = int(end)
+            if length == 0:
+                raise ValueError("Empty suffix range")
+            return max(size - length, 0), size - 1
+        first = int(start)
+        last = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if first >= size or last < first:
+        raise ValueError("Range not satisfiable")
+    return first, min(last, size - 1)
+
+
+class RangeFileResponse(Response):
+    """Файл целиком или один диапазон (206). Если сервер поддерживает ASGI-расширение
+    http.response.zerocopy, тело уходит через sendfile без копирования в Python."""
+
+    chunk_size = MEDIA_CHUNK_SIZE
+
+    def __init__(self, path: str, stat_result: os.stat_result, range_header: Optional[str] = None,
+                 headers: dict = None, method: str = "GET"):
+        self.path = path
+        self.size = stat_result.st_size
+        self.send_header_only = method.upper() == "HEAD"
+        self.background = None
+        self.media_type = EXTENSION_TYPES.get(path.rsplit(".", 1)[-1], "application/octet-stream")
+        self.init_headers(headers)
+        self.headers["accept-ranges"] = "bytes"
+        # Браузер не угадывает тип по содержимому - только media_type по расширению
+        self.headers["x-content-type-options"] = "nosniff"
+        self.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        try:
+            byte_range = parse_range(range_header, self.size)
+        except ValueError:
+            self.status_code = 416
+            self.offset, self.count = 0, 0
+            self.headers["content-range"] = f"bytes */{self.size}"
+            self.headers["content-length"] = "0"
+            return
+        if byte_range is None:
+            self.status_code = 200
+            self.offset, self.count = 0, self.size
+        else:
+            self.status_code = 206
+            self.offset, self.count = byte_range[0], byte_range[1] - byte_range[0] + 1
+            self.headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{self.size}"
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only or self.count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        with open(self.path, "rb") as file:
+            if "http.response.zerocopy" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": file.fileno(),
+                    "offset": self.offset,
+                    "count": self.count,
+                })
+                return
+            await anyio.to_thread.run_sync(file.seek, self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(file.read, min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # Файл укоротили во время отдачи - закрываем ответ
+                await send({"type": "http.response.body", "body": b""})
+
+
+async def stat_file(path: str) -> Optional[os.stat_result]:
+    try:
+        result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        return None
+    return result if stat.S_ISREG(result.st_mode) else None
@@ -0,0 +1,182 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы бакетов по умолчанию (секунды) - как в prometheus_client
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Гистограмма с фиксированными бакетами: observe() - O(log n) без аллокаций."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        # Кумулятивные счетчики "<= le", последний бакет - +Inf
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, running = {}, 0
+        for le, c in zip(self.buckets + ("+Inf",), counts):
+            running += c
+            cumulative[str(le)] = running
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Metric:
+    """Семейство метрик с метками: labels(...) создает дочернюю метрику один раз,
+    дальше - поиск в dict. Без меток - labels() без аргументов."""
+
+    _factories = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames=(), buckets=None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _make(self):
+        if self.kind == "histogram" and self.buckets is not None:
+            return Histogram(self.buckets)
+        return self._factories[self.kind]()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._make())
+        return child
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, values))
+            yield labels, child.snapshot() if self.kind == "histogram" else child.value
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_family(name: str, kind: str, documentation: str, samples) -> list:
+    # Текстовый формат Prometheus 0.0.4; samples - (labels, value),
+    # для гистограммы value - snapshot() из Histogram
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if kind == "histogram":
+            for le, count in value["buckets"].items():
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value['sum'])}")
+            lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+        else:
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def register(self, metric: Metric) -> Metric:
+        # Повторный импорт модуля не должен создавать дубликат семейства
+        return self._metrics.setdefault(metric.name, metric)
+
+    def collector(self, func):
+        """Функция, вызываемая на каждом scrape: отдает (name, kind, help, samples).
+        Так выставляются уже существующие счетчики (пулы, кэш) без двойного учета."""
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(render_family(metric.name, metric.kind, metric.documentation, metric.samples()))
+        for func in self._collectors:
+            try:
+                families = list(func())
+            except Exception:
+                # Сломанный сборщик не должен ронять весь scrape
+                continue
+            for name, kind, documentation, samples in families:
+                lines.extend(render_family(name, kind, documentation, samples))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames=()) -> Metric:
+    return REGISTRY.register(Metric("counter", name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames=()) -> Metric:
+    return REGISTRY.register(Metric("gauge", name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Metric:
+    return REGISTRY.register(Metric("histogram", name, documentation, labelnames, buckets))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, addr: str = "0.0.0.0") -> ThreadingHTTPServer:
+    # Отдельный /metrics для процессов без FastAPI (воркеры Celery)
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
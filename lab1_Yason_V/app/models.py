@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, JSON, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
@@ -14,6 +14,12 @@ class User(Base):
     is_admin = Column(Boolean, default=False) 
     avatar = Column(String, nullable=True)
     github_id = Column(String(100), unique=True, nullable=True)  
+    # Для ETag/Last-Modified: version увеличивает crud при каждом изменении
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Денормализованный счетчик подписчиков: выше порога лента читает новости
+    # автора при запросе, а не раскладывает их по лентам подписчиков
+    follower_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     news = relationship("News", back_populates="author", cascade="all, delete-orphan")
     comments = relationship("Comment", back_populates="author", cascade="all, delete-orphan")
@@ -27,10 +33,23 @@ class News(Base):
     published_at = Column(DateTime, default=datetime.utcnow)
     author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     cover = Column(String, nullable=True)
+    # Денормализованный счетчик - обновляется в crud при создании/удалении комментария
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Плоский текст из content для полнотекстового поиска - заполняется в app/search.py
+    search_text = Column(Text, nullable=True)
+    # Для ETag/Last-Modified: version увеличивает crud при изменении новости и счетчика
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     author = relationship("User", back_populates="news")
     comments = relationship("Comment", back_populates="news", cascade="all, delete-orphan")
 
+    # Индексы под keyset-пагинацию ленты: ORDER BY published_at DESC, id DESC
+    __table_args__ = (
+        Index("ix_news_author_id_published_at", "author_id", "published_at"),
+        Index("ix_news_published_at_id", "published_at", "id"),
+    )
+
 class Comment(Base):
     __tablename__ = "comments"
     id = Column(Integer, primary_key=True, index=True)
@@ -42,13 +61,65 @@ class Comment(Base):
     news = relationship("News", back_populates="comments")
     author = relationship("User", back_populates="comments")
 
+    # Комментарии новости в хронологическом порядке, keyset по (published_at, id)
+    __table_args__ = (
+        Index("ix_comments_news_id_published_at_id", "news_id", "published_at", "id"),
+    )
+
 class RefreshSession(Base):
     __tablename__ = "refresh_sessions"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    refresh_token = Column(String(255), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Храним не сам токен, а sha256 от него: фиксированные 64 символа в индексе
+    # и утечка таблицы не дает рабочих токенов
+    token_hash = Column(String(64), nullable=False, unique=True, index=True)
     user_agent = Column(String(512), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    user = relationship("User", back_populates="refresh_sessions")
+
+class OutboxEvent(Base):
+    # Transactional outbox: событие пишется в той же транзакции, что и изменение,
+    # relay (app.outbox) потом отправляет его в Celery
+    __tablename__ = "outbox_events"
+    id = Column(Integer, primary_key=True)
+    topic = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    dispatched_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        # Выборка relay: WHERE dispatched_at IS NULL ORDER BY id
+        Index("ix_outbox_events_dispatched_at_id", "dispatched_at", "id"),
+    )
+
+class ProcessedEvent(Base):
+    # Доставка at-least-once: задача отмечает id события, повтор пропускается.
+    # consumer - имя задачи: одно событие обрабатывают несколько задач
+    __tablename__ = "processed_events"
+    event_id = Column(Integer, primary_key=True, autoincrement=False)
+    consumer = Column(String(64), primary_key=True)
+    processed_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class Subscription(Base):
+    # Подписка читателя на автора
+    __tablename__ = "subscriptions"
+    follower_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Раскладка новости: все подписчики автора
+        Index("ix_subscriptions_author_id_follower_id", "author_id", "follower_id"),
+    )
 
-    user = relationship("User", back_populates="refresh_sessions")
\ No newline at end of file
+class TimelineEntry(Base):
+    # Материализованная лента: ключ (user_id, published_at, news_id) - страница
+    # ленты читается одним диапазоном первичного ключа. Это кэш, а не данные:
+    # без внешних ключей, удаленные новости отсеиваются при чтении
+    __tablename__ = "timeline_entries"
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    published_at = Column(DateTime, primary_key=True)
+    news_id = Column(Integer, primary_key=True, autoincrement=False)
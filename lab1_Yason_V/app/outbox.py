@@ -0,0 +1,136 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from . import crud, metrics, models
+from .db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Relay: забирает неотправленные события outbox пачками и ставит задачи Celery.
+# Отметка dispatched_at - после публикации, поэтому доставка at-least-once;
+# повторы отсекает задача-получатель (crud.claim_event).
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_RELAY_INTERVAL = float(os.getenv("OUTBOX_RELAY_INTERVAL", 5))
+# После стольких неудачных попыток событие больше не выбирается (видно в метриках)
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 10))
+OUTBOX_RETENTION_HOURS = float(os.getenv("OUTBOX_RETENTION_HOURS", 24))
+
+# topic -> [(имя задачи, аргументы из payload)]: одно событие - несколько
+# получателей, каждый отмечает его в processed_events под своим именем
+ROUTES = {
+    "news.created": [
+        ("app.tasks.send_news_notification", lambda payload: [payload["news_id"]]),
+        ("app.tasks.fanout_news", lambda payload: [payload["news_id"]]),
+    ],
+}
+
+outbox_relayed = metrics.counter("outbox_relayed_total", "Outbox events published to the broker", ("topic",))
+outbox_failures = metrics.counter("outbox_relay_failures_total", "Failed outbox publish attempts", ("topic",))
+
+
+def celery_sender(producer=None):
+    from .celery_app import celery_app
+
+    def send(event: models.OutboxEvent) -> None:
+        for n, (task_name, make_args) in enumerate(ROUTES[event.topic]):
+            # task_id из id события: повторная публикация видна в логах как та же задача
+            celery_app.send_task(
+                task_name,
+                args=make_args(event.payload),
+                kwargs={"event_id": event.id},
+                task_id=f"outbox-{event.id}-{n}",
+                producer=producer,
+                # Результат relay не нужен - не трогаем result backend
+                ignore_result=True,
+            )
+
+    return send
+
+
+def pending_events(db, batch_size: int):
+    query = (
+        select(models.OutboxEvent)
+        .where(models.OutboxEvent.dispatched_at.is_(None), models.OutboxEvent.attempts < OUTBOX_MAX_ATTEMPTS)
+        .order_by(models.OutboxEvent.id)
+        .limit(batch_size)
+    )
+    # Несколько relay на Postgres берут разные пачки, не дожидаясь друг друга
+    if db.bind.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    return db.execute(query).scalars().all()
+
+
+def relay_batch(db, send, batch_size: int = OUTBOX_BATCH_SIZE):
+    """Одна пачка: (отправлено, была ли ошибка). На первой ошибке брокера пачка
+    прерывается - остальные события уйдут в следующий запуск по порядку."""
+    events = pending_events(db, batch_size)
+    sent_ids = []
+    failed = False
+    for event in events:
+        try:
+            send(event)
+        except Exception as exc:
+            logger.warning(f"Outbox event {event.id} ({event.topic}) publish failed: {exc}")
+            event.attempts += 1
+            outbox_failures.labels(event.topic).inc()
+            failed = True
+            break
+        sent_ids.append(event.id)
+        outbox_relayed.labels(event.topic).inc()
+    if sent_ids:
+        db.execute(
+            update(models.OutboxEvent)
+            .where(models.OutboxEvent.id.in_(sent_ids))
+            .values(dispatched_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return len(sent_ids), failed
+
+
+def relay_pending(send=None, batch_size: int = OUTBOX_BATCH_SIZE, max_batches: int = 100) -> int:
+    # max_batches - чтобы один запуск по расписанию не растягивался бесконечно
+    db = SessionLocal()
+    try:
+        if send is None:
+            from .celery_app import celery_app
+            # Одно соединение с брокером на весь запуск, а не на каждое событие
+            with celery_app.producer_or_acquire() as producer:
+                return _drain(db, celery_sender(producer), batch_size, max_batches)
+        return _drain(db, send, batch_size, max_batches)
+    finally:
+        db.close()
+
+
+def _drain(db, send, batch_size: int, max_batches: int) -> int:
+    total = 0
+    for _ in range(max_batches):
+        sent, failed = relay_batch(db, send, batch_size)
+        total += sent
+        if failed or sent < batch_size:
+            break
+    return total
+
+
+def purge(now: datetime = None) -> int:
+    db = SessionLocal()
+    try:
+        older_than = (now or datetime.utcnow()) - timedelta(hours=OUTBOX_RETENTION_HOURS)
+        return crud.purge_outbox(db, older_than)
+    finally:
+        db.close()
+
+
+def backlog(db) -> dict:
+    # Для метрик: сколько ждет отправки, возраст самого старого, сколько брошено
+    pending = models.OutboxEvent.dispatched_at.is_(None)
+    count, oldest = db.execute(
+        select(func.count(), func.min(models.OutboxEvent.created_at))
+        .where(pending, models.OutboxEvent.attempts < OUTBOX_MAX_ATTEMPTS)
+    ).one()
+    dead = db.execute(
+        select(func.count()).where(pending, models.OutboxEvent.attempts >= OUTBOX_MAX_ATTEMPTS)
+    ).scalar()
+    age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    return {"pending": count, "oldest_seconds": age, "dead": dead}
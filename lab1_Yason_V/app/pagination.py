@@ -0,0 +1,28 @@
+import base64
+from datetime import datetime
+
+
+# Курсор keyset-пагинации: непрозрачная строка с (published_at, id)
+# последней выданной записи; следующая страница начинается строго после нее.
+def encode_cursor(published_at: datetime, item_id: int) -> str:
+    raw = f"{published_at.isoformat()}|{item_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        published_at, item_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(published_at), int(item_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def paginate(rows, limit: int):
+    # Запрашиваем limit + 1 строк: лишняя означает, что есть следующая страница
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last.published_at, last.id)
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,195 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Профилирование запросов для разработки и CI (в проде выключено):
+# какие SQL выполнил HTTP-запрос, повторы одного и того же запроса (N+1),
+# медленные запросы с планом EXPLAIN.
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+# Сколько раз один и тот же SQL (с разными параметрами) за запрос считается N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 3))
+
+
+class QueryRecord:
+    __slots__ = ("statement", "parameters", "duration", "plan")
+
+    def __init__(self, statement: str, parameters, duration: float, plan=None):
+        self.statement = statement
+        self.parameters = parameters
+        self.duration = duration
+        self.plan = plan
+
+
+class QueryLog:
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.queries = []
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def total_time(self) -> float:
+        return sum(q.duration for q in self.queries)
+
+    def duplicates(self) -> dict:
+        # Один и тот же SQL с теми же параметрами больше одного раза - лишний запрос
+        counts = Counter((q.statement, repr(q.parameters)) for q in self.queries)
+        return {key[0]: n for key, n in counts.items() if n > 1}
+
+    def n_plus_one(self) -> dict:
+        # Один SQL с разными параметрами много раз - обычно ленивая загрузка в цикле
+        counts = Counter(q.statement for q in self.queries)
+        return {statement: n for statement, n in counts.items() if n >= self.n_plus_one_threshold}
+
+    def slow(self) -> list:
+        return [q for q in self.queries if q.duration * 1000 >= self.slow_query_ms]
+
+    def report(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_time * 1000, 3),
+            "duplicates": self.duplicates(),
+            "n_plus_one": self.n_plus_one(),
+            "slow": [
+                {"statement": q.statement, "ms": round(q.duration * 1000, 3), "plan": q.plan}
+                for q in self.slow()
+            ],
+        }
+
+    def format(self) -> str:
+        lines = [f"{self.count} queries, {self.total_time * 1000:.1f} ms"]
+        for i, q in enumerate(self.queries, start=1):
+            lines.append(f"  {i}. [{q.duration * 1000:.2f} ms] {' '.join(q.statement.split())}")
+        for statement, n in self.n_plus_one().items():
+            lines.append(f"  N+1 ({n}x): {' '.join(statement.split())}")
+        return "\n".join(lines)
+
+
+# Журнал текущего HTTP-запроса (asyncio - контекст задачи) и журналы на весь
+# процесс - для тестов, где приложение крутится в другом потоке (TestClient)
+_current_log = contextvars.ContextVar("query_log", default=None)
+_process_logs = []
+_process_lock = threading.Lock()
+
+
+@contextmanager
+def capture_queries(process_wide: bool = False, **options):
+    log = QueryLog(**options)
+    if process_wide:
+        with _process_lock:
+            _process_logs.append(log)
+        try:
+            yield log
+        finally:
+            with _process_lock:
+                _process_logs.remove(log)
+        return
+    token = _current_log.set(log)
+    try:
+        yield log
+    finally:
+        _current_log.reset(token)
+
+
+def _active_logs() -> list:
+    log = _current_log.get()
+    logs = [log] if log is not None else []
+    if _process_logs:
+        logs.extend(_process_logs)
+    return logs
+
+
+def explain(cursor_connection, dialect_name: str, statement: str, parameters):
+    # EXPLAIN не выполняет запрос; только для SELECT, чтобы не трогать DML
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if dialect_name == "sqlite" else "EXPLAIN "
+    cursor = cursor_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+    except Exception as exc:
+        return [f"EXPLAIN failed: {exc}"]
+    finally:
+        cursor.close()
+
+
+_installed = set()
+
+
+def install(sync_engine) -> None:
+    # Идемпотентно: тесты и main могут вызывать для одного движка
+    if id(sync_engine) in _installed:
+        return
+    _installed.add(id(sync_engine))
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_log.get() is not None or _process_logs:
+            context._profiling_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profiling_started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        logs = _active_logs()
+        plan = None
+        if not executemany and logs and duration * 1000 >= min(log.slow_query_ms for log in logs):
+            plan = explain(conn.connection, conn.dialect.name, statement, parameters)
+        record = QueryRecord(statement, parameters, duration, plan)
+        for log in logs:
+            log.queries.append(record)
+
+
+def install_default_engines() -> None:
+    from .db import engine, async_engine, replica_engines
+    install(engine)
+    install(async_engine.sync_engine)
+    for replica in replica_engines:
+        install(replica.sync_engine)
+
+
+class QueryProfilerMiddleware:
+    """Для разработки: считает SQL каждого запроса, пишет предупреждения про N+1
+    и медленные запросы, добавляет заголовки X-DB-Queries / X-DB-Time-Ms."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with capture_queries() as log:
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-queries", str(log.count).encode()))
+                    headers.append((b"x-db-time-ms", f"{log.total_time * 1000:.2f}".encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+        path = f"{scope['method']} {scope['path']}"
+        for statement, n in log.n_plus_one().items():
+            logger.warning(f"N+1 in {path}: {n}x {' '.join(statement.split())}")
+        for statement, n in log.duplicates().items():
+            logger.warning(f"Duplicate query in {path}: {n}x {' '.join(statement.split())}")
+        for q in log.slow():
+            logger.warning(
+                f"Slow query in {path} ({q.duration * 1000:.1f} ms): {' '.join(q.statement.split())}; plan: {q.plan}"
+            )
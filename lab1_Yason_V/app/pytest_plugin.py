@@ -0,0 +1,43 @@
+import pytest
+from . import profiling
+
+# Подключен в tests/conftest.py:  pytest_plugins = ["app.pytest_plugin"]
+#
+#   def test_news_feed(client, query_budget):
+#       with query_budget(2):
+#           client.get("/news/")
+#
+# Превышение бюджета или N+1 внутри блока роняет тест со списком запросов.
+
+
+@pytest.fixture
+def query_budget():
+    profiling.install_default_engines()
+
+    def budget(max_queries: int, allow_n_plus_one: bool = False, **options):
+        return _Budget(max_queries, allow_n_plus_one, options)
+
+    return budget
+
+
+class _Budget:
+    def __init__(self, max_queries: int, allow_n_plus_one: bool, options: dict):
+        self.max_queries = max_queries
+        self.allow_n_plus_one = allow_n_plus_one
+        # Журнал на весь процесс: TestClient выполняет приложение в другом потоке
+        self._capture = profiling.capture_queries(process_wide=True, **options)
+        self.log = None
+
+    def __enter__(self):
+        self.log = self._capture.__enter__()
+        return self.log
+
+    def __exit__(self, exc_type, exc, tb):
+        self._capture.__exit__(exc_type, exc, tb)
+        if exc_type is not None:
+            return False
+        if self.log.count > self.max_queries:
+            pytest.fail(f"Query budget exceeded: {self.log.count} > {self.max_queries}\n{self.log.format()}")
+        if not self.allow_n_plus_one and self.log.n_plus_one():
+            pytest.fail(f"N+1 query pattern detected\n{self.log.format()}")
+        return False
@@ -0,0 +1,266 @@
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Tuple
+from fastapi import Depends, HTTPException, Request, status
+from starlette.requests import HTTPConnection
+from . import metrics
+from .cache import REDIS_URL
+from .deps import get_current_user
+
+logger = logging.getLogger(__name__)
+
+# Ограничение частоты (token bucket) для дорогих маршрутов: логин/регистрация
+# (argon2) и создание комментариев. Число одновременных запросов ограничено у
+# каждого маршрута API (route_concurrency), у дорогих - отдельными лимитами.
+# memory - счетчики в процессе (у каждого воркера свои), redis - общие, none - выключено
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# Лимиты в виде "запросов/секунд": столько запросов подряд, дальше - равномерно
+RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/60")
+RATE_LIMIT_REGISTER = os.getenv("RATE_LIMIT_REGISTER", "5/60")
+RATE_LIMIT_COMMENTS = os.getenv("RATE_LIMIT_COMMENTS", "30/60")
+# Одновременных запросов на маршрут в процессе; 0 - без ограничения
+CONCURRENCY_LOGIN = int(os.getenv("CONCURRENCY_LOGIN", 32))
+CONCURRENCY_COMMENTS = int(os.getenv("CONCURRENCY_COMMENTS", 64))
+# Остальные маршруты: по умолчанию CONCURRENCY_DEFAULT на маршрут, переопределения -
+# CONCURRENCY_ROUTES="GET /news/export=2,POST /news/bulk=4" (шаблон пути, как в роутере)
+CONCURRENCY_DEFAULT = int(os.getenv("CONCURRENCY_DEFAULT", 256))
+CONCURRENCY_ROUTES = os.getenv("CONCURRENCY_ROUTES", "")
+# За прокси адрес клиента - первый в X-Forwarded-For; без прокси заголовку верить нельзя
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes")
+
+rate_limited = metrics.counter("rate_limited_total", "Requests rejected with 429 by rate limit", ("limit",))
+rate_limit_errors = metrics.counter("rate_limit_errors_total", "Rate limit backend failures (request allowed)")
+concurrency_rejected = metrics.counter(
+    "concurrency_rejected_total", "Requests rejected with 503 by concurrency limit", ("limit",)
+)
+concurrency_in_flight = metrics.gauge("concurrency_in_flight", "Requests holding a concurrency slot", ("limit",))
+
+
+def parse_rate(spec: str) -> Tuple[float, float]:
+    # "10/60" -> (10/60 токена в секунду, емкость 10)
+    count, _, period = spec.partition("/")
+    burst = float(count)
+    return burst / float(period or 1), burst
+
+
+class MemoryRateLimiter:
+    """Token bucket на ключ в LRU: старые ключи вытесняются, память ограничена."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    async def hit(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# Пополнение и списание одним скриптом - атомарно для всех воркеров;
+# время берем у Redis, чтобы не зависеть от часов воркеров
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisRateLimiter:
+    def __init__(self, url: str = REDIS_URL, prefix: str = "lab1:rl:"):
+        import redis.asyncio as redis
+        # Короткие таймауты: зависший Redis не должен задерживать логин
+        self.client = redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self.prefix = prefix
+        self._script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def hit(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        allowed, retry = await self._script(keys=[self.prefix + key], args=[rate, burst])
+        return bool(allowed), float(retry)
+
+
+class NullRateLimiter:
+    async def hit(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        return True, 0.0
+
+
+def make_limiter(name: str = RATE_LIMIT_BACKEND):
+    if name == "redis":
+        return RedisRateLimiter()
+    if name == "none":
+        return NullRateLimiter()
+    return MemoryRateLimiter()
+
+
+limiter = make_limiter()
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def check_rate(name: str, key: str, rate: float, burst: float) -> None:
+    try:
+        allowed, retry_after = await limiter.hit(f"{name}:{key}", rate, burst)
+    except Exception as exc:
+        # Недоступный Redis не должен закрывать вход - пропускаем запрос
+        logger.warning(f"Rate limit check failed for {name}: {exc}")
+        rate_limit_errors.labels().inc()
+        return
+    if not allowed:
+        rate_limited.labels(name).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+def rate_limit_by_ip(name: str, spec: str):
+    rate, burst = parse_rate(spec)
+
+    async def dependency(request: Request):
+        await check_rate(name, client_ip(request), rate, burst)
+
+    return dependency
+
+
+def rate_limit_by_user(name: str, spec: str):
+    # get_current_user кэшируется FastAPI в пределах запроса - второй раз токен не разбирается
+    rate, burst = parse_rate(spec)
+
+    async def dependency(current_user = Depends(get_current_user)):
+        await check_rate(name, str(current_user.id), rate, burst)
+
+    return dependency
+
+
+class ConcurrencyLimit:
+    """Не больше limit одновременных запросов маршрута в процессе; лишние сразу
+    получают 503, а не ждут в очереди event loop'а или пула БД."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        self._gauge = concurrency_in_flight.labels(name)
+
+    def acquire(self) -> None:
+        if self.in_flight >= self.limit:
+            concurrency_rejected.labels(self.name).inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        self._gauge.set(self.in_flight)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._gauge.set(self.in_flight)
+
+    async def __call__(self):
+        if self.limit <= 0:
+            yield
+            return
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def parse_route_limits(spec: str) -> dict:
+    # "GET /news/export=2, POST /news/bulk=4" -> {"GET /news/export": 2, ...}
+    limits = {}
+    for part in spec.split(","):
+        route, _, limit = part.strip().rpartition("=")
+        if route:
+            method, _, path = route.strip().partition(" ")
+            limits[f"{method.upper()} {path.strip()}"] = int(limit)
+    return limits
+
+
+# 0 - маршрут не ограничивается общим лимитом
+ROUTE_CONCURRENCY = {
+    # Свои лимиты: auth_concurrency и comments_concurrency ниже
+    "POST /auth/login": 0,
+    "POST /auth/register": 0,
+    "POST /comments/": 0,
+    # SSE-соединение живет часами, подписчиков ограничивает EVENTS_MAX_SUBSCRIBERS
+    "GET /stream/": 0,
+    # Долгие потоковые импорт и экспорт держат соединение с БД
+    "POST /news/bulk": 4,
+    "GET /news/export": 4,
+    **parse_route_limits(CONCURRENCY_ROUTES),
+}
+_route_limits = {}
+
+
+def route_limit(key: str) -> ConcurrencyLimit:
+    limit = _route_limits.get(key)
+    if limit is None:
+        limit = _route_limits[key] = ConcurrencyLimit(key, ROUTE_CONCURRENCY.get(key, CONCURRENCY_DEFAULT))
+    return limit
+
+
+async def route_concurrency(connection: HTTPConnection):
+    # Зависимость всего приложения: маршрут уже выбран, ключ - метод и шаблон
+    # пути, а не сам URL - /news/1 и /news/2 делят один лимит
+    route = connection.scope.get("route")
+    if connection.scope["type"] != "http" or route is None:
+        yield
+        return
+    limit = route_limit(f"{connection.scope['method']} {route.path}")
+    if limit.limit <= 0:
+        yield
+        return
+    limit.acquire()
+    try:
+        yield
+    finally:
+        limit.release()
+
+
+# Один слот на логин и регистрацию: оба упираются в пул хеширования
+auth_concurrency = ConcurrencyLimit("auth", CONCURRENCY_LOGIN)
+comments_concurrency = ConcurrencyLimit("comments", CONCURRENCY_COMMENTS)
+
+login_rate_limit = rate_limit_by_ip("login", RATE_LIMIT_LOGIN)
+register_rate_limit = rate_limit_by_ip("register", RATE_LIMIT_REGISTER)
+comments_rate_limit = rate_limit_by_user("comments", RATE_LIMIT_COMMENTS)
@@ -0,0 +1,202 @@
+import logging
+import math
+import os
+import time
+from sqlalchemy import event, exc
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from . import auth, metrics
+from .cache import make_backend
+from .db import AsyncSessionLocal, _request_writes, replica_engines
+
+logger = logging.getLogger(__name__)
+
+# Маршрутизация чтений: GET-обработчики с deps.get_read_db получают сессию на
+# реплике (round-robin по здоровым), все записи идут на primary (RoutingSession).
+# Клиент, который только что писал, DB_READ_YOUR_WRITES_SECONDS читает с primary.
+# Отметка - в cookie и, для Bearer-клиентов без cookie, по user_id в backend'е
+# кэша (CACHE_BACKEND=redis - общая для всех воркеров API)
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5))
+# Недоступная реплика исключается на это время, затем пробуется снова
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", 30))
+READ_YOUR_WRITES_COOKIE = "db_primary_until"
+
+read_sessions = metrics.counter(
+    "db_read_sessions_total", "Read-only request sessions by target and reason", ("target", "reason")
+)
+replica_failures = metrics.counter("db_replica_failures_total", "Replica connection failures", ("replica",))
+
+
+class ReplicaSet:
+    def __init__(self, engines):
+        self.engines = list(engines)
+        self.down_until = [0.0] * len(self.engines)
+        self._next = 0
+
+    def choose(self):
+        # Следующая здоровая по кругу; None - все недоступны
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            n = self._next % len(self.engines)
+            self._next += 1
+            if self.down_until[n] <= now:
+                return self.engines[n]
+        return None
+
+    def name(self, engine) -> str:
+        return f"replica{self.engines.index(engine)}"
+
+    def mark_down(self, engine, reason) -> None:
+        n = self.engines.index(engine)
+        if self.down_until[n] <= time.monotonic():
+            logger.warning(f"Replica {n} is unavailable for {DB_REPLICA_RETRY_SECONDS:.0f}s: {reason}")
+        self.down_until[n] = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+        replica_failures.labels(str(n)).inc()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        counts = {"replica": 0, "primary": 0}
+        reasons = {}
+        for labels, value in read_sessions.samples():
+            target = "primary" if labels["target"] == "primary" else "replica"
+            counts[target] += value
+            reasons[labels["reason"]] = reasons.get(labels["reason"], 0) + value
+        total = counts["replica"] + counts["primary"]
+        return {
+            "replicas": [
+                {"name": f"replica{n}", "up": until <= now, "retry_in": round(max(until - now, 0.0), 1)}
+                for n, until in enumerate(self.down_until)
+            ],
+            "read_sessions": counts,
+            "reasons": reasons,
+            "replica_hit_ratio": round(counts["replica"] / total, 4) if total else 0.0,
+        }
+
+
+replicas = ReplicaSet(replica_engines)
+# user_id -> "писал недавно"; запись живет DB_READ_YOUR_WRITES_SECONDS
+recent_writers = make_backend(ttl=DB_READ_YOUR_WRITES_SECONDS)
+
+
+def _watch(replica):
+    # Обрыв соединения посреди запроса (Postgres перезапущен, сеть) -
+    # реплика выводится из ротации, не дожидаясь следующего подключения
+    @event.listens_for(replica.sync_engine, "handle_error")
+    def handle_error(context):
+        if context.is_disconnect:
+            replicas.mark_down(replica, context.original_exception)
+
+
+for _replica in replica_engines:
+    _watch(_replica)
+
+
+def bearer_user_id(connection: HTTPConnection):
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    payload = auth.decode_token(token)
+    if payload is None or payload.get("type") != "access":
+        return None
+    return payload.get("user_id")
+
+
+def writer_key(user_id) -> str:
+    return f"recent_write:{user_id}"
+
+
+async def mark_recent_write(connection: HTTPConnection) -> None:
+    user_id = bearer_user_id(connection)
+    if user_id is None:
+        return
+    try:
+        await recent_writers.set(writer_key(user_id), b"1", DB_READ_YOUR_WRITES_SECONDS)
+    except Exception as e:
+        # Без отметки клиент в худшем случае прочитает отстающую реплику
+        logger.warning(f"Failed to mark recent write for user {user_id}: {e}")
+
+
+async def recent_write(connection: HTTPConnection) -> bool:
+    try:
+        until = float(connection.cookies.get(READ_YOUR_WRITES_COOKIE, 0))
+    except ValueError:
+        until = 0.0
+    now = time.time()
+    # Отметка дальше окна - подделка или смена настроек, не верим
+    if now < until <= now + DB_READ_YOUR_WRITES_SECONDS:
+        return True
+    user_id = bearer_user_id(connection)
+    if user_id is None:
+        return False
+    try:
+        return await recent_writers.get(writer_key(user_id)) is not None
+    except Exception as e:
+        logger.warning(f"Failed to check recent write for user {user_id}: {e}")
+        return False
+
+
+async def open_read_session(connection: HTTPConnection):
+    if not replicas.engines:
+        read_sessions.labels("primary", "no_replicas").inc()
+        return AsyncSessionLocal()
+    if await recent_write(connection):
+        read_sessions.labels("primary", "read_your_writes").inc()
+        return AsyncSessionLocal(info={"read_your_writes": True})
+    # Каждую реплику - не больше одного раза за запрос
+    for _ in range(len(replicas.engines)):
+        replica = replicas.choose()
+        if replica is None:
+            break
+        db = AsyncSessionLocal(info={"replica": replica})
+        try:
+            # Соединение берем сразу: недоступная реплика обнаруживается здесь,
+            # а не посреди обработчика, и запрос уходит на следующую или на primary
+            await db.connection()
+        except exc.TimeoutError:
+            # Пул реплики исчерпан (DB_REPLICA_POOL_TIMEOUT) - перегружена, но жива
+            await db.close()
+            continue
+        except (exc.DBAPIError, OSError) as e:
+            await db.close()
+            replicas.mark_down(replica, e)
+            continue
+        read_sessions.labels(replicas.name(replica), "round_robin").inc()
+        return db
+    read_sessions.labels("primary", "replicas_unavailable").inc()
+    return AsyncSessionLocal()
+
+
+class ReadYourWritesMiddleware:
+    """Ставит cookie с отметкой "читать с primary до ..." на ответ, если
+    обработчик что-то записал в БД (RoutingSession отмечает flush и DML),
+    и ту же отметку по user_id из Bearer-токена - для клиентов без cookie."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        writes = [False]
+        token = _request_writes.set(writes)
+
+        async def send_wrapper(message: Message) -> None:
+            # Коммит обработчика завершен до начала ответа
+            if message["type"] == "http.response.start" and writes[0] and message["status"] < 400:
+                # До начала ответа: следующий запрос клиента уже увидит отметку
+                await mark_recent_write(HTTPConnection(scope))
+                until = time.time() + DB_READ_YOUR_WRITES_SECONDS
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Set-Cookie",
+                    f"{READ_YOUR_WRITES_COOKIE}={until:.3f}; Max-Age={math.ceil(DB_READ_YOUR_WRITES_SECONDS)}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_writes.reset(token)
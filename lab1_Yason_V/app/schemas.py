@@ -29,6 +29,15 @@ class UserRead(UserBase):
         from_attributes = True
 
 
+class UserPrincipal(BaseModel):
+    # Минимум данных о пользователе для авторизации запроса
+    id: int
+    is_author: bool = False
+    is_admin: bool = False
+    class Config:
+        from_attributes = True
+
+
 class Token(BaseModel):
     access_token: str
     refresh_token: str
@@ -53,9 +62,26 @@ class NewsRead(NewsBase):
     id: int
     published_at: datetime
     author_id: int
+    comment_count: int = 0
     class Config:
         from_attributes = True
 
+class NewsPage(BaseModel):
+    items: List[NewsRead]
+    next_cursor: Optional[str] = None
+
+class NewsSearchHit(BaseModel):
+    id: int
+    title: str
+    published_at: datetime
+    author_id: int
+    rank: float
+    snippet: Optional[str] = None
+
+class NewsSearchPage(BaseModel):
+    items: List[NewsSearchHit]
+    next_offset: Optional[int] = None
+
 
 class CommentBase(BaseModel):
     text: str = Field(..., min_length=1)
@@ -71,6 +97,20 @@ class CommentRead(CommentBase):
     class Config:
         from_attributes = True
 
+class UserSummary(BaseModel):
+    id: int
+    name: str
+    avatar: Optional[str] = None
+    class Config:
+        from_attributes = True
+
+class CommentWithAuthor(CommentRead):
+    author: Optional[UserSummary] = None
+
+class CommentPage(BaseModel):
+    items: List[CommentWithAuthor]
+    next_cursor: Optional[str] = None
+
 
 class SessionRead(BaseModel):
     id: int
@@ -0,0 +1,104 @@
+import os
+import re
+from sqlalchemy import DDL, DateTime, Float, event, text
+from .models import News
+
+# Полнотекстовый поиск по заголовку и тексту из JSON content.
+# SQLite: внешняя FTS5-таблица news_fts, синхронизируется триггерами.
+# Postgres: генерируемая колонка tsvector + GIN-индекс.
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", "simple")
+
+
+def extract_text(content) -> str:
+    # Все строковые значения из JSON (ключи не нужны) - через пробел
+    parts = []
+
+    def walk(value):
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, dict):
+            for item in value.values():
+                walk(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                walk(item)
+
+    walk(content)
+    return " ".join(parts)
+
+
+@event.listens_for(News, "before_insert")
+@event.listens_for(News, "before_update")
+def fill_search_text(mapper, connection, target):
+    target.search_text = extract_text(target.content)
+
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5("
+    "title, search_text, content='news', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_ai AFTER INSERT ON news BEGIN "
+    "INSERT INTO news_fts(rowid, title, search_text) VALUES (new.id, new.title, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_ad AFTER DELETE ON news BEGIN "
+    "INSERT INTO news_fts(news_fts, rowid, title, search_text) VALUES ('delete', old.id, old.title, old.search_text); END",
+    # Только при смене индексируемых колонок - обновление comment_count индекс не трогает
+    "CREATE TRIGGER IF NOT EXISTS news_fts_au AFTER UPDATE OF title, search_text ON news BEGIN "
+    "INSERT INTO news_fts(news_fts, rowid, title, search_text) VALUES ('delete', old.id, old.title, old.search_text); "
+    "INSERT INTO news_fts(rowid, title, search_text) VALUES (new.id, new.title, new.search_text); END",
+]
+
+POSTGRES_DDL = [
+    "ALTER TABLE news ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(search_text, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_news_search_vector ON news USING GIN (search_vector)",
+]
+
+for statement in SQLITE_DDL:
+    event.listen(News.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_DDL:
+    event.listen(News.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+
+def fts5_query(query: str) -> str:
+    # Пользовательский ввод -> безопасный MATCH: каждое слово в кавычках (AND),
+    # последнее - префиксом, чтобы искать по мере набора
+    words = re.findall(r"\w+", query)
+    if not words:
+        return ""
+    terms = [f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*']
+    return " ".join(terms)
+
+
+SQLITE_SEARCH = text("""
+    SELECT news.id, news.title, news.published_at, news.author_id,
+           -bm25(news_fts, 10.0, 1.0) AS rank,
+           snippet(news_fts, -1, '<b>', '</b>', '...', 12) AS snippet
+    FROM news_fts JOIN news ON news.id = news_fts.rowid
+    WHERE news_fts MATCH :query
+    ORDER BY bm25(news_fts, 10.0, 1.0)
+    LIMIT :limit OFFSET :offset
+""").columns(published_at=DateTime, rank=Float)
+
+# ts_headline дорогой - считаем его только для строк страницы
+POSTGRES_SEARCH = text(f"""
+    SELECT hits.id, hits.title, hits.published_at, hits.author_id, hits.rank,
+           ts_headline('{SEARCH_CONFIG}', coalesce(hits.search_text, hits.title), hits.q,
+                       'StartSel=<b>, StopSel=</b>, MaxFragments=1, MaxWords=20') AS snippet
+    FROM (
+        SELECT news.id, news.title, news.published_at, news.author_id, news.search_text, q,
+               ts_rank(news.search_vector, q) AS rank
+        FROM news, websearch_to_tsquery('{SEARCH_CONFIG}', :query) AS q
+        WHERE news.search_vector @@ q
+        ORDER BY rank DESC, news.id DESC
+        LIMIT :limit OFFSET :offset
+    ) AS hits
+    ORDER BY hits.rank DESC, hits.id DESC
+""").columns(published_at=DateTime, rank=Float)
+
+
+def search_statement(dialect_name: str, query: str):
+    # (statement, параметр запроса) или (None, None), если искать нечего
+    if dialect_name == "postgresql":
+        return (POSTGRES_SEARCH, query) if query.strip() else (None, None)
+    match = fts5_query(query)
+    return (SQLITE_SEARCH, match) if match else (None, None)
@@ -0,0 +1,102 @@
+import json
+import os
+from datetime import datetime
+# Классы ответов из starlette, а не fastapi: модуль импортируют и воркеры
+# Celery (через crud -> bulk), а пакет fastapi грузится ~0.5 с
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен - тогда stdlib json
+    orjson = None
+
+
+class ORJSONResponse(JSONResponse):
+    # То же, что fastapi.responses.ORJSONResponse
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+# orjson - быстрый сериализатор (по умолчанию, если установлен), stdlib - json
+JSON_BACKEND = os.getenv("JSON_BACKEND", "orjson")
+USE_ORJSON = orjson is not None and JSON_BACKEND == "orjson"
+
+DefaultResponse = ORJSONResponse if USE_ORJSON else JSONResponse
+
+
+def _default(value):
+    # datetime и прочее - как делает pydantic для naive datetime
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    if USE_ORJSON:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def json_response(payload) -> Response:
+    # Готовые байты: FastAPI не валидирует response_model повторно
+    return Response(content=dumps(payload), media_type="application/json")
+
+
+# ORM-строка -> dict в формате схем из schemas.py (те же поля и порядок),
+# без промежуточной модели pydantic
+def news_dict(news) -> dict:
+    return {
+        "title": news.title,
+        "content": news.content,
+        "cover": news.cover,
+        "id": news.id,
+        "published_at": news.published_at,
+        "author_id": news.author_id,
+        "comment_count": news.comment_count,
+    }
+
+
+def user_summary_dict(user) -> dict:
+    return {"id": user.id, "name": user.name, "avatar": user.avatar}
+
+
+def comment_read_dict(comment) -> dict:
+    return {
+        "text": comment.text,
+        "id": comment.id,
+        "news_id": comment.news_id,
+        "author_id": comment.author_id,
+        "published_at": comment.published_at,
+    }
+
+
+def comment_dict(comment) -> dict:
+    # CommentWithAuthor: без include_author связь не загружена (noload) - None
+    return {
+        **comment_read_dict(comment),
+        "author": user_summary_dict(comment.author) if comment.author else None,
+    }
+
+
+# Запись в кэше новостей: строка "version updated_at" и готовое тело NewsRead.
+# Так 304 отвечается из кэша, а ETag не расходится с закэшированным телом.
+def pack_entity(version: int, updated_at: datetime, body: bytes) -> bytes:
+    stamp = updated_at.isoformat() if updated_at else ""
+    return f"{version} {stamp}\n".encode() + body
+
+
+def unpack_entity(raw: bytes):
+    meta, _, body = raw.partition(b"\n")
+    version, _, stamp = meta.decode().partition(" ")
+    return int(version), datetime.fromisoformat(stamp) if stamp else None, body
+
+
+def search_hit_dict(row) -> dict:
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "published_at": row["published_at"],
+        "author_id": row["author_id"],
+        "rank": row["rank"],
+        "snippet": row["snippet"],
+    }
@@ -1,63 +1,228 @@
 import logging
+import os
+from celery import chord
 from celery.exceptions import Retry
 from .celery_app import celery_app
 from .db import SessionLocal
-from . import crud
+from . import crud, delivery, feed, outbox
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# Аудитория рассылки режется на чанки по id, каждый чанк - отдельная подзадача
+NOTIFY_CHUNK_SIZE = int(os.getenv("NOTIFY_CHUNK_SIZE", 1000))
+# Сколько заголовков попадает в тело дайджеста
+DIGEST_MAX_ITEMS = int(os.getenv("DIGEST_MAX_ITEMS", 50))
+SESSION_PURGE_BATCH = int(os.getenv("SESSION_PURGE_BATCH", 1000))
+
+
+def deliver_messages(messages):
+    # Повторы по каждому адресу делает backend; кто не дошел и после них -
+    # уходит в отдельную задачу, а не перезапускает весь чанк
+    result = delivery.get_backend().send_batch(messages)
+    if result.failed:
+        logger.warning(f"{len(result.failed)} messages failed, scheduling retry")
+        retry_failed_messages.apply_async(
+            args=[[list(m) for m in result.failed]], countdown=60
+        )
+    return result.sent
+
+
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
-def send_news_notification(self, news_id):
+def send_news_notification(self, news_id, event_id=None):
+    # event_id - id события outbox: relay доставляет at-least-once, повтор пропускаем
     try:
         db = SessionLocal()
         try:
+            if event_id is not None and not crud.claim_event(db, event_id, "send_news_notification"):
+                logger.info(f"Outbox event {event_id} already processed, skipping")
+                return 0
+
             news = crud.get_news(db, news_id)
             if not news:
                 logger.error(f"News {news_id} not found")
+                db.commit()
                 return
-            
-            users = crud.list_users(db)
-            
-            for user in users:
-                logger.info(f"Sent news notification to user {user.id} ({user.email}) about news: {news.title}")
-                
-            with open('notifications.log', 'a') as f:
-                timestamp = datetime.now().isoformat()
-                for user in users:
-                    f.write(f"{timestamp} - NEWS_NOTIFICATION - User: {user.email}, News: {news.title}\n")
-                    
+
+            chunks = [
+                deliver_news_notification_chunk.s(news_id, news.title, after_id, last_id)
+                for after_id, last_id in crud.iter_user_id_ranges(db, NOTIFY_CHUNK_SIZE)
+            ]
+            if chunks:
+                if not self.request.is_eager:
+                    self.update_state(state="PROGRESS", meta={"news_id": news_id, "chunks": len(chunks)})
+                chord(chunks)(news_notification_done.s(news_id))
+                logger.info(f"Dispatched news {news_id} notification in {len(chunks)} chunks")
+            # Отметка об обработке фиксируется только после постановки чанков:
+            # упали раньше - повтор задачи разошлет заново
+            db.commit()
         finally:
             db.close()
-            
+        return len(chunks)
+
     except Exception as exc:
         logger.error(f"Failed to send news notification: {exc}")
         raise self.retry(countdown=2 ** self.request.retries, exc=exc)
 
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
+def fanout_news(self, news_id, event_id=None):
+    # Раскладка новости по лентам подписчиков; отметка события и записи ленты -
+    # одной транзакцией, поэтому повторная доставка не задвоит ленту
+    try:
+        db = SessionLocal()
+        try:
+            if event_id is not None and not crud.claim_event(db, event_id, "fanout_news"):
+                logger.info(f"Outbox event {event_id} already fanned out, skipping")
+                return 0
+            written = crud.fanout_news(db, news_id, feed.FEED_FANOUT_THRESHOLD)
+            db.commit()
+        finally:
+            db.close()
+        if written is None:
+            logger.error(f"News {news_id} not found")
+        return written or 0
+
+    except Exception as exc:
+        logger.error(f"Failed to fan out news {news_id}: {exc}")
+        raise self.retry(countdown=2 ** self.request.retries, exc=exc)
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
+def deliver_news_notification_chunk(self, news_id, title, after_id, last_id):
+    try:
+        db = SessionLocal()
+        try:
+            sent = 0
+            for batch in crud.iter_user_batches(db, after_id, last_id):
+                sent += deliver_messages([
+                    delivery.Message(user.email, f"News: {title}", title, "NEWS_NOTIFICATION")
+                    for user in batch
+                ])
+        finally:
+            db.close()
+
+        logger.info(f"Sent news {news_id} notification to {sent} users ({after_id}, {last_id}]")
+        return sent
+
+    except Exception as exc:
+        logger.error(f"Failed to send news notification chunk ({after_id}, {last_id}]: {exc}")
+        raise self.retry(countdown=2 ** self.request.retries, exc=exc)
+
+@celery_app.task
+def news_notification_done(sent_counts, news_id):
+    total = sum(sent_counts)
+    logger.info(f"News {news_id} notification finished: {total} users in {len(sent_counts)} chunks")
+    return total
+
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
 def send_weekly_digest(self):
     try:
         db = SessionLocal()
         try:
-            week_ago = datetime.now() - timedelta(days=7)
-            all_news = db.query(crud.models.News).all()
-            recent_news = [n for n in all_news if n.published_at >= week_ago] if all_news else []
-            
-            logger.info(f"Found {len(recent_news)} recent news for digest")
-            
-            users = crud.list_users(db)
-            
-            for user in users:
-                logger.info(f"Sent weekly digest to user {user.id} ({user.email}) with {len(recent_news)} news items")
-                
-            with open('digests.log', 'a') as f:
-                timestamp = datetime.now().isoformat()
-                for user in users:
-                    f.write(f"{timestamp} - WEEKLY_DIGEST - User: {user.email}, News count: {len(recent_news)}\n")
-                    
+            # Фильтр по дате - в SQL (индекс ix_news_published_at_id), из БД
+            # приходят только заголовки новостей за неделю
+            week_ago = datetime.utcnow() - timedelta(days=7)
+            news_count = crud.count_news_since(db, week_ago)
+            digest = render_weekly_digest(crud.list_news_titles_since(db, week_ago, DIGEST_MAX_ITEMS), news_count)
+
+            logger.info(f"Found {news_count} recent news for digest")
+
+            chunks = [
+                deliver_weekly_digest_chunk.s(digest, after_id, last_id)
+                for after_id, last_id in crud.iter_user_id_ranges(db, NOTIFY_CHUNK_SIZE)
+            ]
         finally:
             db.close()
-            
+
+        if not chunks:
+            return 0
+
+        chord(chunks)(weekly_digest_done.s())
+        logger.info(f"Dispatched weekly digest in {len(chunks)} chunks")
+        return len(chunks)
+
     except Exception as exc:
         logger.error(f"Failed to send weekly digest: {exc}")
-        raise self.retry(countdown=2 ** self.request.retries, exc=exc)
\ No newline at end of file
+        raise self.retry(countdown=2 ** self.request.retries, exc=exc)
+
+def render_weekly_digest(titles, news_count):
+    # Тело дайджеста одно на всех получателей - собираем один раз
+    lines = [f"News this week: {news_count}"]
+    lines.extend(f"- {title}" for title in titles)
+    if news_count > len(titles):
+        lines.append(f"...and {news_count - len(titles)} more")
+    return {"news_count": news_count, "body": "\n".join(lines)}
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
+def deliver_weekly_digest_chunk(self, digest, after_id, last_id):
+    try:
+        db = SessionLocal()
+        try:
+            sent = 0
+            subject = f"News count: {digest['news_count']}"
+            for batch in crud.iter_user_batches(db, after_id, last_id):
+                sent += deliver_messages([
+                    delivery.Message(user.email, subject, digest["body"], "WEEKLY_DIGEST")
+                    for user in batch
+                ])
+        finally:
+            db.close()
+
+        logger.info(f"Sent weekly digest to {sent} users ({after_id}, {last_id}]")
+        return sent
+
+    except Exception as exc:
+        logger.error(f"Failed to send weekly digest chunk ({after_id}, {last_id}]: {exc}")
+        raise self.retry(countdown=2 ** self.request.retries, exc=exc)
+
+@celery_app.task
+def weekly_digest_done(sent_counts):
+    total = sum(sent_counts)
+    logger.info(f"Weekly digest finished: {total} users in {len(sent_counts)} chunks")
+    return total
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=60)
+def retry_failed_messages(self, messages):
+    result = delivery.get_backend().send_batch([delivery.Message(*m) for m in messages])
+    if result.failed:
+        logger.error(f"{len(result.failed)} messages still failing (retry {self.request.retries})")
+        if self.request.retries >= self.max_retries:
+            return result.sent
+        raise self.retry(
+            args=[[list(m) for m in result.failed]],
+            countdown=2 ** self.request.retries * 60,
+        )
+    return result.sent
+
+@celery_app.task
+def purge_expired_refresh_sessions():
+    db = SessionLocal()
+    try:
+        deleted = crud.purge_expired_refresh_sessions(db, batch_size=SESSION_PURGE_BATCH)
+    finally:
+        db.close()
+    logger.info(f"Purged {deleted} expired refresh sessions")
+    return deleted
+
+@celery_app.task
+def relay_outbox():
+    # По расписанию beat: неотправленные события outbox -> задачи Celery
+    sent = outbox.relay_pending()
+    if sent:
+        logger.info(f"Relayed {sent} outbox events")
+    return sent
+
+@celery_app.task
+def trim_timelines():
+    db = SessionLocal()
+    try:
+        deleted = crud.trim_timelines(db, feed.FEED_TIMELINE_LENGTH, feed.FEED_TRIM_CHUNK)
+    finally:
+        db.close()
+    logger.info(f"Trimmed {deleted} timeline entries")
+    return deleted
+
+@celery_app.task
+def purge_outbox():
+    deleted = outbox.purge()
+    logger.info(f"Purged {deleted} outbox records")
+    return deleted
@@ -0,0 +1,101 @@
+"""Сравнение sync (SessionLocal + crud) и async (AsyncSession + crud_async) путей.
+
+Запуск из каталога lab1_Yason_V:
+
+    python -m bench.bench_async_db --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+
+from .common import use_temp_database, run_load, print_results
+
+use_temp_database()
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Request
+from sqlalchemy.orm import Session
+
+from app import auth, crud, schemas
+from app.db import Base, engine, async_engine, SessionLocal
+from app.deps import get_db
+from app.main import app as async_app
+
+
+def build_sync_app() -> FastAPI:
+    # Те же эндпоинты в старом синхронном виде - для сравнения
+    sync_app = FastAPI()
+
+    @sync_app.get("/news/{news_id}", response_model=schemas.NewsRead)
+    def read_news(news_id: int, db: Session = Depends(get_db)):
+        n = crud.get_news(db, news_id)
+        if not n:
+            raise HTTPException(404, "News not found")
+        return n
+
+    @sync_app.post("/auth/login", response_model=schemas.Token)
+    def login(user_in: schemas.UserLogin, request: Request, db: Session = Depends(get_db)):
+        user = crud.get_user_by_email(db, user_in.email)
+        if not user or not auth.verify_password(user_in.password, user.hashed_password):
+            raise HTTPException(401, "Incorrect email or password")
+        refresh_token = auth.create_refresh_token()
+        crud.create_refresh_session(db, user.id, refresh_token, request.headers.get("user-agent"))
+        return {
+            "access_token": auth.create_access_token(data={"user_id": user.id}),
+            "refresh_token": refresh_token,
+        }
+
+    return sync_app
+
+
+def seed(news_count: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = crud.create_user(db, schemas.UserCreate(
+            name="bench", email="bench@example.com", password="benchpass"
+        ))
+        for i in range(news_count):
+            db.add(crud.models.News(
+                title=f"news {i}", content={"body": "x" * 200}, author_id=user.id
+            ))
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+async def bench_app(label: str, app, args) -> list:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def get_news(i):
+            r = await client.get(f"/news/{i % args.news + 1}")
+            return r.status_code == 200
+
+        async def login(i):
+            r = await client.post("/auth/login", json={
+                "email": "bench@example.com", "password": "benchpass"
+            })
+            return r.status_code == 200
+
+        return [
+            await run_load(f"{label} GET /news/{{id}}", get_news, args.requests, args.concurrency),
+            await run_load(f"{label} POST /auth/login", login, args.login_requests, args.concurrency),
+        ]
+
+
+async def main(args) -> None:
+    seed(args.news)
+    results = []
+    results += await bench_app("sync", build_sync_app(), args)
+    results += await bench_app("async", async_app, args)
+    print_results(results)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--news", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--login-requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
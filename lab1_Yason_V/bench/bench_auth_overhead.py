@@ -0,0 +1,59 @@
+"""Стоимость deps.get_current_user на запрос: SELECT пользователя, кэш, роли в токене.
+
+    python -m bench.bench_auth_overhead --iterations 5000
+"""
+import argparse
+import asyncio
+import time
+
+from .common import use_temp_database, percentile, print_results
+
+use_temp_database()
+
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import insert
+
+from app import auth, cache, deps, models
+from app.db import Base, engine, async_engine, AsyncSessionLocal
+
+
+def seed() -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"name": "bench", "email": "bench@example.com", "is_author": True}])
+
+
+async def measure(label: str, token: str, iterations: int) -> dict:
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    latencies = []
+    for _ in range(iterations):
+        # Как в FastAPI: новая сессия на каждый запрос
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await deps.get_current_user(credentials, db)
+            latencies.append(time.perf_counter() - started)
+    return {
+        "name": label,
+        "p50_us": round(percentile(latencies, 0.5) * 1e6, 1),
+        "p99_us": round(percentile(latencies, 0.99) * 1e6, 1),
+    }
+
+
+async def main(args) -> None:
+    seed()
+    plain = auth.create_access_token(data={"user_id": 1})
+    with_roles = auth.create_access_token(data={"user_id": 1, "is_author": True, "is_admin": False})
+
+    cache.user_cache.backend = cache.NullCache()
+    results = [await measure("select per request", plain, args.iterations)]
+    cache.user_cache.backend = cache.MemoryCache(ttl=cache.USER_CACHE_TTL)
+    results.append(await measure("principal cache", plain, args.iterations))
+    results.append(await measure("role claims in token", with_roles, args.iterations))
+    print_results(results)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
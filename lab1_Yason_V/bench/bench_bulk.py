@@ -0,0 +1,92 @@
+"""Импорт новостей: по одной через crud.create_news (commit + refresh на строку)
+против NDJSON-батчей bulk_insert_news (executemany, на Postgres - COPY),
+и скорость потокового экспорта.
+
+Для Postgres задайте DATABASE_URL=postgresql://... перед запуском.
+
+    python -m bench.bench_bulk --rows 200000 --single-rows 5000 --batch-size 1000 5000
+"""
+import argparse
+import io
+import json
+import time
+
+from .common import use_temp_database, print_results
+
+use_temp_database()
+
+from sqlalchemy import insert
+
+from app import bulk, crud, models, schemas
+from app.db import Base, engine, SessionLocal
+
+
+def ndjson(rows: int) -> str:
+    return "".join(
+        json.dumps({"title": f"news {i}", "content": {"blocks": [{"text": f"body {i} " * 20}]}}) + "\n"
+        for i in range(rows)
+    )
+
+
+def single_inserts(rows: int) -> dict:
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        for line in io.StringIO(ndjson(rows)):
+            crud.create_news(db, schemas.NewsCreate.model_validate_json(line), author_id=1)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - started
+    return {"name": "create_news per row", "rows": rows, "rows_per_sec": round(rows / elapsed, 1)}
+
+
+def bulk_import(rows: int, batch_size: int) -> dict:
+    source = io.StringIO(ndjson(rows))
+    report = bulk.ImportReport()
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        for batch in bulk.batched_lines(source, 1, report, batch_size):
+            report.inserted += crud.bulk_insert_news(db, batch)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - started
+    return {
+        "name": f"bulk batch={batch_size}",
+        "rows": report.inserted,
+        "rows_per_sec": round(report.inserted / elapsed, 1),
+    }
+
+
+def export(batch_size: int) -> dict:
+    db = SessionLocal()
+    started = time.perf_counter()
+    size = 0
+    rows = 0
+    try:
+        for row in crud.iter_news(db, batch_size):
+            size += len(bulk.export_line(row))
+            rows += 1
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - started
+    return {"name": f"export batch={batch_size}", "rows": rows, "rows_per_sec": round(rows / elapsed, 1), "mb": round(size / 2**20, 1)}
+
+
+def main(args) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"name": "bench", "email": "bench@example.com", "is_author": True}])
+    results = [single_inserts(args.single_rows)]
+    for batch_size in args.batch_size:
+        results.append(bulk_import(args.rows, batch_size))
+    results.append(export(args.batch_size[-1]))
+    print_results(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--single-rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1000, 5000])
+    main(parser.parse_args())
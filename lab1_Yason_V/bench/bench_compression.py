@@ -0,0 +1,84 @@
+"""Байты на проводе и CPU на запрос: GET /news/{id} и GET /news/?limit=100
+без сжатия, с gzip и br; для одной новости - сжатие на каждый запрос
+(кэш выключен) против заранее сжатого варианта из кэша.
+
+    pip install brotli   # необязательно, без него только gzip
+    python -m bench.bench_compression --requests 2000 --content-kb 1 10 100
+"""
+import argparse
+import asyncio
+import time
+
+from .common import use_temp_database, print_results
+
+use_temp_database()
+
+import httpx
+from sqlalchemy import insert
+
+from app import cache, compression, models
+from app.db import Base, engine, async_engine
+from app.main import app
+
+
+def seed(content_kb: list, list_size: int) -> dict:
+    Base.metadata.create_all(bind=engine)
+    ids = {}
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"name": "bench", "email": "bench@example.com"}])
+        for kb in content_kb:
+            words = int(kb * 1024 / 40)
+            content = {"blocks": [{"type": "paragraph", "text": f"новость {i} lorem ipsum"} for i in range(words)]}
+            result = conn.execute(insert(models.News).values(title=f"news {kb}KB", content=content, author_id=1))
+            ids[kb] = result.inserted_primary_key[0]
+        conn.execute(insert(models.News), [
+            {"title": f"feed {i}", "content": {"body": "короткая новость " * 20}, "author_id": 1}
+            for i in range(list_size)
+        ])
+    return ids
+
+
+async def measure(client, name: str, url: str, encoding: str, requests: int) -> dict:
+    headers = {"Accept-Encoding": encoding}
+    await client.get(url, headers=headers)
+    wire = 0
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for _ in range(requests):
+        r = await client.get(url, headers=headers)
+        wire += r.num_bytes_downloaded
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    return {
+        "name": f"{name} {encoding}",
+        "wire_bytes": wire // requests,
+        "cpu_us_per_req": round(cpu / requests * 1e6, 1),
+        "rps": round(requests / elapsed, 1),
+    }
+
+
+async def main(args) -> None:
+    ids = seed(args.content_kb, args.list_size)
+    encodings = ["identity", "gzip"] + (["br"] if compression.brotli else [])
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for kb, news_id in ids.items():
+            for label, backend in (("per-request", cache.NullCache()), ("precompressed", cache.MemoryCache())):
+                cache.news_cache.backend = backend
+                for encoding in encodings:
+                    if label == "precompressed" and encoding == "identity":
+                        continue
+                    results.append(await measure(client, f"news {kb}KB {label}", f"/news/{news_id}", encoding, args.requests))
+        for encoding in encodings:
+            results.append(await measure(client, f"feed limit={args.list_size}", f"/news/?limit={args.list_size}", encoding, args.requests))
+    print_results(results)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--content-kb", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--list-size", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,88 @@
+"""Сообщений в секунду для backend'ов доставки, SMTP - против локального aiosmtpd.
+
+    pip install aiosmtpd
+    python -m bench.bench_delivery --messages 2000 --concurrency 1 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from .common import print_results
+
+from app import delivery
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def messages(count: int):
+    return [
+        delivery.Message(f"user{i}@example.com", "News: bench", "body " * 50)
+        for i in range(count)
+    ]
+
+
+def measure(name: str, backend, count: int) -> dict:
+    batch = messages(count)
+    started = time.perf_counter()
+    result = backend.send_batch(batch)
+    elapsed = time.perf_counter() - started
+    backend.close()
+    return {
+        "name": name,
+        "sent": result.sent,
+        "failed": len(result.failed),
+        "msgs_per_sec": round(result.sent / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main(args) -> None:
+    log_dir = tempfile.mkdtemp(prefix="lab1-delivery-")
+    results = [
+        measure("memory", delivery.MemoryBackend(), args.messages),
+        measure("file", delivery.FileBackend(paths={"NEWS_NOTIFICATION": os.path.join(log_dir, "n.log")}), args.messages),
+    ]
+
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        print("aiosmtpd is not installed - skipping SMTP")
+        print_results(results)
+        return
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        for concurrency in args.concurrency:
+            results.append(measure(
+                f"smtp concurrency={concurrency}",
+                delivery.SMTPBackend(host="127.0.0.1", port=args.port, concurrency=concurrency),
+                args.messages,
+            ))
+        if args.rate:
+            results.append(measure(
+                f"smtp rate={args.rate}/s",
+                delivery.SMTPBackend(host="127.0.0.1", port=args.port, rate=args.rate),
+                min(args.messages, int(args.rate * 3)),
+            ))
+    finally:
+        controller.stop()
+    results.append({"name": "smtp server received", "messages": handler.received})
+    print_results(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--rate", type=float, default=200)
+    parser.add_argument("--port", type=int, default=8025)
+    main(parser.parse_args())
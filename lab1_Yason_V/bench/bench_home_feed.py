@@ -0,0 +1,221 @@
+"""Домашняя лента GET /feed/ на 100k пользователей: fan-out-on-write против
+JOIN подписок с новостями при чтении.
+
+Подписки и авторство распределены по степенному закону: несколько авторов-
+"знаменитостей" набирают больше FEED_FANOUT_THRESHOLD подписчиков и пишут больше
+всех, их новости подмешиваются при чтении. Раскладка - настоящая задача
+fanout_news (eager), затем trim_timelines.
+
+    python -m bench.bench_home_feed --users 100000 --authors 1000 --follows 10 --news 5000
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+from .common import percentile, print_results, use_temp_database
+
+use_temp_database("home_feed.db")
+
+import httpx
+from sqlalchemy import func, insert, select, tuple_, update
+
+from app import auth, crud_async, feed, models, tasks
+from app.celery_app import celery_app
+from app.db import AsyncSessionLocal, Base, async_engine, engine
+from app.main import app
+
+
+def seed(users: int, authors: int, follows: int, news: int, batch: int = 20000, seed_value: int = 42) -> dict:
+    rnd = random.Random(seed_value)
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, users, batch):
+            conn.execute(insert(models.User), [
+                {"name": f"user{i}", "email": f"user{i}@example.com", "is_author": i < authors}
+                for i in range(offset, min(offset + batch, users))
+            ])
+        # id авторов - 1..authors; вес автора k ~ 1/k
+        weights = [1 / (k + 1) for k in range(authors)]
+        rows = []
+        for follower_id in range(1, users + 1):
+            chosen = set()
+            while len(chosen) < follows:
+                chosen.update(rnd.choices(range(1, authors + 1), weights, k=follows - len(chosen)))
+            chosen.discard(follower_id)
+            rows += [{"follower_id": follower_id, "author_id": a} for a in chosen]
+            if len(rows) >= batch:
+                conn.execute(insert(models.Subscription), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(models.Subscription), rows)
+        conn.execute(update(models.User).values(follower_count=(
+            select(func.count()).where(models.Subscription.author_id == models.User.id).scalar_subquery()
+        )))
+        start = datetime.utcnow() - timedelta(days=30)
+        for offset in range(0, news, batch):
+            conn.execute(insert(models.News), [
+                {
+                    "title": f"news {i}",
+                    "content": {"body": "lorem ipsum"},
+                    "published_at": start + timedelta(seconds=i * 30 * 86400 // news),
+                    "author_id": rnd.choices(range(1, authors + 1), weights)[0],
+                }
+                for i in range(offset, min(offset + batch, news))
+            ])
+        celebrities = conn.execute(
+            select(func.count()).where(models.User.follower_count >= feed.FEED_FANOUT_THRESHOLD)
+        ).scalar()
+        subscriptions = conn.execute(select(func.count()).select_from(models.Subscription)).scalar()
+    return {
+        "name": "seed",
+        "users": users,
+        "subscriptions": subscriptions,
+        "news": news,
+        "celebrities": celebrities,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+def fanout(news: int) -> dict:
+    celery_app.conf.update(task_always_eager=True, result_backend="cache+memory://")
+    started = time.perf_counter()
+    written = sum(tasks.fanout_news.apply(args=[news_id]).get() for news_id in range(1, news + 1))
+    fanout_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    trimmed = tasks.trim_timelines.apply().get()
+    trim_seconds = time.perf_counter() - started
+    with engine.connect() as conn:
+        stored = conn.execute(select(func.count()).select_from(models.TimelineEntry)).scalar()
+    return {
+        "name": "fan-out on write",
+        "timeline_rows_written": written,
+        "rows_per_s": round(written / fanout_seconds),
+        "fanout_s": round(fanout_seconds, 1),
+        "trimmed": trimmed,
+        "trim_s": round(trim_seconds, 1),
+        "timeline_rows": stored,
+    }
+
+
+async def naive_page(db, user_id: int, limit: int, cursor=None):
+    # Без материализации: все новости всех авторов из подписок, сортировка при чтении
+    query = (
+        select(models.News)
+        .join(models.Subscription, models.Subscription.author_id == models.News.author_id)
+        .where(models.Subscription.follower_id == user_id)
+    )
+    if cursor is not None:
+        query = query.where(tuple_(models.News.published_at, models.News.id) < tuple_(*cursor))
+    rows = (await db.execute(
+        query.order_by(models.News.published_at.desc(), models.News.id.desc()).limit(limit + 1)
+    )).scalars().all()
+    return {"items": rows[:limit], "next_cursor": rows[limit - 1] if len(rows) > limit else None}
+
+
+async def timeline_page(db, user_id: int, limit: int, cursor=None):
+    page = await crud_async.get_feed(db, user_id, limit, cursor)
+    last = page["items"][-1] if page["next_cursor"] else None
+    return {"items": page["items"], "next_cursor": last}
+
+
+async def bench_queries(samples: dict, limit: int, deep_page: int) -> list:
+    # Только запросы к БД, без HTTP: материализованная лента против JOIN
+    results = []
+    async with AsyncSessionLocal() as db:
+        for (name, fetch), (group, user_ids) in itertools.product(
+            (("get_feed", timeline_page), ("naive JOIN", naive_page)), samples.items()
+        ):
+            latencies = {1: [], deep_page: []}
+            for user_id in user_ids:
+                cursor = None
+                for page_no in range(1, deep_page + 1):
+                    started = time.perf_counter()
+                    page = await fetch(db, user_id, limit, cursor)
+                    if page_no in latencies:
+                        latencies[page_no].append(time.perf_counter() - started)
+                    if page["next_cursor"] is None:
+                        break
+                    cursor = (page["next_cursor"].published_at, page["next_cursor"].id)
+                db.expunge_all()
+            results += [latency_row(f"{name}, {group} users, page {n}", s) for n, s in latencies.items()]
+    return results
+
+
+def latency_row(name: str, latencies: list) -> dict:
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def bench_http(user_ids: list, limit: int, deep_page: int) -> list:
+    first, deep, sizes = [], [], []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for user_id in user_ids:
+            principal = models.User(id=user_id, is_author=False, is_admin=False)
+            headers = {"Authorization": "Bearer " + auth.create_access_token(auth.access_token_claims(principal))}
+            params = {"limit": limit}
+            for page_no in range(1, deep_page + 1):
+                started = time.perf_counter()
+                response = await client.get("/feed/", params=params, headers=headers)
+                elapsed = time.perf_counter() - started
+                response.raise_for_status()
+                page = response.json()
+                if page_no == 1:
+                    first.append(elapsed)
+                    sizes.append(len(page["items"]))
+                elif page_no == deep_page:
+                    deep.append(elapsed)
+                if not page["next_cursor"]:
+                    break
+                params["cursor"] = page["next_cursor"]
+    results = [latency_row("GET /feed/ page 1", first), latency_row(f"GET /feed/ page {deep_page}", deep)]
+    results[0]["avg_items"] = round(sum(sizes) / len(sizes), 1)
+    return results
+
+
+def sample_users(count: int, tail_from: int, seed_value: int = 7) -> dict:
+    # random - любые пользователи (в основном читают активных авторов);
+    # long-tail - подписаны только на авторов с id > tail_from, их новости в
+    # общем потоке редки и JOIN просматривает много лишнего
+    with engine.connect() as conn:
+        users = conn.execute(select(func.count()).select_from(models.User)).scalar()
+        tail = conn.execute(
+            select(models.User.id).where(~models.User.id.in_(
+                select(models.Subscription.follower_id).where(models.Subscription.author_id <= tail_from)
+            ))
+        ).scalars().all()
+    rnd = random.Random(seed_value)
+    return {
+        "random": rnd.sample(range(1, users + 1), count),
+        "long-tail": rnd.sample(tail, min(count, len(tail))),
+    }
+
+
+async def main(args) -> None:
+    results = [seed(args.users, args.authors, args.follows, args.news)]
+    results.append(fanout(args.news))
+    samples = sample_users(args.samples, args.tail_from)
+    results += await bench_http(samples["random"], args.limit, args.deep_page)
+    results += await bench_queries(samples, args.limit, args.deep_page)
+    await async_engine.dispose()
+    print_results(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--authors", type=int, default=1000)
+    parser.add_argument("--follows", type=int, default=10)
+    parser.add_argument("--news", type=int, default=5000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--deep-page", type=int, default=5)
+    parser.add_argument("--tail-from", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
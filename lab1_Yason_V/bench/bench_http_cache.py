@@ -0,0 +1,73 @@
+"""Условный GET /news/{id}: полный ответ 200 против 304 по If-None-Match,
+с закэшированной новостью и без кэша (легкий SELECT version вместо content).
+
+    python -m bench.bench_http_cache --requests 5000 --body-size 20000
+"""
+import argparse
+import asyncio
+import random
+
+from .common import use_temp_database, run_load, print_results
+
+use_temp_database()
+
+import httpx
+from sqlalchemy import insert
+
+from app import cache, models
+from app.db import Base, engine, async_engine
+from app.main import app
+
+
+def seed(news_count: int, body_size: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"name": "bench", "email": "bench@example.com"}])
+        conn.execute(insert(models.News), [
+            {"title": f"news {i}", "content": {"body": "x" * body_size}, "author_id": 1}
+            for i in range(news_count)
+        ])
+
+
+async def bench(label: str, backend, conditional: bool, args) -> dict:
+    cache.news_cache.backend = backend
+    rnd = random.Random(42)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        etags = {}
+        if conditional:
+            for news_id in range(1, args.news + 1):
+                etags[news_id] = (await client.get(f"/news/{news_id}")).headers["etag"]
+        received = 0
+
+        async def get_news(i):
+            nonlocal received
+            news_id = rnd.randint(1, args.news)
+            headers = {"If-None-Match": etags[news_id]} if conditional else {}
+            r = await client.get(f"/news/{news_id}", headers=headers)
+            received += len(r.content)
+            return r.status_code == (304 if conditional else 200)
+
+        result = await run_load(label, get_news, args.requests, args.concurrency)
+    result["body_mb"] = round(received / 2**20, 2)
+    return result
+
+
+async def main(args) -> None:
+    seed(args.news, args.body_size)
+    print_results([
+        await bench("200 no cache", cache.NullCache(), False, args),
+        await bench("304 no cache (version lookup)", cache.NullCache(), True, args),
+        await bench("200 memory cache", cache.MemoryCache(), False, args),
+        await bench("304 memory cache", cache.MemoryCache(), True, args),
+    ])
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--news", type=int, default=100)
+    parser.add_argument("--body-size", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
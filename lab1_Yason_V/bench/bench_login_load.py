@@ -0,0 +1,71 @@
+"""p99 логина и чтения новостей при одновременном шторме логинов.
+
+Логины идут через ограниченный пул хеширования (HASH_WORKERS, HASH_QUEUE_LIMIT);
+лишние получают 503 и не отнимают потоки у остальных запросов.
+
+    python -m bench.bench_login_load --logins 200 --login-concurrency 32 --reads 5000
+"""
+import argparse
+import asyncio
+
+from .common import use_temp_database, run_load, print_results
+
+use_temp_database()
+
+import httpx
+from sqlalchemy import insert
+
+from app import auth, models
+from app.db import Base, engine, async_engine
+from app.main import app
+
+
+def seed(news_count: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{
+            "name": "bench",
+            "email": "bench@example.com",
+            "hashed_password": auth.get_password_hash("benchpass"),
+        }])
+        conn.execute(insert(models.News), [
+            {"title": f"news {i}", "content": {"body": "x" * 500}, "author_id": 1}
+            for i in range(news_count)
+        ])
+
+
+async def main(args) -> None:
+    seed(args.news)
+    rejected = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login(i):
+            nonlocal rejected
+            r = await client.post("/auth/login", json={
+                "email": "bench@example.com", "password": "benchpass"
+            })
+            if r.status_code == 503:
+                rejected += 1
+            return r.status_code == 200
+
+        async def read_news(i):
+            r = await client.get(f"/news/{i % args.news + 1}")
+            return r.status_code == 200
+
+        results = await asyncio.gather(
+            run_load("POST /auth/login", login, args.logins, args.login_concurrency),
+            run_load("GET /news/{id} during logins", read_news, args.reads, args.read_concurrency),
+        )
+    results[0]["rejected_503"] = rejected
+    print_results(list(results) + [{"name": "hashing", **auth.hashing_stats()}])
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--news", type=int, default=100)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-concurrency", type=int, default=32)
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument("--read-concurrency", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""Накладные расходы метрик: MetricsMiddleware на запрос (ASGI-вызов без сети)
+и события SQLAlchemy на запрос к БД, плюс время рендера /metrics.
+Цель - меньше 50 мкс на HTTP-запрос.
+
+    python -m bench.bench_metrics_overhead --iterations 50000
+"""
+import argparse
+import asyncio
+import time
+
+from .common import print_results
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+from app import instrumentation, metrics
+
+api = FastAPI()
+
+
+@api.get("/news/{news_id}")
+async def endpoint(news_id: int):
+    return {"id": news_id}
+
+
+async def call(app, iterations: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        scope = {
+            "type": "http", "method": "GET", "path": f"/news/{i}", "raw_path": f"/news/{i}".encode(),
+            "headers": [], "query_string": b"", "root_path": "", "scheme": "http",
+            "server": ("bench", 80), "client": ("127.0.0.1", 1), "app": api,
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / iterations
+
+
+def queries(engine, iterations: int) -> float:
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            conn.execute(text("SELECT 1"))
+        return (time.perf_counter() - started) / iterations
+
+
+async def main(args) -> None:
+    # Прогрев: первые вызовы собирают middleware stack FastAPI
+    await call(api, 1000)
+    await call(instrumentation.MetricsMiddleware(api), 1000)
+    plain = min([await call(api, args.iterations) for _ in range(3)])
+    instrumented = min([await call(instrumentation.MetricsMiddleware(api), args.iterations) for _ in range(3)])
+
+    bare_engine = create_engine("sqlite://")
+    metered_engine = create_engine("sqlite://")
+    instrumentation.install_db_metrics(metered_engine, "bench")
+    bare = min(queries(bare_engine, args.iterations) for _ in range(3))
+    metered = min(queries(metered_engine, args.iterations) for _ in range(3))
+
+    metrics.REGISTRY.render()  # первый вызов импортирует модули сборщиков
+    started = time.perf_counter()
+    body = metrics.REGISTRY.render()
+    render_ms = (time.perf_counter() - started) * 1000
+
+    print_results([
+        {"name": "request without metrics", "us": round(plain * 1e6, 2)},
+        {"name": "request with MetricsMiddleware", "us": round(instrumented * 1e6, 2)},
+        {"name": "middleware overhead", "us": round((instrumented - plain) * 1e6, 2), "budget_us": 50},
+        {"name": "query without events", "us": round(bare * 1e6, 2)},
+        {"name": "query with events", "us": round(metered * 1e6, 2)},
+        {"name": "db event overhead per query", "us": round((metered - bare) * 1e6, 2)},
+        {"name": "render /metrics", "ms": round(render_ms, 2), "bytes": len(body)},
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=50000)
+    asyncio.run(main(parser.parse_args()))
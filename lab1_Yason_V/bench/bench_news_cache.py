@@ -0,0 +1,68 @@
+"""Пропускная способность GET /news/{id} без кэша и с read-through кэшем.
+
+    python -m bench.bench_news_cache --requests 5000 --hot 100
+    python -m bench.bench_news_cache --backend redis   # нужен REDIS_URL
+"""
+import argparse
+import asyncio
+import random
+
+from .common import use_temp_database, run_load, print_results
+
+use_temp_database()
+
+import httpx
+from sqlalchemy import insert
+
+from app import cache, models
+from app.db import Base, engine, async_engine
+from app.main import app
+
+
+def seed(news_count: int, body_size: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"name": "bench", "email": "bench@example.com"}])
+        conn.execute(insert(models.News), [
+            {"title": f"news {i}", "content": {"body": "x" * body_size}, "author_id": 1}
+            for i in range(news_count)
+        ])
+
+
+async def bench(label: str, backend, args) -> dict:
+    cache.news_cache.backend = backend
+    cache.news_cache.stats = cache.CacheStats()
+
+    rnd = random.Random(42)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def get_news(i):
+            r = await client.get(f"/news/{rnd.randint(1, args.hot)}")
+            return r.status_code == 200
+
+        result = await run_load(label, get_news, args.requests, args.concurrency)
+    stats = cache.news_cache.stats.snapshot()
+    result["hit_ratio"] = stats["hit_ratio"]
+    result["coalesced"] = stats["coalesced"]
+    return result
+
+
+async def main(args) -> None:
+    seed(args.news, args.body_size)
+    backend = cache.RedisCache() if args.backend == "redis" else cache.MemoryCache()
+    print_results([
+        await bench("no cache", cache.NullCache(), args),
+        await bench(f"{args.backend} cache", backend, args),
+    ])
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--news", type=int, default=1000)
+    parser.add_argument("--hot", type=int, default=100)
+    parser.add_argument("--body-size", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--backend", choices=["memory", "redis"], default="memory")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""Латентность запроса ленты GET /news/ на первой и глубокой странице: keyset
+против OFFSET. Оба варианта - через AsyncSession на одном движке и с одинаковой
+выборкой (limit + 1 ORM-объектов), разница только в способе пропуска строк.
+
+    python -m bench.bench_news_feed --rows 1000000 --page-size 100 --deep-page 10000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from .common import use_temp_database, percentile, print_results
+
+use_temp_database()
+
+from sqlalchemy import insert, select
+
+from app import crud_async, models
+from app.db import AsyncSessionLocal, Base, engine, async_engine, SessionLocal
+
+
+def seed(rows: int, batch: int = 20000) -> None:
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"name": f"author{i}", "email": f"a{i}@example.com"} for i in range(10)])
+        for offset in range(0, rows, batch):
+            conn.execute(insert(models.News), [
+                {
+                    "title": f"news {i}",
+                    "content": {"body": "lorem ipsum"},
+                    "published_at": start + timedelta(seconds=i),
+                    "author_id": i % 10 + 1,
+                }
+                for i in range(offset, min(offset + batch, rows))
+            ])
+
+
+def cursor_for_page(page: int, page_size: int):
+    # Курсор страницы N - последняя строка страницы N-1 (считаем один раз)
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(models.News.published_at, models.News.id)
+            .order_by(models.News.published_at.desc(), models.News.id.desc())
+            .offset((page - 1) * page_size - 1).limit(1)
+        ).one()
+        return row.published_at, row.id
+    finally:
+        db.close()
+
+
+async def offset_page(db, page: int, page_size: int) -> list:
+    # Та же выборка, что crud_async.list_news, но с OFFSET вместо курсора
+    result = await db.execute(
+        select(models.News)
+        .order_by(models.News.published_at.desc(), models.News.id.desc())
+        .offset((page - 1) * page_size).limit(page_size + 1)
+    )
+    return result.scalars().all()
+
+
+async def query_latency(fetch, repeats: int) -> list:
+    latencies = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            rows = await fetch(db)
+            latencies.append(time.perf_counter() - started)
+            assert rows, "empty page"
+            # Не держим объекты в identity map между повторами
+            db.expunge_all()
+    return latencies
+
+
+def report(name: str, latencies: list) -> dict:
+    return {
+        "name": name,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def main(args) -> None:
+    started = time.perf_counter()
+    seed(args.rows)
+    print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    deep_cursor = cursor_for_page(args.deep_page, args.page_size)
+    size = args.page_size
+    print_results([
+        report("keyset page 1", await query_latency(lambda db: crud_async.list_news(db, size), args.repeats)),
+        report(
+            f"keyset page {args.deep_page}",
+            await query_latency(lambda db: crud_async.list_news(db, size, deep_cursor), args.repeats),
+        ),
+        report("offset page 1", await query_latency(lambda db: offset_page(db, 1, size), args.repeats)),
+        report(
+            f"offset page {args.deep_page}",
+            await query_latency(lambda db: offset_page(db, args.deep_page, size), args.repeats),
+        ),
+    ])
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--deep-page", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
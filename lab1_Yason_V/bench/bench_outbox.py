@@ -0,0 +1,214 @@
+"""Transactional outbox: задержка записи новости, пропускная способность relay
+и доставка при отказах брокера.
+
+Брокер - заглушка в памяти (FlakyBroker): задает задержку публикации, долю
+ошибок, "потерянные подтверждения" (сообщение принято, но relay видит ошибку)
+и падения relay между публикацией и коммитом. Полученные сообщения затем
+обрабатывает настоящая задача send_news_notification (eager), дубликаты
+должна отсечь отметка processed_events.
+
+    python -m bench.bench_outbox --writes 500 --events 20000 --fail-events 2000
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from .common import percentile, print_results, use_temp_database
+
+use_temp_database("outbox.db")
+
+from sqlalchemy import delete, func, insert, select
+
+from app import crud_async, delivery, models, outbox, schemas
+# Регистрация задач Celery: celery_app.tasks[...] ниже ищет их по имени,
+# а imports из конфигурации подгружает только воркер
+from app import tasks  # noqa: F401
+from app.celery_app import celery_app
+from app.db import AsyncSessionLocal, Base, async_engine, engine
+
+
+class BrokerDown(Exception):
+    pass
+
+
+class RelayCrash(BaseException):
+    # BaseException: relay не перехватывает его как ошибку брокера -
+    # транзакция с отметками dispatched_at не коммитится, как при падении процесса
+    pass
+
+
+class FlakyBroker:
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0, lost_ack_rate: float = 0.0,
+                 crash_rate: float = 0.0, seed: int = 1):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.lost_ack_rate = lost_ack_rate
+        self.crash_rate = crash_rate
+        self.rnd = random.Random(seed)
+        self.messages = []
+
+    def send(self, event) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        roll = self.rnd.random()
+        if roll < self.fail_rate:
+            raise BrokerDown("broker unavailable")
+        for task_name, make_args in outbox.ROUTES[event.topic]:
+            self.messages.append((task_name, make_args(event.payload), event.id))
+        roll -= self.fail_rate
+        if roll < self.lost_ack_rate:
+            raise BrokerDown("ack lost")
+        if roll - self.lost_ack_rate < self.crash_rate:
+            raise RelayCrash()
+
+
+async def bench_writes(writes: int, broker_latency: float, broker_timeout: float) -> list:
+    news_in = schemas.NewsCreate(title="outbox bench", content={"body": "lorem ipsum"})
+    broker = FlakyBroker(latency=broker_latency)
+    down = FlakyBroker(latency=broker_timeout, fail_rate=1.0)
+    results = []
+    for name, publish in (
+        ("outbox (single commit)", None),
+        (f"inline publish, broker {broker_latency * 1000:.0f} ms", broker.send),
+        (f"inline publish, broker down ({broker_timeout * 1000:.0f} ms timeout)", down.send),
+    ):
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(writes):
+            began = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                news = await crud_async.create_news(db, news_in, author_id=1)
+                if publish is not None:
+                    # Синхронный .delay() в обработчике запроса - так бы выглядел вызов без outbox
+                    try:
+                        publish(models.OutboxEvent(id=news.id, topic="news.created", payload={"news_id": news.id}))
+                    except BrokerDown:
+                        errors += 1
+            latencies.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - started
+        results.append({
+            "name": f"create_news: {name}",
+            "writes": writes,
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "rps": round(writes / elapsed, 1),
+            "failed_requests": errors,
+        })
+    return results
+
+
+def reset_outbox(events: int, news_ids: list) -> None:
+    with engine.begin() as conn:
+        conn.execute(delete(models.OutboxEvent))
+        conn.execute(delete(models.ProcessedEvent))
+        for offset in range(0, events, 10000):
+            conn.execute(insert(models.OutboxEvent), [
+                {"topic": "news.created", "payload": {"news_id": news_ids[i % len(news_ids)]}}
+                for i in range(offset, min(offset + 10000, events))
+            ])
+
+
+def pending_count() -> int:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(models.OutboxEvent).where(models.OutboxEvent.dispatched_at.is_(None))
+        ).scalar()
+
+
+def bench_relay(events: int, news_ids: list, publish_latency: float) -> list:
+    results = []
+    for batch_size in (1, 100, 500):
+        reset_outbox(events, news_ids)
+        broker = FlakyBroker(latency=publish_latency)
+        started = time.perf_counter()
+        relayed = outbox.relay_pending(broker.send, batch_size=batch_size, max_batches=events)
+        elapsed = time.perf_counter() - started
+        results.append({
+            "name": f"relay batch={batch_size}",
+            "events": relayed,
+            "events_per_s": round(relayed / elapsed),
+            "seconds": round(elapsed, 2),
+            "left_pending": pending_count(),
+        })
+    return results
+
+
+def bench_failures(events: int, news_ids: list, users: int, fail_rate: float, lost_ack_rate: float,
+                   crash_rate: float) -> dict:
+    reset_outbox(events, news_ids)
+    # Сотни ожидаемых предупреждений relay об ошибках публикации
+    logging.getLogger("app.outbox").setLevel(logging.ERROR)
+    broker = FlakyBroker(fail_rate=fail_rate, lost_ack_rate=lost_ack_rate, crash_rate=crash_rate, seed=7)
+    runs = crashes = 0
+    started = time.perf_counter()
+    # Relay перезапускается, как это сделал бы beat, пока outbox не опустеет
+    while pending_count():
+        runs += 1
+        try:
+            outbox.relay_pending(broker.send, batch_size=100)
+        except RelayCrash:
+            crashes += 1
+    relay_seconds = time.perf_counter() - started
+
+    # Воркер: каждое принятое брокером сообщение, включая дубликаты
+    celery_app.conf.update(task_always_eager=True, result_backend="cache+memory://")
+    backend = delivery._backend = delivery.MemoryBackend()
+    started = time.perf_counter()
+    for task_name, args, event_id in broker.messages:
+        celery_app.tasks[task_name].apply(args=args, kwargs={"event_id": event_id})
+    consume_seconds = time.perf_counter() - started
+
+    with engine.connect() as conn:
+        processed = conn.execute(select(func.count()).select_from(models.ProcessedEvent)).scalar()
+    # Сообщение - пара (получатель, событие): у news.created их несколько
+    unique = len({(task_name, event_id) for task_name, _, event_id in broker.messages})
+    expected = events * len(outbox.ROUTES["news.created"])
+    return {
+        "name": "failure injection",
+        "events": events,
+        "relay_runs": runs,
+        "relay_crashes": crashes,
+        "broker_messages": len(broker.messages),
+        "duplicates": len(broker.messages) - unique,
+        "lost": expected - unique,
+        "processed": processed,
+        "expected_processed": expected,
+        "notifications": len(backend.outbox),
+        "expected_notifications": events * users,
+        "relay_s": round(relay_seconds, 2),
+        "consume_s": round(consume_seconds, 2),
+    }
+
+
+async def main(args) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"name": f"user{i}", "email": f"user{i}@example.com", "is_author": True} for i in range(args.users)
+        ])
+    results = await bench_writes(args.writes, args.broker_latency_ms / 1000, args.broker_timeout_ms / 1000)
+    await async_engine.dispose()
+    with engine.connect() as conn:
+        news_ids = [row[0] for row in conn.execute(select(models.News.id))]
+    results += bench_relay(args.events, news_ids, args.publish_latency_ms / 1000)
+    results.append(bench_failures(
+        args.fail_events, news_ids, args.users, args.fail_rate, args.lost_ack_rate, args.crash_rate
+    ))
+    print_results(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--fail-events", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--broker-latency-ms", type=float, default=2.0)
+    parser.add_argument("--broker-timeout-ms", type=float, default=100.0)
+    parser.add_argument("--publish-latency-ms", type=float, default=0.05)
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    parser.add_argument("--lost-ack-rate", type=float, default=0.05)
+    parser.add_argument("--crash-rate", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,108 @@
+"""Refresh-сессии: пропускная способность ротации и рост таблицы за неделю.
+
+1. Старая ротация (SELECT + SELECT/DELETE + INSERT, три commit) против
+   rotate_refresh_session (DELETE ... RETURNING + INSERT, один commit).
+2. Симуляция недели: пользователи логинятся, сессии живут --ttl-hours,
+   sweeper purge_expired_refresh_sessions запускается раз в час.
+
+    python -m bench.bench_refresh --rotations 2000 --users 2000 --logins-per-day 3
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from .common import use_temp_database, print_results
+
+use_temp_database()
+
+from sqlalchemy import func, insert, select
+
+from app import auth, crud, crud_async, models
+from app.db import Base, engine, async_engine, AsyncSessionLocal, SessionLocal
+
+
+def seed_sessions(count: int) -> list:
+    tokens = [auth.create_refresh_token() for _ in range(count)]
+    expires_at = datetime.utcnow() + timedelta(days=7)
+    with engine.begin() as conn:
+        conn.execute(insert(models.RefreshSession), [
+            {"user_id": 1, "token_hash": auth.hash_token(t), "expires_at": expires_at}
+            for t in tokens
+        ])
+    return tokens
+
+
+async def legacy_rotate(db, token: str) -> None:
+    session = await crud_async.get_refresh_session(db, token)
+    old = await crud_async.get_refresh_session(db, token)
+    await db.delete(old)
+    await db.commit()
+    new = await crud_async.create_refresh_session(db, session.user_id, auth.create_refresh_token())
+    await db.refresh(new)
+
+
+async def new_rotate(db, token: str) -> None:
+    await crud_async.rotate_refresh_session(db, token, auth.create_refresh_token())
+
+
+async def rotations(name: str, rotate, tokens: list) -> dict:
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        for token in tokens:
+            await rotate(db, token)
+    elapsed = time.perf_counter() - started
+    return {"name": name, "rotations": len(tokens), "per_sec": round(len(tokens) / elapsed, 1)}
+
+
+def simulate_week(users: int, logins_per_day: int, ttl_hours: int, sweep: bool) -> dict:
+    with engine.begin() as conn:
+        conn.execute(models.RefreshSession.__table__.delete())
+    start = datetime.utcnow()
+    rows_by_day = []
+    db = SessionLocal()
+    try:
+        for hour in range(7 * 24):
+            now = start + timedelta(hours=hour)
+            logins = users * logins_per_day // 24
+            with engine.begin() as conn:
+                conn.execute(insert(models.RefreshSession), [
+                    {
+                        "user_id": 1,
+                        "token_hash": auth.hash_token(f"{sweep}-{hour}-{i}"),
+                        "created_at": now,
+                        "expires_at": now + timedelta(hours=ttl_hours),
+                    }
+                    for i in range(logins)
+                ])
+            if sweep:
+                crud.purge_expired_refresh_sessions(db, now=now)
+            if hour % 24 == 23:
+                rows_by_day.append(db.execute(select(func.count()).select_from(models.RefreshSession)).scalar())
+    finally:
+        db.close()
+    return {"name": f"week {'with' if sweep else 'without'} sweeper", "rows_by_day": rows_by_day}
+
+
+async def main(args) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"name": "bench", "email": "bench@example.com"}])
+
+    results = [
+        await rotations("legacy rotate (3 commits)", legacy_rotate, seed_sessions(args.rotations)),
+        await rotations("delete-returning rotate (1 commit)", new_rotate, seed_sessions(args.rotations)),
+        simulate_week(args.users, args.logins_per_day, args.ttl_hours, sweep=False),
+        simulate_week(args.users, args.logins_per_day, args.ttl_hours, sweep=True),
+    ]
+    print_results(results)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rotations", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--logins-per-day", type=int, default=3)
+    parser.add_argument("--ttl-hours", type=int, default=24)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,177 @@
+"""Чтение с реплик: доля чтений, ушедших на реплики, read-your-writes и
+переключение при отказе реплики.
+
+Реплики - две копии SQLite-файла, снятые после наполнения и открытые только на
+чтение (mode=ro). Новые записи на них не попадают, поэтому отставание видно
+явно: клиент, который только что писал, свою новость видит (primary), другой
+клиент - нет (реплика). Отказ - файл реплики убран и пул сброшен.
+
+    python -m bench.bench_replicas --requests 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import time
+
+from .common import print_results, run_load, use_temp_database
+
+DATABASE_URL = use_temp_database("primary.db")
+PRIMARY_PATH = DATABASE_URL.split("///", 1)[1]
+REPLICA_PATHS = [os.path.join(os.path.dirname(PRIMARY_PATH), f"replica{n}.db") for n in range(2)]
+os.environ.setdefault(
+    "DATABASE_REPLICA_URLS", ",".join(f"sqlite:///file:{path}?mode=ro&uri=true" for path in REPLICA_PATHS)
+)
+os.environ.setdefault("DB_READ_YOUR_WRITES_SECONDS", "1")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+
+import httpx
+from sqlalchemy import insert, update
+
+from app import instrumentation, models
+from app.db import Base, async_engine, engine, replica_engines
+from app.main import app
+from app.replicas import DB_READ_YOUR_WRITES_SECONDS, replicas
+
+ENGINES = ["async"] + [f"replica{n}" for n in range(len(replica_engines))]
+
+
+def seed(news_count: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.News), [
+            {"title": f"news {i}", "content": {"body": "lorem ipsum " * 20}, "author_id": 1}
+            for i in range(news_count)
+        ])
+
+
+def snapshot_replicas() -> None:
+    # Реплика = копия primary на этот момент; журнал DELETE - файл читается с mode=ro без -wal/-shm
+    source = sqlite3.connect(PRIMARY_PATH)
+    for path in REPLICA_PATHS:
+        target = sqlite3.connect(path)
+        source.backup(target)
+        target.execute("PRAGMA journal_mode=DELETE")
+        target.close()
+    source.close()
+
+
+def engine_queries() -> dict:
+    return {name: instrumentation.db_query_duration.labels(name).snapshot()["count"] for name in ENGINES}
+
+
+async def phase(name: str, run) -> dict:
+    sessions = replicas.snapshot()["read_sessions"]
+    queries = engine_queries()
+    result = await run
+    after = replicas.snapshot()
+    replica_hits = after["read_sessions"]["replica"] - sessions["replica"]
+    primary_hits = after["read_sessions"]["primary"] - sessions["primary"]
+    total = replica_hits + primary_hits
+    result.update(
+        name=name,
+        replica_hit_ratio=round(replica_hits / total, 3) if total else 0.0,
+        queries={engine: count - queries[engine] for engine, count in engine_queries().items()},
+        up=[r["name"] for r in after["replicas"] if r["up"]],
+    )
+    return result
+
+
+async def read_mix(client, headers: dict, news_count: int, args, label: str) -> dict:
+    rnd = random.Random(7)
+    paths = ["/news/?limit=20", "/users/me", "/auth/sessions", "/feed/"]
+
+    async def request(i):
+        roll = rnd.random()
+        if roll < 0.5:
+            path = f"/news/{rnd.randint(1, news_count)}"
+        elif roll < 0.6:
+            path = f"/news/{rnd.randint(1, news_count)}/comments"
+        else:
+            path = rnd.choice(paths)
+        r = await client.get(path, headers=headers)
+        return r.status_code == 200
+
+    return await run_load(label, request, args.requests, args.concurrency)
+
+
+async def main(args) -> None:
+    seed(args.news)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as writer:
+        user = {"name": "bench", "email": "replica-bench@example.com", "password": "secret123"}
+        (await writer.post("/auth/register", json=user)).raise_for_status()
+        with engine.begin() as conn:
+            conn.execute(update(models.User).values(is_author=True))
+        token = (await writer.post("/auth/login", json=user)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        snapshot_replicas()
+        # Окно read-your-writes после регистрации и логина закончилось
+        await asyncio.sleep(DB_READ_YOUR_WRITES_SECONDS)
+        results = []
+
+        # Читатели без cookie: все сессии чтения - на реплики
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as reader:
+            results.append(await phase("reads, 2 replicas", read_mix(reader, headers, args.news, args, "reads")))
+
+            # Новость пишет writer; реплики ее не получат
+            started = time.perf_counter()
+            created = (await writer.post("/news/", json={"title": "fresh", "content": {"body": "x"}}, headers=headers)).json()
+            own = f"/news/?author_id=1&date_from={created['published_at']}"
+            writer_sees = any(n["id"] == created["id"] for n in (await writer.get(own, headers=headers)).json()["items"])
+            # Другой клиент - без cookie и без токена автора
+            reader_sees = any(n["id"] == created["id"] for n in (await reader.get(own)).json()["items"])
+            writer_detail = (await writer.get(f"/news/{created['id']}")).status_code
+            # Тот же автор, но без cookie (только Bearer) - отметка по user_id
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as bearer_only:
+                bearer_sees = any(
+                    n["id"] == created["id"] for n in (await bearer_only.get(own, headers=headers)).json()["items"]
+                )
+            await asyncio.sleep(DB_READ_YOUR_WRITES_SECONDS + 0.1)
+            writer_after_window = any(
+                n["id"] == created["id"] for n in (await writer.get(own, headers=headers)).json()["items"]
+            )
+            results.append({
+                "name": "read-your-writes",
+                "window_s": DB_READ_YOUR_WRITES_SECONDS,
+                "writer_sees_own_news": writer_sees,
+                "writer_detail_status": writer_detail,
+                "bearer_only_writer_sees_own_news": bearer_sees,
+                # Ожидаемо False: реплики-копии не догоняют primary
+                "other_client_sees_news": reader_sees,
+                "writer_sees_after_window": writer_after_window,
+                "seconds": round(time.perf_counter() - started, 2),
+            })
+
+            # Отказ реплики: файл пропал, старые соединения закрыты
+            os.rename(REPLICA_PATHS[0], REPLICA_PATHS[0] + ".off")
+            await replica_engines[0].dispose()
+            results.append(await phase("replica0 down", read_mix(reader, headers, args.news, args, "replica0 down")))
+            os.rename(REPLICA_PATHS[1], REPLICA_PATHS[1] + ".off")
+            await replica_engines[1].dispose()
+            results.append(await phase("all replicas down", read_mix(reader, headers, args.news, args, "all down")))
+
+            # Реплики вернулись: после DB_REPLICA_RETRY_SECONDS снова в ротации
+            for path in REPLICA_PATHS:
+                os.rename(path + ".off", path)
+            # После dispose() первый connect пула (SQLAlchemy 2.0.23) идет под
+            # потоковой блокировкой: параллельные первые подключения зависают
+            for replica in replica_engines:
+                async with replica.connect():
+                    pass
+            replicas.down_until = [0.0] * len(replicas.engines)
+            results.append(await phase("replicas back", read_mix(reader, headers, args.news, args, "back")))
+
+    await async_engine.dispose()
+    for replica in replica_engines:
+        await replica.dispose()
+    print_results(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--news", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
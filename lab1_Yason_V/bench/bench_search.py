@@ -0,0 +1,109 @@
+"""Поиск по новостям: FTS5 (bm25 + snippet) против LIKE '%слово%' по title/search_text.
+
+Seed через core insert - search_text задаем явно (ORM-событие не срабатывает),
+FTS-индекс наполняют триггеры.
+
+    python -m bench.bench_search --rows 1000000 --repeats 20
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from .common import use_temp_database, percentile, print_results
+
+use_temp_database()
+
+from sqlalchemy import insert, or_, select
+
+from app import crud_async, models, search
+from app.db import Base, engine, async_engine, AsyncSessionLocal, SessionLocal
+
+WORDS = [
+    "погода", "москва", "выборы", "футбол", "экономика", "курс", "рубль", "наука",
+    "космос", "технологии", "искусство", "театр", "кино", "музыка", "школа", "университет",
+    "транспорт", "метро", "дороги", "здоровье", "спорт", "хоккей", "олимпиада", "бизнес",
+]
+
+
+def seed(rows: int, batch: int = 20000) -> None:
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(42)
+    start = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"name": "author", "email": "a@example.com"}])
+        for offset in range(0, rows, batch):
+            chunk = []
+            for i in range(offset, min(offset + batch, rows)):
+                text = " ".join(rnd.choices(WORDS, k=30))
+                if i % 1000 == 0:
+                    # Редкое слово - типичный поисковый запрос, LIKE не может остановиться рано
+                    text += " землетрясение"
+                content = {"blocks": [{"text": text}]}
+                chunk.append({
+                    "title": " ".join(rnd.choices(WORDS, k=4)) + f" {i}",
+                    "content": content,
+                    "search_text": search.extract_text(content),
+                    "published_at": start + timedelta(seconds=i),
+                    "author_id": 1,
+                })
+            conn.execute(insert(models.News), chunk)
+
+
+def like_latency(terms: list, limit: int, repeats: int) -> list:
+    db = SessionLocal()
+    latencies = []
+    try:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            query = select(models.News.id, models.News.title)
+            for term in terms:
+                pattern = f"%{term}%"
+                query = query.where(or_(models.News.title.like(pattern), models.News.search_text.like(pattern)))
+            db.execute(query.order_by(models.News.published_at.desc()).limit(limit)).all()
+            latencies.append(time.perf_counter() - started)
+    finally:
+        db.close()
+    return latencies
+
+
+async def fts_latency(query: str, limit: int, repeats: int) -> list:
+    latencies = []
+    async with AsyncSessionLocal() as db:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            await crud_async.search_news(db, query, limit)
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def row(name: str, latencies: list) -> dict:
+    return {
+        "name": name,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def main(args) -> None:
+    started = time.perf_counter()
+    seed(args.rows)
+    print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    results = []
+    # Частые слова (совпадает большая часть строк) и редкое
+    for terms in (["космос"], ["футбол", "москва"], ["землетрясение"]):
+        query = " ".join(terms)
+        results.append(row(f"LIKE '{query}'", like_latency(terms, args.limit, args.repeats)))
+        results.append(row(f"FTS5 '{query}'", await fts_latency(query, args.limit, args.repeats)))
+    print_results(results)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
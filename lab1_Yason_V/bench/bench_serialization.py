@@ -0,0 +1,80 @@
+"""Стоимость сериализации страницы новостей по размеру content:
+путь FastAPI (response_model -> serialize_response -> JSONResponse/ORJSONResponse)
+против прямого ORM -> dict -> orjson (serialization.json_response).
+
+    python -m bench.bench_serialization --items 20 100 --content-kb 0.1 1 10 100
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from .common import print_results
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app import models, schemas, serialization
+from app.serialization import ORJSONResponse
+
+PAGE_FIELD = create_response_field(name="NewsPage", type_=schemas.NewsPage)
+
+
+def make_page(items: int, content_kb: float) -> dict:
+    words = max(1, int(content_kb * 1024 / 40))
+    content = {
+        "blocks": [{"type": "paragraph", "text": f"слово {i} lorem ipsum dolor", "n": i} for i in range(words)]
+    }
+    news = [
+        models.News(
+            id=i, title=f"news {i}", content=content, cover=None,
+            published_at=datetime(2024, 1, 1), author_id=1, comment_count=i,
+        )
+        for i in range(items)
+    ]
+    return {"items": news, "next_cursor": None}
+
+
+async def via_response_model(page: dict, response_class) -> bytes:
+    content = await serialize_response(field=PAGE_FIELD, response_content=page)
+    return response_class(content).body
+
+
+async def direct(page: dict, response_class) -> bytes:
+    return serialization.json_response({
+        "items": [serialization.news_dict(n) for n in page["items"]],
+        "next_cursor": page["next_cursor"],
+    }).body
+
+
+async def measure(name: str, render, page: dict, response_class, repeats: int) -> dict:
+    body = await render(page, response_class)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        await render(page, response_class)
+    elapsed = time.perf_counter() - started
+    return {"name": name, "kb": round(len(body) / 1024, 1), "us_per_page": round(elapsed / repeats * 1e6, 1)}
+
+
+async def main(args) -> None:
+    results = []
+    for items in args.items:
+        for content_kb in args.content_kb:
+            page = make_page(items, content_kb)
+            # Большие страницы меряем реже, чтобы прогон занимал секунды
+            repeats = max(5, int(args.budget_kb / max(items * content_kb, 1)))
+            label = f"{items} items x {content_kb}KB"
+            results.append(await measure(f"{label} response_model+json", via_response_model, page, JSONResponse, repeats))
+            if ORJSONResponse is not None:
+                results.append(await measure(f"{label} response_model+orjson", via_response_model, page, ORJSONResponse, repeats))
+            results.append(await measure(f"{label} direct {serialization.JSON_BACKEND}", direct, page, None, repeats))
+    print_results(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--content-kb", type=float, nargs="+", default=[0.1, 1, 10, 100])
+    parser.add_argument("--budget-kb", type=float, default=200000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+"""Время старта процессов: импорт app.main (воркер API) и app.tasks (воркер
+Celery) по python -X importtime, медиана по нескольким свежим интерпретаторам.
+
+Кроме бюджета времени проверяется, что воркер Celery не импортирует пакеты
+веб-слоя, а импорт app.main не выполняет DDL. Код возврата 1 - бюджет
+превышен, можно запускать в CI.
+
+    python -m bench.bench_startup --runs 5 --api-budget-ms 1500 --worker-budget-ms 1000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .common import print_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "api": "app.main",
+    "worker": "app.tasks",
+}
+# Воркеру Celery они не нужны: появились в импорте - кто-то потянул веб-слой
+WORKER_FORBIDDEN = ("fastapi", "fastapi_sso", "httpx", "dotenv")
+
+
+def parse_importtime(stderr: str) -> dict:
+    # "import time: self [us] | cumulative | imported package" -> {модуль: cumulative мкс}
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def measure(module: str, database_url: str) -> tuple:
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONDONTWRITEBYTECODE="1")
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr), wall
+
+
+def heaviest_packages(modules: dict, count: int = 5) -> dict:
+    # Самый тяжелый модуль каждого стороннего пакета - чтобы видеть, кто дорожает
+    packages = {}
+    for name, cumulative in modules.items():
+        root = name.split(".")[0]
+        if root != "app":
+            packages[root] = max(packages.get(root, 0), cumulative)
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:count]
+    return {name: round(us / 1000) for name, us in top}
+
+
+def tables(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+
+def run(name: str, module: str, runs: int, budget_ms: float) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="lab1-bench-"), "startup.db")
+    samples, walls, modules = [], [], {}
+    for _ in range(runs):
+        modules, wall = measure(module, f"sqlite:///{path}")
+        samples.append(modules[module] / 1000)
+        walls.append(wall * 1000)
+    import_ms = statistics.median(samples)
+    problems = []
+    if import_ms > budget_ms:
+        problems.append(f"import {import_ms:.0f} ms > budget {budget_ms:.0f} ms")
+    if name == "worker":
+        problems += [f"imports {p}" for p in WORKER_FORBIDDEN if p in modules]
+    if tables(path):
+        problems.append(f"DDL on import: {', '.join(tables(path))}")
+    return {
+        "name": f"{name}: import {module}",
+        "runs": runs,
+        "import_ms_median": round(import_ms),
+        "import_ms_max": round(max(samples)),
+        "process_ms_median": round(statistics.median(walls)),
+        "budget_ms": budget_ms,
+        "modules": len(modules),
+        "heaviest_ms": heaviest_packages(modules),
+        "ok": not problems,
+        "problems": problems,
+    }
+
+
+def main(args) -> int:
+    budgets = {"api": args.api_budget_ms, "worker": args.worker_budget_ms}
+    results = [run(name, module, args.runs, budgets[name]) for name, module in TARGETS.items()]
+    print_results(results)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--api-budget-ms", type=float, default=1500)
+    parser.add_argument("--worker-budget-ms", type=float, default=1000)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,202 @@
+"""Подписчики /stream: память на простаивающего подписчика, время доставки
+события всем и отключение медленных потребителей.
+
+Часть in-process: N подписок брокера, каждую читает генератор SSE из
+app.api.stream (без сокетов). Часть HTTP: uvicorn отдельным процессом, N
+настоящих SSE-соединений, память процесса сервера (VmRSS) до и после и время,
+за которое созданная через API новость дошла до всех. Нужен ulimit -n > N.
+
+    python -m bench.bench_stream --subscribers 10000 --events 20
+    python -m bench.bench_stream --subscribers 10000 --skip-http
+"""
+import argparse
+import asyncio
+import gc
+import os
+import time
+import tracemalloc
+
+from .common import percentile, print_results, use_temp_database
+
+use_temp_database("stream.db")
+
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+os.environ.setdefault("EVENTS_MAX_SUBSCRIBERS", "100000")
+
+from sqlalchemy import update
+
+from app import events, models
+from app.api import stream
+from app.db import Base, engine
+from .loadtest import free_port, start_server, wait_ready
+
+
+async def bench_in_process(subscribers: int, event_count: int, slow_share: float) -> list:
+    broadcaster = events.broadcaster
+    received = [0] * subscribers
+    done = asyncio.Event()
+    expected = 0
+
+    async def consume(i, subscription):
+        nonlocal expected
+        async for chunk in stream.sse_events(subscription):
+            if chunk.startswith(b"event:"):
+                received[i] += 1
+                expected -= 1
+                if expected == 0:
+                    done.set()
+
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    subs = [broadcaster.subscribe(["news"]) for _ in range(subscribers)]
+    tasks = [asyncio.ensure_future(consume(i, s)) for i, s in enumerate(subs)]
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    idle, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Время, за которое одно событие доходит до всех подписчиков
+    latencies = []
+    for n in range(event_count):
+        expected = subscribers
+        done.clear()
+        started = time.perf_counter()
+        await broadcaster.publish("news", "news.created", {"id": n, "title": "news"})
+        await done.wait()
+        latencies.append(time.perf_counter() - started)
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Медленные: часть подписчиков не читает вовсе. Их очереди упираются в
+    # EVENTS_QUEUE_SIZE, затем подписчик отключается и память освобождается
+    slow = int(subscribers * slow_share)
+    slow_subs = [broadcaster.subscribe(["news"]) for _ in range(slow)]
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for n in range(events.EVENTS_QUEUE_SIZE * 3):
+        await broadcaster.publish("news", "news.created", {"id": n, "title": "news"})
+    queued = sum(len(s) for s in slow_subs)
+    del slow_subs
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return [
+        {
+            "name": f"in-process idle subscribers x{subscribers}",
+            "bytes_per_subscriber": round((idle - base) / subscribers),
+            "total_mb": round((idle - base) / 2 ** 20, 1),
+        },
+        {
+            "name": f"fan-out to {subscribers}",
+            "events": event_count,
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+            "deliveries_per_s": round(subscribers * event_count / sum(latencies)),
+        },
+        {
+            "name": f"slow consumers x{slow}",
+            "events_published": events.EVENTS_QUEUE_SIZE * 3,
+            "dropped": slow - broadcaster.count,
+            "queued_after": queued,
+            "peak_mb": round((peak - before) / 2 ** 20, 1),
+            "retained_mb": round((after - before) / 2 ** 20, 2),
+        },
+    ]
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def open_sse(port: int):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /stream/ HTTP/1.1\r\nHost: bench\r\n\r\n")
+    await writer.drain()
+    # Заголовки и кадр retry - соединение подписано
+    await reader.readuntil(b"retry: 3000\n\n")
+    return reader, writer
+
+
+async def wait_event(reader) -> float:
+    await reader.readuntil(b"event: news.created")
+    return time.perf_counter()
+
+
+async def bench_http(subscribers: int) -> list:
+    import httpx
+
+    Base.metadata.create_all(bind=engine)
+    port = free_port()
+    process = start_server(port, 1)
+    url = f"http://127.0.0.1:{port}"
+    connections = []
+    try:
+        await wait_ready(url, process)
+        async with httpx.AsyncClient(base_url=url) as client:
+            user = {"name": "bench", "email": "stream-bench@example.com", "password": "secret123"}
+            await client.post("/auth/register", json=user)
+            with engine.begin() as conn:
+                conn.execute(update(models.User).values(is_author=True))
+            token = (await client.post("/auth/login", json=user)).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            base = rss_kb(process.pid)
+
+            started = time.perf_counter()
+            for offset in range(0, subscribers, 500):
+                connections += await asyncio.gather(*(open_sse(port) for _ in range(min(500, subscribers - offset))))
+            connect_time = time.perf_counter() - started
+            await asyncio.sleep(1)
+            idle = rss_kb(process.pid)
+
+            waiters = [asyncio.ensure_future(wait_event(reader)) for reader, _ in connections]
+            published = time.perf_counter()
+            response = await client.post("/news/", json={"title": "stream", "content": {"body": "x"}}, headers=headers)
+            response.raise_for_status()
+            arrivals = await asyncio.gather(*waiters)
+    finally:
+        for _, writer in connections:
+            writer.close()
+        # Сокеты закрываются на следующих итерациях цикла - до terminate
+        await asyncio.gather(*(writer.wait_closed() for _, writer in connections), return_exceptions=True)
+        process.terminate()
+        process.wait(timeout=10)
+
+    delays = [t - published for t in arrivals]
+    return [
+        {
+            "name": f"http idle SSE connections x{subscribers}",
+            "connect_s": round(connect_time, 1),
+            "server_rss_base_mb": round(base / 1024, 1),
+            "server_rss_idle_mb": round(idle / 1024, 1),
+            "kb_per_connection": round((idle - base) / subscribers, 1),
+        },
+        {
+            "name": f"http event to {subscribers} (incl. POST /news/)",
+            "p50_ms": round(percentile(delays, 0.5) * 1000, 1),
+            "last_ms": round(max(delays) * 1000, 1),
+        },
+    ]
+
+
+async def main(args) -> None:
+    results = await bench_in_process(args.subscribers, args.events, args.slow_share)
+    if not args.skip_http:
+        results += await bench_http(args.subscribers)
+    print_results(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--slow-share", type=float, default=0.1)
+    parser.add_argument("--skip-http", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,108 @@
+"""Память и время send_weekly_digest: старая версия (все новости в память) против новой.
+
+Задачи выполняются в eager-режиме Celery, логи пишутся во временный каталог.
+
+    python -m bench.bench_weekly_digest --news 1000000 --users 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from .common import use_temp_database, print_results
+
+use_temp_database()
+
+from sqlalchemy import insert
+
+from app import crud, delivery, models, tasks
+from app.celery_app import celery_app
+from app.db import Base, engine, SessionLocal
+
+
+def seed(news_count: int, users_count: int, batch: int = 20000) -> None:
+    Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for offset in range(0, users_count, batch):
+            conn.execute(insert(models.User), [
+                {"name": f"user{i}", "email": f"user{i}@example.com"}
+                for i in range(offset, min(offset + batch, users_count))
+            ])
+        # Новости равномерно за два года - в последнюю неделю попадает ~1%
+        step = timedelta(days=730) / max(news_count, 1)
+        for offset in range(0, news_count, batch):
+            conn.execute(insert(models.News), [
+                {
+                    "title": f"news {i}",
+                    "content": {"body": "lorem ipsum"},
+                    "published_at": now - step * i,
+                    "author_id": 1,
+                }
+                for i in range(offset, min(offset + batch, news_count))
+            ])
+
+
+def legacy_weekly_digest(log_path: str) -> None:
+    # Исходная реализация: вся таблица news в память, фильтр в Python, 100 получателей
+    db = SessionLocal()
+    try:
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        all_news = db.query(models.News).all()
+        recent_news = [n for n in all_news if n.published_at >= week_ago]
+        users = crud.list_users(db)
+        with open(log_path, 'a') as f:
+            timestamp = datetime.now().isoformat()
+            for user in users:
+                f.write(f"{timestamp} - WEEKLY_DIGEST - User: {user.email}, News count: {len(recent_news)}\n")
+    finally:
+        db.close()
+
+
+def measure(name: str, func) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"name": name, "seconds": round(elapsed, 2), "peak_mb": round(peak / 2 ** 20, 1)}
+
+
+def count_lines(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+def main(args) -> None:
+    started = time.perf_counter()
+    seed(args.news, args.users)
+    print(f"seeded {args.news} news / {args.users} users in {time.perf_counter() - started:.1f}s")
+
+    celery_app.conf.update(task_always_eager=True, result_backend="cache+memory://")
+    log_dir = tempfile.mkdtemp(prefix="lab1-digest-")
+    digests_log = os.path.join(log_dir, "digests.log")
+    delivery._backend = delivery.FileBackend(paths={"WEEKLY_DIGEST": digests_log})
+    legacy_log = os.path.join(log_dir, "legacy.log")
+
+    results = []
+    if not args.skip_legacy:
+        result = measure("legacy (all news in memory)", lambda: legacy_weekly_digest(legacy_log))
+        result["recipients"] = count_lines(legacy_log)
+        results.append(result)
+    result = measure("sql filter + chunked fan-out", lambda: tasks.send_weekly_digest.delay())
+    result["recipients"] = count_lines(digests_log)
+    results.append(result)
+    print_results(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--news", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--skip-legacy", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,60 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+
+def use_temp_database(name: str = "bench.db") -> str:
+    # Бенчмарки не должны трогать test.db - подменяем DATABASE_URL
+    # до импорта app.*
+    path = os.path.join(tempfile.mkdtemp(prefix="lab1-bench-"), name)
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{path}")
+    return os.environ["DATABASE_URL"]
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize(name: str, latencies, elapsed: float, errors: int = 0) -> dict:
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def run_load(name: str, make_request, total: int, concurrency: int) -> dict:
+    """Выполняет total запросов make_request() в concurrency параллельных воркерах."""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                ok = await make_request(i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if ok is False:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(name, latencies, time.perf_counter() - started, errors)
+
+
+def print_results(results) -> None:
+    for r in results:
+        print(json.dumps(r, ensure_ascii=False))
@@ -0,0 +1,429 @@
+"""Нагрузочный прогон API по сценариям с JSON-отчетом для сравнения прогонов.
+
+Наполняет БД (bench.seed), поднимает uvicorn отдельным процессом и гоняет
+его асинхронным httpx-клиентом: auth (register/login/refresh), чтение ленты,
+запись новостей, смешанную нагрузку и "шторм" комментариев к горячим новостям.
+Затем в eager-режиме Celery замеряет send_news_notification и send_weekly_digest.
+
+    python -m bench.loadtest run --users 1000 --news 10000 --comments 50000 \\
+        --requests 2000 --concurrency 32 --report reports/base.json
+    python -m bench.loadtest run --url http://127.0.0.1:8000 --no-seed --scenarios news_read
+    python -m bench.loadtest compare reports/base.json reports/new.json
+
+Без --url сервер запускается на той же DATABASE_URL (по умолчанию - временная
+SQLite); с --url сервер уже должен смотреть в БД, которую наполнил seed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+from .common import percentile, use_temp_database
+
+use_temp_database("loadtest.db")
+
+import httpx
+
+from . import seed as seeder
+
+
+class OpStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+
+    def summary(self, elapsed: float) -> dict:
+        return {
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "rps": round(len(self.latencies) / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(self.latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(self.latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 3),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+        }
+
+
+class Context:
+    """Общее для всех воркеров: параметры наполнения и горячие новости."""
+
+    def __init__(self, seeded: dict, run_id: str):
+        self.seeded = seeded
+        self.run_id = run_id
+        self.registered = 0
+        news = seeded["news"]
+        # Горячие новости - самые свежие: на них приходится шторм комментариев
+        self.hot_news = [seeded["first_news_id"] + news - 1 - i for i in range(min(5, news))]
+
+    def news_id(self, rnd: random.Random) -> int:
+        # Свежие новости читают чаще: экспоненциальный сдвиг к концу диапазона
+        news = self.seeded["news"]
+        back = min(int(rnd.expovariate(1 / max(news / 20, 1))), news - 1)
+        return self.seeded["first_news_id"] + news - 1 - back
+
+    def user_email(self, rnd: random.Random) -> str:
+        return seeder.user_email(rnd.randrange(self.seeded["users"]))
+
+
+def _auth(session: dict) -> dict:
+    return {"Authorization": f"Bearer {session['access_token']}"}
+
+
+# Операции: (client, ctx, session, rnd) -> Response. session - своя у каждого
+# воркера (токены автора), чтобы ротация refresh-токенов не пересекалась
+
+async def op_register(client, ctx, session, rnd):
+    ctx.registered += 1
+    return await client.post("/auth/register", json={
+        "name": "load user",
+        "email": f"load-{ctx.run_id}-{ctx.registered}@example.com",
+        "password": seeder.SEED_PASSWORD,
+    })
+
+
+async def op_login(client, ctx, session, rnd):
+    return await client.post("/auth/login", json={"email": ctx.user_email(rnd), "password": seeder.SEED_PASSWORD})
+
+
+async def op_refresh(client, ctx, session, rnd):
+    response = await client.post("/auth/refresh", json={"refresh_token": session["refresh_token"]})
+    if response.status_code == 200:
+        session.update(response.json())
+    return response
+
+
+async def op_list_news(client, ctx, session, rnd):
+    response = await client.get("/news/", params={"limit": 20})
+    # Каждый третий листает дальше по курсору
+    cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+    if cursor and rnd.random() < 0.3:
+        response = await client.get("/news/", params={"limit": 20, "cursor": cursor})
+    return response
+
+
+async def op_read_news(client, ctx, session, rnd):
+    return await client.get(f"/news/{ctx.news_id(rnd)}")
+
+
+async def op_list_comments(client, ctx, session, rnd):
+    return await client.get(f"/news/{ctx.news_id(rnd)}/comments", params={"limit": 20})
+
+
+async def op_search(client, ctx, session, rnd):
+    # Номер новости - редкий терм, как типичный поисковый запрос
+    return await client.get("/news/search", params={"q": str(ctx.news_id(rnd) - ctx.seeded["first_news_id"])})
+
+
+async def op_create_news(client, ctx, session, rnd):
+    response = await client.post("/news/", headers=_auth(session), json={
+        "title": f"load news {rnd.randrange(10 ** 9)}",
+        "content": {"blocks": [{"type": "paragraph", "text": "lorem ipsum " * rnd.randint(5, 50)}]},
+    })
+    if response.status_code == 200:
+        session["own_news"].append(response.json()["id"])
+    return response
+
+
+async def op_update_news(client, ctx, session, rnd):
+    if not session["own_news"]:
+        return await op_create_news(client, ctx, session, rnd)
+    news_id = rnd.choice(session["own_news"])
+    return await client.patch(f"/news/{news_id}", headers=_auth(session), json={"title": f"updated {rnd.randrange(10 ** 9)}"})
+
+
+async def op_comment(client, ctx, session, rnd):
+    return await client.post("/comments/", headers=_auth(session), json={
+        "news_id": ctx.news_id(rnd), "text": f"comment {rnd.randrange(10 ** 9)}",
+    })
+
+
+async def op_comment_hot(client, ctx, session, rnd):
+    return await client.post("/comments/", headers=_auth(session), json={
+        "news_id": rnd.choice(ctx.hot_news), "text": f"storm {rnd.randrange(10 ** 9)}",
+    })
+
+
+async def op_read_hot_comments(client, ctx, session, rnd):
+    return await client.get(f"/news/{rnd.choice(ctx.hot_news)}/comments", params={"limit": 20})
+
+
+# Сценарии: список (вес, операция)
+SCENARIOS = {
+    "auth": [(1, op_register), (2, op_login), (7, op_refresh)],
+    "news_read": [(3, op_list_news), (5, op_read_news), (2, op_list_comments), (1, op_search)],
+    "news_write": [(3, op_create_news), (2, op_update_news)],
+    "mixed": [
+        (30, op_list_news), (45, op_read_news), (10, op_list_comments), (5, op_search),
+        (4, op_create_news), (1, op_update_news), (5, op_comment),
+    ],
+    "comment_storm": [(7, op_comment_hot), (3, op_read_hot_comments)],
+}
+
+
+async def run_scenario(client, ctx, name: str, sessions, total: int, seed_value: int) -> dict:
+    ops = SCENARIOS[name]
+    weights = [w for w, _ in ops]
+    stats = {op.__name__[3:]: OpStats() for _, op in ops}
+    counter = iter(range(total))
+
+    async def worker(session, rnd):
+        for _ in counter:
+            op = rnd.choices(ops, weights)[0][1]
+            entry = stats[op.__name__[3:]]
+            started = time.perf_counter()
+            try:
+                response = await op(client, ctx, session, rnd)
+                status = response.status_code
+            except Exception as exc:
+                status = type(exc).__name__
+            entry.latencies.append(time.perf_counter() - started)
+            entry.statuses[status] += 1
+            if not isinstance(status, int) or status >= 400:
+                entry.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        worker(session, random.Random(f"{seed_value}:{name}:{i}")) for i, session in enumerate(sessions)
+    ))
+    elapsed = time.perf_counter() - started
+
+    total_stats = OpStats()
+    for entry in stats.values():
+        total_stats.latencies.extend(entry.latencies)
+        total_stats.statuses.update(entry.statuses)
+        total_stats.errors += entry.errors
+    return {
+        "seconds": round(elapsed, 2),
+        **total_stats.summary(elapsed),
+        "ops": {op: entry.summary(elapsed) for op, entry in stats.items() if entry.latencies},
+    }
+
+
+async def login_sessions(client, seeded: dict, count: int) -> list:
+    # Токены получаем до замеров: логин - это argon2, он исказил бы сценарии чтения
+    authors = max(seeded["users"] // seeded["author_every"], 1)
+    sessions = []
+    for i in range(count):
+        email = seeder.user_email((i % authors) * seeded["author_every"])
+        response = await client.post("/auth/login", json={"email": email, "password": seeder.SEED_PASSWORD})
+        response.raise_for_status()
+        sessions.append({**response.json(), "own_news": []})
+    return sessions
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    # Тот же DATABASE_URL, что у seed; CWD - корень проекта (app.main импортируется)
+    cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+        "--log-level", "warning", "--no-access-log",
+        # Открытые /stream не завершаются сами - без таймаута остановка ждала бы их вечно
+        "--timeout-graceful-shutdown", "5",
+    ]
+    env = os.environ.copy()
+    # Все виртуальные пользователи приходят с одного IP - лимиты частоты
+    # мерили бы сами себя; включаются явно через RATE_LIMIT_BACKEND
+    env.setdefault("RATE_LIMIT_BACKEND", "none")
+    return subprocess.Popen(cmd, env=env)
+
+
+async def wait_ready(url: str, process=None, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} is not ready after {timeout}s")
+
+
+def time_tasks(seeded: dict, runs: int, seed_value: int) -> dict:
+    # Задачи в eager-режиме в этом процессе, доставка - в память:
+    # меряем саму задачу (выборки, разбиение на чанки), без брокера и SMTP
+    from app import delivery, tasks
+    from app.celery_app import celery_app
+
+    celery_app.conf.update(task_always_eager=True, result_backend="cache+memory://")
+    backend = delivery._backend = delivery.MemoryBackend()
+    rnd = random.Random(seed_value)
+    ctx = Context(seeded, "tasks")
+    results = {}
+    for name, call in (
+        ("send_news_notification", lambda: tasks.send_news_notification.delay(ctx.news_id(rnd))),
+        ("send_weekly_digest", lambda: tasks.send_weekly_digest.delay()),
+    ):
+        timings = []
+        backend.outbox.clear()
+        for _ in range(runs):
+            started = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - started)
+        results[name] = {
+            "runs": runs,
+            "p50_ms": round(percentile(timings, 0.50) * 1000, 1),
+            "max_ms": round(max(timings) * 1000, 1),
+            "messages_per_run": len(backend.outbox) // runs,
+        }
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    if args.no_seed:
+        seeded = {
+            "users": args.users, "news": args.news, "comments": args.comments,
+            "first_user_id": 1, "first_news_id": 1, "author_every": args.author_every,
+        }
+    else:
+        seeded = seeder.seed(args.users, args.news, args.comments, args.author_every, seed_value=args.seed)
+        print(f"seeded {json.dumps(seeded)}", file=sys.stderr)
+
+    process = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        process = start_server(port, args.workers)
+    try:
+        await wait_ready(url, process)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+            sessions = await login_sessions(client, seeded, args.concurrency)
+            ctx = Context(seeded, f"{int(time.time())}")
+            scenarios = {}
+            for name in args.scenarios:
+                scenarios[name] = await run_scenario(client, ctx, name, sessions, args.requests, args.seed)
+                summary = {k: v for k, v in scenarios[name].items() if k != "ops"}
+                print(f"{name}: {json.dumps(summary)}", file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "server": url if args.url else f"uvicorn --workers {args.workers}",
+            "params": {
+                "requests": args.requests, "concurrency": args.concurrency, "seed": args.seed,
+            },
+            "seeded": seeded,
+        },
+        "scenarios": scenarios,
+    }
+    if args.task_runs:
+        report["tasks"] = time_tasks(seeded, args.task_runs, args.seed)
+    return report
+
+
+def compare(old: dict, new: dict) -> list:
+    # Изменение в процентах: для задержек минус - лучше, для rps - плюс
+    rows = []
+
+    def delta(a, b):
+        return round((b - a) / a * 100, 1) if a else None
+
+    for name, scenario in new["scenarios"].items():
+        base = old["scenarios"].get(name)
+        if base is None:
+            continue
+        pairs = [(name, base, scenario)]
+        pairs += [
+            (f"{name}.{op}", base["ops"][op], entry)
+            for op, entry in scenario["ops"].items() if op in base["ops"]
+        ]
+        for label, a, b in pairs:
+            rows.append({
+                "name": label,
+                "rps": b["rps"], "rps_change_%": delta(a["rps"], b["rps"]),
+                "p50_ms": b["p50_ms"], "p50_change_%": delta(a["p50_ms"], b["p50_ms"]),
+                "p99_ms": b["p99_ms"], "p99_change_%": delta(a["p99_ms"], b["p99_ms"]),
+                "errors": b["errors"] - a["errors"],
+            })
+    for name, entry in new.get("tasks", {}).items():
+        base = old.get("tasks", {}).get(name)
+        if base is not None:
+            rows.append({
+                "name": f"task.{name}",
+                "p50_ms": entry["p50_ms"], "p50_change_%": delta(base["p50_ms"], entry["p50_ms"]),
+            })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--users", type=int, default=1000)
+    run_parser.add_argument("--news", type=int, default=10000)
+    run_parser.add_argument("--comments", type=int, default=50000)
+    run_parser.add_argument("--author-every", type=int, default=10)
+    run_parser.add_argument("--no-seed", action="store_true", help="БД уже наполнена тем же bench.seed")
+    run_parser.add_argument("--url", help="уже запущенный сервер вместо своего uvicorn")
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    run_parser.add_argument("--requests", type=int, default=2000, help="запросов на сценарий")
+    run_parser.add_argument("--concurrency", type=int, default=32)
+    run_parser.add_argument("--timeout", type=float, default=30.0)
+    run_parser.add_argument("--task-runs", type=int, default=3, help="0 - не мерить задачи Celery")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--report", help="куда сохранить JSON-отчет (иначе stdout)")
+
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        with open(args.old) as f_old, open(args.new) as f_new:
+            for row in compare(json.load(f_old), json.load(f_new)):
+                print(json.dumps(row, ensure_ascii=False))
+        return
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+        with open(args.report, "w") as f:
+            f.write(text + "\n")
+        print(f"report saved to {args.report}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
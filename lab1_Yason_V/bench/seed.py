@@ -0,0 +1,100 @@
+"""Наполнение БД для нагрузочных тестов: пользователи, новости, комментарии.
+
+У всех пользователей один пароль (хеш считается один раз), каждый
+--author-every-й - автор. Вставка core-батчами; search_text и comment_count
+заполняются здесь же, как это сделали бы crud-функции.
+
+    python -m bench.seed --users 10000 --news 100000 --comments 500000
+    DATABASE_URL=postgresql://... python -m bench.seed --users 1000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, update
+
+SEED_PASSWORD = "loadtest-password"
+
+
+def user_email(i: int) -> str:
+    return f"user{i}@example.com"
+
+
+def seed(users: int, news: int, comments: int, author_every: int = 10, batch: int = 10000, seed_value: int = 42) -> dict:
+    from app import auth, models, search
+    from app.db import Base, engine
+
+    rnd = random.Random(seed_value)
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    password_hash = auth.get_password_hash(SEED_PASSWORD)
+    now = datetime.utcnow()
+    authors = max(users // author_every, 1)
+
+    with engine.begin() as conn:
+        for offset in range(0, users, batch):
+            conn.execute(insert(models.User), [
+                {
+                    "name": f"user {i}",
+                    "email": user_email(i),
+                    "hashed_password": password_hash,
+                    "is_author": i % author_every == 0,
+                }
+                for i in range(offset, min(offset + batch, users))
+            ])
+        first_user_id = conn.execute(select(func.min(models.User.id))).scalar() or 1
+
+        # Новости равномерно за последний год; автор - один из авторов
+        step = timedelta(days=365) / max(news, 1)
+        for offset in range(0, news, batch):
+            rows = []
+            for i in range(offset, min(offset + batch, news)):
+                content = {"blocks": [{"type": "paragraph", "text": f"новость {i} " + "lorem ipsum " * rnd.randint(5, 50)}]}
+                rows.append({
+                    "title": f"news {i}",
+                    "content": content,
+                    "search_text": search.extract_text(content),
+                    "published_at": now - step * (news - i),
+                    "author_id": first_user_id + rnd.randrange(authors) * author_every,
+                })
+            conn.execute(insert(models.News), rows)
+        first_news_id = conn.execute(select(func.min(models.News.id))).scalar() or 1
+
+        # Комментарии со смещением к свежим новостям - как в реальной ленте
+        for offset in range(0, comments, batch):
+            conn.execute(insert(models.Comment), [
+                {
+                    "text": f"comment {i}",
+                    "news_id": first_news_id + news - 1 - min(int(rnd.expovariate(1 / max(news / 20, 1))), news - 1),
+                    "author_id": first_user_id + rnd.randrange(users),
+                    "published_at": now - timedelta(seconds=comments - i),
+                }
+                for i in range(offset, min(offset + batch, comments))
+            ])
+        if comments:
+            counts = (
+                select(func.count()).select_from(models.Comment)
+                .where(models.Comment.news_id == models.News.id).scalar_subquery()
+            )
+            conn.execute(update(models.News).values(comment_count=counts))
+
+    return {
+        "users": users,
+        "news": news,
+        "comments": comments,
+        "first_user_id": first_user_id,
+        "first_news_id": first_news_id,
+        "author_every": author_every,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--news", type=int, default=10000)
+    parser.add_argument("--comments", type=int, default=50000)
+    parser.add_argument("--author-every", type=int, default=10)
+    args = parser.parse_args()
+    print(seed(args.users, args.news, args.comments, args.author_every))
@@ -0,0 +1,61 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+from app.db import Base, DATABASE_URL
+from app import models  # регистрация таблиц в Base.metadata
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+# % в пароле DSN - экранируем для ConfigParser
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
+
+target_metadata = Base.metadata
+
+# Полнотекстовый индекс создается сырым DDL (app/search.py), моделей у него нет -
+# autogenerate не должен предлагать его удалить
+FTS_OBJECTS = {"search_vector", "ix_news_search_vector"}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (name.startswith("news_fts") or name in FTS_OBJECTS)
+
+
+def run_migrations_offline() -> None:
+    # alembic upgrade head --sql: вывести SQL без подключения к базе
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+    with connectable.connect() as connection:
+        # SQLite не умеет большую часть ALTER TABLE - batch пересоздает таблицу
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            render_as_batch=True,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,80 @@
+"""initial schema
+
+Схема, которую раньше создавал Base.metadata.create_all при импорте app.main,
+на моделях до перехода на миграции. База, созданная так, переводится на
+миграции командами alembic stamp 0001 и alembic upgrade head.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 17:32:15.290778
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=128), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('hashed_password', sa.String(length=255), nullable=True),
+    sa.Column('registered_at', sa.DateTime(), nullable=True),
+    sa.Column('is_author', sa.Boolean(), nullable=True),
+    sa.Column('is_admin', sa.Boolean(), nullable=True),
+    sa.Column('avatar', sa.String(), nullable=True),
+    sa.Column('github_id', sa.String(length=100), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('github_id')
+    )
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_users_id', 'users', ['id'], unique=False)
+
+    op.create_table('news',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('content', sa.JSON(), nullable=False),
+    sa.Column('published_at', sa.DateTime(), nullable=True),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('cover', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_news_id', 'news', ['id'], unique=False)
+
+    op.create_table('comments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('news_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('published_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['news_id'], ['news.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_comments_id', 'comments', ['id'], unique=False)
+
+    op.create_table('refresh_sessions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('refresh_token', sa.String(length=255), nullable=False),
+    sa.Column('user_agent', sa.String(length=512), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_refresh_sessions_id', 'refresh_sessions', ['id'], unique=False)
+    op.create_index('ix_refresh_sessions_refresh_token', 'refresh_sessions', ['refresh_token'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_table('refresh_sessions')
+    op.drop_table('comments')
+    op.drop_table('news')
+    op.drop_table('users')
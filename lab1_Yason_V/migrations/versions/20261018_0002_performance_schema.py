@@ -0,0 +1,246 @@
+"""performance schema
+
+Все изменения моделей после 0001: счетчики и версии для ETag, индексы под
+keyset-пагинацию, полнотекстовый индекс из app/search.py, хэш вместо
+refresh-токена, outbox, подписки и материализованные ленты. Существующие
+данные переносятся: comment_count и search_text считаются по текущим
+строкам, refresh-токены заменяются их sha256.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 19:04:41.517302
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# Копия DDL из app/search.py на момент ревизии: миграция не должна меняться
+# вместе с кодом приложения
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5("
+    "title, search_text, content='news', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_ai AFTER INSERT ON news BEGIN "
+    "INSERT INTO news_fts(rowid, title, search_text) VALUES (new.id, new.title, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_ad AFTER DELETE ON news BEGIN "
+    "INSERT INTO news_fts(news_fts, rowid, title, search_text) VALUES ('delete', old.id, old.title, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS news_fts_au AFTER UPDATE OF title, search_text ON news BEGIN "
+    "INSERT INTO news_fts(news_fts, rowid, title, search_text) VALUES ('delete', old.id, old.title, old.search_text); "
+    "INSERT INTO news_fts(rowid, title, search_text) VALUES (new.id, new.title, new.search_text); END",
+    # Внешний content: индекс строится по уже заполненному search_text
+    "INSERT INTO news_fts(news_fts) VALUES ('rebuild')",
+]
+POSTGRES_FTS = [
+    "ALTER TABLE news ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(search_text, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_news_search_vector ON news USING GIN (search_vector)",
+]
+
+BACKFILL_BATCH = 1000
+
+news_table = sa.table(
+    'news',
+    sa.column('id', sa.Integer()),
+    sa.column('content', sa.JSON()),
+    sa.column('search_text', sa.Text()),
+)
+sessions_table = sa.table(
+    'refresh_sessions',
+    sa.column('id', sa.Integer()),
+    sa.column('refresh_token', sa.String()),
+    sa.column('token_hash', sa.String()),
+)
+
+
+def is_sqlite() -> bool:
+    return op.get_context().dialect.name == 'sqlite'
+
+
+def recreate() -> str:
+    # SQLite не добавляет колонку с DEFAULT CURRENT_TIMESTAMP через ALTER TABLE -
+    # таблица копируется целиком. Postgres обходится обычным ALTER
+    return 'always' if is_sqlite() else 'auto'
+
+
+def extract_text(content) -> str:
+    # Копия app.search.extract_text на момент ревизии
+    parts = []
+
+    def walk(value):
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, dict):
+            for item in value.values():
+                walk(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                walk(item)
+
+    walk(content)
+    return " ".join(parts)
+
+
+def backfill_search_text(bind) -> None:
+    # content - JSON, плоский текст из него в SQL не собрать; идем пачками по id
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(news_table.c.id, news_table.c.content)
+            .where(news_table.c.id > last_id)
+            .order_by(news_table.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            news_table.update()
+            .where(news_table.c.id == sa.bindparam('_id'))
+            .values(search_text=sa.bindparam('_text')),
+            [{'_id': row.id, '_text': extract_text(row.content)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def backfill_token_hash(bind) -> None:
+    # Одинаковые токены (выданные в одну секунду) дали бы одинаковый хэш -
+    # оставляем последнюю сессию, иначе не создастся уникальный индекс
+    op.execute(
+        "DELETE FROM refresh_sessions WHERE id NOT IN "
+        "(SELECT MAX(id) FROM refresh_sessions GROUP BY refresh_token)"
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(sessions_table.c.id, sessions_table.c.refresh_token)
+            .where(sessions_table.c.id > last_id)
+            .order_by(sessions_table.c.id)
+            .limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            sessions_table.update()
+            .where(sessions_table.c.id == sa.bindparam('_id'))
+            .values(token_hash=sa.bindparam('_hash')),
+            [{'_id': row.id, '_hash': hashlib.sha256(row.refresh_token.encode()).hexdigest()} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    with op.batch_alter_table('users', recreate=recreate()) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('news', recreate=recreate()) as batch_op:
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('search_text', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        batch_op.create_index('ix_news_author_id_published_at', ['author_id', 'published_at'], unique=False)
+        batch_op.create_index('ix_news_published_at_id', ['published_at', 'id'], unique=False)
+    op.execute(
+        "UPDATE news SET comment_count = "
+        "(SELECT COUNT(*) FROM comments WHERE comments.news_id = news.id)"
+    )
+    backfill_search_text(bind)
+    for statement in SQLITE_FTS if is_sqlite() else POSTGRES_FTS:
+        op.execute(statement)
+
+    op.create_index('ix_comments_news_id_published_at_id', 'comments', ['news_id', 'published_at', 'id'], unique=False)
+
+    with op.batch_alter_table('refresh_sessions') as batch_op:
+        batch_op.add_column(sa.Column('token_hash', sa.String(length=64), nullable=True))
+    backfill_token_hash(bind)
+    with op.batch_alter_table('refresh_sessions') as batch_op:
+        batch_op.alter_column('token_hash', existing_type=sa.String(length=64), nullable=False)
+        batch_op.drop_index('ix_refresh_sessions_refresh_token')
+        batch_op.drop_column('refresh_token')
+        batch_op.create_index('ix_refresh_sessions_token_hash', ['token_hash'], unique=True)
+        batch_op.create_index('ix_refresh_sessions_user_id', ['user_id'], unique=False)
+        batch_op.create_index('ix_refresh_sessions_expires_at', ['expires_at'], unique=False)
+
+    op.create_table('outbox_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('topic', sa.String(length=64), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('dispatched_at', sa.DateTime(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_events_dispatched_at_id', 'outbox_events', ['dispatched_at', 'id'], unique=False)
+
+    op.create_table('processed_events',
+    sa.Column('event_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('consumer', sa.String(length=64), nullable=False),
+    sa.Column('processed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('event_id', 'consumer')
+    )
+    op.create_index('ix_processed_events_processed_at', 'processed_events', ['processed_at'], unique=False)
+
+    op.create_table('subscriptions',
+    sa.Column('follower_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['follower_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('follower_id', 'author_id')
+    )
+    op.create_index('ix_subscriptions_author_id_follower_id', 'subscriptions', ['author_id', 'follower_id'], unique=False)
+
+    op.create_table('timeline_entries',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('published_at', sa.DateTime(), nullable=False),
+    sa.Column('news_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'published_at', 'news_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('timeline_entries')
+    op.drop_table('subscriptions')
+    op.drop_table('processed_events')
+    op.drop_table('outbox_events')
+
+    # Токен из хэша не восстановить - сессии сбрасываются, пользователи входят заново
+    op.execute("DELETE FROM refresh_sessions")
+    with op.batch_alter_table('refresh_sessions') as batch_op:
+        batch_op.drop_index('ix_refresh_sessions_expires_at')
+        batch_op.drop_index('ix_refresh_sessions_user_id')
+        batch_op.drop_index('ix_refresh_sessions_token_hash')
+        batch_op.drop_column('token_hash')
+        batch_op.add_column(sa.Column('refresh_token', sa.String(length=255), nullable=False))
+        batch_op.create_index('ix_refresh_sessions_refresh_token', ['refresh_token'], unique=False)
+
+    op.drop_index('ix_comments_news_id_published_at_id', table_name='comments')
+
+    if is_sqlite():
+        for name in ('news_fts_au', 'news_fts_ad', 'news_fts_ai'):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE IF EXISTS news_fts")
+    else:
+        op.execute("DROP INDEX IF EXISTS ix_news_search_vector")
+        op.execute("ALTER TABLE news DROP COLUMN IF EXISTS search_vector")
+    with op.batch_alter_table('news') as batch_op:
+        batch_op.drop_index('ix_news_published_at_id')
+        batch_op.drop_index('ix_news_author_id_published_at')
+        batch_op.drop_column('version')
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('search_text')
+        batch_op.drop_column('comment_count')
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('follower_count')
+        batch_op.drop_column('version')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,105 @@
+import argparse
+import os
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Отдельная база на прогон тестов - до импорта app.*, как в bench/common.py
+_tmp = tempfile.mkdtemp(prefix="lab1-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp, 'test.db')}")
+os.environ.setdefault("MEDIA_ROOT", os.path.join(_tmp, "media"))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert
+
+from app import auth, cache, cli, models
+from app.db import Base, engine
+from app.main import app
+
+pytest_plugins = ["app.pytest_plugin"]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    # Схема - теми же миграциями, что и в проде
+    cli.migrate(argparse.Namespace(revision="head"))
+
+
+@pytest.fixture(autouse=True)
+def clean_db(schema):
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(delete(table))
+    # Кэш от прошлого теста менял бы число запросов
+    cache.news_cache.backend = cache.MemoryCache()
+    cache.user_cache.backend = cache.MemoryCache(ttl=cache.USER_CACHE_TTL)
+
+
+@pytest.fixture(scope="session")
+def client(schema):
+    with TestClient(app) as c:
+        yield c
+
+
+def insert_rows(model, rows: list) -> list:
+    with engine.begin() as conn:
+        return [r.id for r in conn.execute(insert(model).returning(model.id), rows)]
+
+
+@pytest.fixture
+def make_users():
+    def make(n: int, **fields) -> list:
+        start = len(make.created)
+        rows = [{"name": f"user{i}", "email": f"user{i}@example.com", **fields} for i in range(start, start + n)]
+        ids = insert_rows(models.User, rows)
+        make.created += ids
+        return ids
+
+    make.created = []
+    return make
+
+
+@pytest.fixture
+def make_news():
+    def make(author_ids: list, n: int) -> list:
+        start = datetime(2024, 1, 1)
+        return insert_rows(models.News, [
+            {
+                "title": f"news {i}",
+                "content": {"body": "lorem ipsum"},
+                "published_at": start + timedelta(minutes=i),
+                "author_id": author_ids[i % len(author_ids)],
+            }
+            for i in range(n)
+        ])
+
+    return make
+
+
+@pytest.fixture
+def make_comments():
+    def make(news_id: int, author_ids: list, n: int) -> list:
+        start = datetime(2024, 2, 1)
+        return insert_rows(models.Comment, [
+            {
+                "text": f"comment {i}",
+                "news_id": news_id,
+                "author_id": author_ids[i % len(author_ids)],
+                "published_at": start + timedelta(minutes=i),
+            }
+            for i in range(n)
+        ])
+
+    return make
+
+
+@pytest.fixture
+def auth_headers():
+    # Токен как после логина; без ACCESS_TOKEN_ROLE_CLAIMS get_current_user
+    # читает пользователя из БД (затем из user_cache)
+    def headers(user_id: int, is_author: bool = False, is_admin: bool = False) -> dict:
+        user = SimpleNamespace(id=user_id, is_author=is_author, is_admin=is_admin)
+        return {"Authorization": f"Bearer {auth.create_access_token(auth.access_token_claims(user))}"}
+
+    return headers
@@ -0,0 +1,51 @@
+import asyncio
+
+from app.cache import MemoryCache, ReadThroughCache
+
+
+def test_cancelled_loader_does_not_fail_waiters():
+    async def scenario():
+        cache = ReadThroughCache(MemoryCache())
+        started = asyncio.Event()
+        calls = []
+
+        async def slow_loader():
+            calls.append("slow")
+            started.set()
+            await asyncio.sleep(10)
+            return b"slow"
+
+        async def loader():
+            calls.append("fast")
+            return b"value"
+
+        first = asyncio.create_task(cache.get_or_load("k", slow_loader))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        # Клиент первого запроса отключился
+        first.cancel()
+        assert await waiter == b"value"
+        assert first.cancelled()
+        assert calls == ["slow", "fast"]
+        assert await cache.get_or_load("k", slow_loader) == b"value"
+
+    asyncio.run(scenario())
+
+
+def test_waiters_share_one_load():
+    async def scenario():
+        cache = ReadThroughCache(MemoryCache())
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return b"value"
+
+        results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(10)))
+        assert results == [b"value"] * 10
+        assert len(calls) == 1
+        assert cache.stats.coalesced == 9
+
+    asyncio.run(scenario())
@@ -0,0 +1,19 @@
+import pytest
+
+from app import delivery
+
+
+def test_backend_without_send_fails_on_creation():
+    class Incomplete(delivery.DeliveryBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_memory_backend_sends_batch():
+    backend = delivery.MemoryBackend()
+    messages = [delivery.Message(f"user{i}@example.com", "subject", "body", "NEWS_NOTIFICATION") for i in range(3)]
+    result = backend.send_batch(messages)
+    assert result.sent == 3
+    assert sorted(backend.outbox) == messages
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from app import feed, models
+from app.db import engine
+
+
+def test_budget_fails_when_exceeded(client, query_budget, make_users, make_news):
+    make_news(make_users(1, is_author=True), 3)
+    with pytest.raises(pytest.fail.Exception, match="Query budget exceeded"):
+        with query_budget(0):
+            client.get("/news/")
+
+
+def test_news_list(client, query_budget, make_users, make_news):
+    make_news(make_users(5, is_author=True), 50)
+    with query_budget(1):
+        r = client.get("/news/", params={"limit": 20})
+    assert r.status_code == 200
+    assert len(r.json()["items"]) == 20
+
+    with query_budget(1):
+        r = client.get("/news/", params={"limit": 20, "cursor": r.json()["next_cursor"]})
+    assert len(r.json()["items"]) == 20
+
+
+def test_news_comments_with_authors(client, query_budget, make_users, make_news, make_comments):
+    [news_id] = make_news(make_users(1, is_author=True), 1)
+    commenters = make_users(10)
+    make_comments(news_id, commenters, 30)
+    # Новость (промах кэша), страница комментариев, авторы одним IN
+    with query_budget(3):
+        r = client.get(f"/news/{news_id}/comments", params={"limit": 20, "include_author": True})
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert len(items) == 20
+    assert {c["author"]["id"] for c in items} == set(commenters)
+
+
+def test_home_feed(client, query_budget, make_users, make_news, monkeypatch, auth_headers):
+    monkeypatch.setattr(feed, "FEED_FANOUT_THRESHOLD", 100)
+    [reader] = make_users(1)
+    authors = make_users(3, is_author=True)
+    celebrities = make_users(3, is_author=True, follower_count=1000)
+    news_ids = make_news(authors + celebrities, 60)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Subscription), [
+            {"follower_id": reader, "author_id": a} for a in authors + celebrities
+        ])
+        # Раскладка новостей обычных авторов уже сделана задачей fanout_news
+        conn.execute(insert(models.TimelineEntry), [
+            {"user_id": reader, "published_at": datetime(2024, 1, 1) + timedelta(minutes=i), "news_id": news_id}
+            for i, news_id in enumerate(news_ids) if i % 6 < 3
+        ])
+    # Пользователь, лента, список знаменитостей, их новости одним UNION ALL -
+    # при любом числе подписок
+    with query_budget(4):
+        r = client.get("/feed/", params={"limit": 20}, headers=auth_headers(reader))
+    assert r.status_code == 200
+    assert [n["id"] for n in r.json()["items"]] == news_ids[::-1][:20]
+
+
+def test_update_news_permission_check(client, query_budget, make_users, make_news, auth_headers):
+    [author] = make_users(1, is_author=True)
+    [news_id] = make_news([author], 1)
+    # Пользователь, новость в check_news_permission, UPDATE, refresh
+    with query_budget(4):
+        r = client.patch(f"/news/{news_id}", json={"title": "updated"}, headers=auth_headers(author, is_author=True))
+    assert r.status_code == 200
+    assert r.json()["title"] == "updated"
+
+
+def test_permission_denied_loads_news_once(client, query_budget, make_users, make_news, auth_headers):
+    author, other = make_users(2, is_author=True)
+    [news_id] = make_news([author], 1)
+    # Отказ - без лишних запросов: пользователь и сама новость
+    with query_budget(2):
+        r = client.delete(f"/news/{news_id}", headers=auth_headers(other, is_author=True))
+    assert r.status_code == 403
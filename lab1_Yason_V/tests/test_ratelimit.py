@@ -0,0 +1,24 @@
+from app import ratelimit
+
+
+def test_route_concurrency_rejects_over_limit(client, monkeypatch):
+    limit = ratelimit.route_limit("GET /news/{news_id}")
+    monkeypatch.setattr(limit, "limit", 1)
+    # Слот занят "другим" запросом - следующий сразу получает 503
+    limit.acquire()
+    try:
+        r = client.get("/news/1")
+        assert r.status_code == 503
+        assert r.headers["Retry-After"] == "1"
+    finally:
+        limit.release()
+    assert client.get("/news/1").status_code == 404
+    assert limit.in_flight == 0
+
+
+def test_route_limits_from_env():
+    assert ratelimit.parse_route_limits("GET /news/export=2, post /news/bulk=4") == {
+        "GET /news/export": 2,
+        "POST /news/bulk": 4,
+    }
+    assert ratelimit.ROUTE_CONCURRENCY["GET /stream/"] == 0
@@ -0,0 +1,24 @@
+import asyncio
+
+from starlette.requests import HTTPConnection
+
+from app import replicas
+
+
+def connection(headers: dict) -> HTTPConnection:
+    raw = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+    return HTTPConnection({"type": "http", "headers": raw})
+
+
+def test_recent_write_is_tracked_by_bearer_user(auth_headers):
+    async def scenario():
+        writer = connection(auth_headers(1))
+        other = connection(auth_headers(2))
+        assert not await replicas.recent_write(writer)
+        # Клиент без cookie: отметка только по user_id из токена
+        await replicas.mark_recent_write(writer)
+        assert await replicas.recent_write(connection(auth_headers(1)))
+        assert not await replicas.recent_write(other)
+        assert not await replicas.recent_write(connection({}))
+
+    asyncio.run(scenario())
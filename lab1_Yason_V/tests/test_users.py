@@ -0,0 +1,28 @@
+from sqlalchemy import select, update
+
+from app import models
+from app.db import engine
+
+
+def test_delete_user_updates_comment_counts(client, make_users, make_news, make_comments, auth_headers):
+    [admin] = make_users(1, is_admin=True)
+    author, commenter, other = make_users(3)
+    news_ids = make_news([author], 2)
+    make_comments(news_ids[0], [commenter, other], 4)
+    make_comments(news_ids[1], [commenter], 3)
+    with engine.begin() as conn:
+        conn.execute(update(models.News).where(models.News.id == news_ids[0]).values(comment_count=4))
+        conn.execute(update(models.News).where(models.News.id == news_ids[1]).values(comment_count=3))
+    # Новость в кэше со старым счетчиком и ETag
+    before = client.get(f"/news/{news_ids[0]}")
+    assert before.json()["comment_count"] == 4
+
+    r = client.delete(f"/users/{commenter}", headers=auth_headers(admin, is_admin=True))
+    assert r.status_code == 200
+
+    with engine.connect() as conn:
+        counts = dict(conn.execute(select(models.News.id, models.News.comment_count)).all())
+    assert counts == {news_ids[0]: 2, news_ids[1]: 0}
+    after = client.get(f"/news/{news_ids[0]}")
+    assert after.json()["comment_count"] == 2
+    assert after.headers["ETag"] != before.headers["ETag"]